@@ -4,6 +4,7 @@ This contains the "main" class/functions for running the OPS CLI.
 """
 # builds off the example of MultiCommand in click's docs
 import collections
+import inspect
 import logging
 import logging.config
 import os
@@ -14,24 +15,120 @@ import click
 # click_completion.init()
 
 from .plugin_management import (FilePluginLoader, NamespacePluginLoader,
-                                OPSCommandPlugin)
-from .utils import get_installed_plugins
+                                OPSCommandPlugin, COMMAND_ENTRY_POINTS)
+from .manifest import CommandManifest, manifest_filename
+from .utils import installed_plugin_loaders
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
+
+def _shorten_help(text, limit):
+    """First paragraph of the help, cut to ``limit`` characters at a word
+    boundary (ending with ``...`` if it was cut), as click does"""
+    words = text.split("\n\n")[0].split()
+    if len(" ".join(words)) <= limit:
+        return " ".join(words)
+
+    shortened = ""
+    for word in words:
+        candidate = f"{shortened} {word}" if shortened else word
+        if len(candidate) + 3 > limit:
+            break
+        shortened = candidate
+    return shortened + "..."
+
+
+class LazyCommand(click.Command):
+    """Stand-in for a command, which only loads the command when used.
+
+    Listing the commands and building the main help only need the metadata
+    from the plugin. The real command (which may require loading a module)
+    is only obtained from the plugin when it is invoked or when its own help
+    is requested.
+
+    Parameters
+    ----------
+    plugin : :class:`.OPSCommandPlugin`
+        the plugin for this command
+    """
+    # We intentionally don't call click.Command.__init__; anything that
+    # isn't the metadata below comes from the real command.
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.name = plugin.name
+        self.short_help = plugin.short_help
+        self.hidden = plugin.hidden
+        self.deprecated = False
+
+    @property
+    def command(self):
+        """The real command (loaded on first access)"""
+        return self.plugin.func
+
+    def __getattr__(self, attr):
+        # only called for attributes that aren't set on the stand-in
+        if attr.startswith('_') or attr == 'plugin':
+            raise AttributeError(attr)
+        return getattr(self.command, attr)
+
+    def get_short_help_str(self, limit=45):
+        return _shorten_help(inspect.cleandoc(self.short_help or ""), limit)
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self.command.make_context(info_name, args, parent=parent,
+                                         **extra)
+
+    def invoke(self, ctx):
+        return self.command.invoke(ctx)
+
+    def main(self, *args, **kwargs):
+        return self.command.main(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        return self.command(*args, **kwargs)
+
+    def get_params(self, ctx):
+        return self.command.get_params(ctx)
+
+    def get_usage(self, ctx):
+        return self.command.get_usage(ctx)
+
+    def get_help(self, ctx):
+        return self.command.get_help(ctx)
+
+    def format_help(self, ctx, formatter):
+        return self.command.format_help(ctx, formatter)
+
+    def parse_args(self, ctx, args):
+        return self.command.parse_args(ctx, args)
+
+    def shell_complete(self, ctx, incomplete):
+        return self.command.shell_complete(ctx, incomplete)
+
+    def to_info_dict(self, ctx):
+        return self.command.to_info_dict(ctx)
+
+    def __repr__(self):
+        return f"<LazyCommand {self.name}>"
+
+
 class OpenPathSamplingCLI(click.MultiCommand):
     """Main class for the command line interface
 
     Most of the logic here is about handling the plugin infrastructure.
     """
     def __init__(self, *args, **kwargs):
-        # the logic here is all about loading the plugins
+        # the logic here is all about loading the plugins; the manifest
+        # means that we only load the modules for commands that we use
         commands = str(pathlib.Path(__file__).parent.resolve() / 'commands')
-        plugins = get_installed_plugins(
+        loaders = installed_plugin_loaders(
             default_loader=FilePluginLoader(commands, OPSCommandPlugin),
-            plugin_types=OPSCommandPlugin
+            plugin_types=OPSCommandPlugin,
+            entry_point_group=COMMAND_ENTRY_POINTS
         )
-        self._get_command = {}
+        manifest = CommandManifest(loaders, filename=manifest_filename())
+        plugins = manifest.plugins()
+        self._command_plugins = {}
         self._sections = collections.defaultdict(list)
         self.plugins = []
         for plugin in plugins:
@@ -41,39 +138,61 @@ class OpenPathSamplingCLI(click.MultiCommand):
 
     def _register_plugin(self, plugin):
         self.plugins.append(plugin)
-        self._get_command[plugin.name] = plugin.func
+        self._command_plugins[plugin.name] = plugin
         self._sections[plugin.section].append(plugin.name)
 
     def _deregister_plugin(self, plugin):
         # mainly used in testing
         self.plugins.remove(plugin)
-        del self._get_command[plugin.name]
+        del self._command_plugins[plugin.name]
         self._sections[plugin.section].remove(plugin.name)
 
     def plugin_for_command(self, command_name):
         return {p.name: p for p in self.plugins}[command_name]
 
     def list_commands(self, ctx):
-        return list(self._get_command.keys())
+        return list(self._command_plugins.keys())
 
     def get_command(self, ctx, name):
         name = name.replace('_', '-')  # allow - or _ from user
-        return self._get_command.get(name)
+        plugin = self._command_plugins.get(name)
+        if plugin is None:
+            return None
+        return LazyCommand(plugin)
 
     def format_commands(self, ctx, formatter):
         sec_order = ['Simulation', 'Analysis', 'Miscellaneous', 'Workflow']
         for sec in sec_order:
             cmds = self._sections.get(sec, [])
-            rows = []
-            for cmd in cmds:
-                command = self.get_command(ctx, cmd)
-                if command is None:
-                    continue
-                rows.append((cmd, command.short_help or ''))
+            commands = [(cmd, self.get_command(ctx, cmd)) for cmd in cmds]
+            commands = [(cmd, command) for cmd, command in commands
+                        if command is not None and not command.hidden]
+            if not commands:
+                continue
 
-            if rows:
-                with formatter.section(sec + " Commands"):
-                    formatter.write_dl(rows)
+            # as in click: the short help fills the rest of the line
+            limit = formatter.width - 6 - max(len(cmd) for cmd, _ in commands)
+            rows = [(cmd, command.get_short_help_str(limit))
+                    for cmd, command in commands]
+            with formatter.section(sec + " Commands"):
+                formatter.write_dl(rows)
+
+
+# these are listed here (instead of imported) so that the help doesn't
+# need to import sqlite3; tests check that they match
+STORAGE_PROFILE_NAMES = ['default', 'safe', 'production', 'analysis']
+SQLITE_READ_MODES = ['default', 'immutable', 'memory']
+
+
+def configure_sqlite(storage_profile, sqlite_pragma, input_storage=None):
+    from .param_core import StorageLoader
+    from .sqlite_settings import parse_pragma
+    try:
+        pragmas = dict(parse_pragma(setting) for setting in sqlite_pragma)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'--sqlite-pragma'")
+    StorageLoader.configure_sqlite(storage_profile, pragmas,
+                                   read_mode=input_storage or 'default')
 
 
 _MAIN_HELP = """
@@ -89,9 +208,65 @@ you can get more information about the pathsampling tool with:
                help=_MAIN_HELP, context_settings=CONTEXT_SETTINGS)
 @click.option('--log', type=click.Path(exists=True, readable=True),
               help="logging configuration file")
-def main(log):
+@click.option('--storage-profile', type=click.Choice(STORAGE_PROFILE_NAMES),
+              default=None, envvar='OPENPATHSAMPLING_STORAGE_PROFILE',
+              help=("performance settings for SQLite (.db) storage files. "
+                    "Can also be set with "
+                    "$OPENPATHSAMPLING_STORAGE_PROFILE."))
+@click.option('--sqlite-pragma', type=str, multiple=True,
+              envvar='OPENPATHSAMPLING_SQLITE_PRAGMAS',
+              help=("SQLite setting for .db storage files, as NAME=VALUE "
+                    "(journal_mode, synchronous, cache_size, mmap_size, "
+                    "temp_store); overrides the storage profile. May be "
+                    "used more than once, or set (space-separated) with "
+                    "$OPENPATHSAMPLING_SQLITE_PRAGMAS."))
+@click.option('--input-storage', type=click.Choice(SQLITE_READ_MODES),
+              default=None, envvar='OPENPATHSAMPLING_INPUT_STORAGE',
+              help=("how to open SQLite (.db) files that are only read: "
+                    "'immutable' skips file locking (the file must not "
+                    "change while in use); 'memory' also copies the whole "
+                    "file into memory. Can also be set with "
+                    "$OPENPATHSAMPLING_INPUT_STORAGE."))
+@click.option('--staged-output/--no-staged-output', default=None,
+              envvar='OPENPATHSAMPLING_STAGED_OUTPUT',
+              help=("write SQLite (.db) output files in memory, and copy "
+                    "them to disk at checkpoints. Can also be set with "
+                    "$OPENPATHSAMPLING_STAGED_OUTPUT."))
+@click.option('--checkpoint-steps', type=int, default=100, show_default=True,
+              envvar='OPENPATHSAMPLING_CHECKPOINT_STEPS',
+              help="MC steps between checkpoints of staged output")
+@click.option('--checkpoint-seconds', type=float, default=300.0,
+              show_default=True, envvar='OPENPATHSAMPLING_CHECKPOINT_SECONDS',
+              help="seconds between checkpoints of staged output")
+@click.option('--write-behind/--no-write-behind', default=None,
+              envvar='OPENPATHSAMPLING_WRITE_BEHIND',
+              help=("save to output files in a background thread, so that "
+                    "simulations don't wait for storage. Can also be set "
+                    "with $OPENPATHSAMPLING_WRITE_BEHIND."))
+@click.option('--write-queue-size', type=int, default=100,
+              show_default=True, envvar='OPENPATHSAMPLING_WRITE_QUEUE_SIZE',
+              help=("maximum number of saves waiting for the background "
+                    "thread before the simulation waits"))
+def main(log, storage_profile, sqlite_pragma, input_storage, staged_output,
+         checkpoint_steps, checkpoint_seconds, write_behind,
+         write_queue_size):
     if log:
         logging.config.fileConfig(log, disable_existing_loggers=False)
+
+    sqlite_options = (storage_profile, sqlite_pragma, input_storage)
+    if any(sqlite_options):
+        configure_sqlite(*sqlite_options)
+
+    if staged_output is not None:
+        from .param_core import StorageLoader
+        StorageLoader.configure_staging(every_steps=checkpoint_steps,
+                                        every_seconds=checkpoint_seconds,
+                                        enabled=staged_output)
+
+    if write_behind is not None:
+        from .param_core import StorageLoader
+        StorageLoader.configure_write_behind(max_queue=write_queue_size,
+                                             enabled=write_behind)
     # TODO: if log not given, check for logging.conf in .openpathsampling/
 
     logger = logging.getLogger(__name__)
@@ -26,6 +26,7 @@ def append(input_file, append_file, engine, cv, volume, network, scheme,
            tag, save_tag):
     """Append objects from INPUT_FILE to another file.
     """
+    # both storages are closed when the command finishes
     storage = INPUT_FILE.get(input_file)
     output_storage = APPEND_FILE.get(append_file)
     params = [MULTI_ENGINE, MULTI_CV, MULTI_VOLUME, MULTI_NETWORK,
@@ -52,9 +53,6 @@ def append(input_file, append_file, engine, cv, volume, network, scheme,
     # TO TEST
     # 3. "untag" an object by not associating a tag in the new storage
 
-    output_storage.close()
-    storage.close()
-
 
 PLUGIN = OPSCommandPlugin(
     command=append,
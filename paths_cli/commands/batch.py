@@ -0,0 +1,74 @@
+import shlex
+
+import click
+from paths_cli import OPSCommandPlugin
+from paths_cli.param_core import StorageLoader
+
+
+@click.command(
+    'batch',
+    short_help="run several commands in one process, sharing open files",
+)
+@click.argument('plan_file', type=click.Path(exists=True, readable=True))
+def batch(plan_file):
+    """Run the commands listed in PLAN_FILE, in order.
+
+    PLAN_FILE is a YAML or JSON file with a list of commands (either at the
+    top level, or under the key ``commands``). Each command is a string, as
+    it would be written after ``openpathsampling`` on the command line, or a
+    list of arguments. For example:
+
+    \b
+        commands:
+          - append setup.nc -a run.nc --engine flat --scheme tps
+          - contents run.nc
+          - [visit-all, run.nc, -o, init.nc, -s, A, -s, B]
+
+    All commands run in a single process, so OpenPathSampling is only
+    imported once, and each file is only opened once and then shared
+    between the commands that use it. The batch stops at the first command
+    that fails.
+    """
+    batch_main(load_plan(plan_file))
+
+
+def load_plan(plan_file):
+    """Load the list of commands from a plan file.
+
+    Returns
+    -------
+    List[List[str]] :
+        the arguments for each command
+    """
+    from paths_cli.commands.compile import select_loader
+    loader = select_loader(plan_file)
+    with open(plan_file, mode='r') as f:
+        plan = loader(f)
+
+    if isinstance(plan, dict):
+        plan = plan.get('commands', [])
+
+    commands = []
+    for command in plan:
+        if isinstance(command, str):
+            command = shlex.split(command)
+        commands.append([str(arg) for arg in command])
+    return commands
+
+
+def batch_main(commands):
+    from paths_cli.cli import main
+    with StorageLoader.sharing():
+        for command in commands:
+            print("Running: openpathsampling "
+                  + " ".join(shlex.quote(arg) for arg in command))
+            main.main(args=command, prog_name="openpathsampling",
+                      standalone_mode=False)
+
+
+PLUGIN = OPSCommandPlugin(
+    command=batch,
+    section="Workflow",
+    requires_ops=(1, 0),
+    requires_cli=(0, 3)
+)
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+
+import click
+
+from paths_cli import OPSCommandPlugin
+from paths_cli.param_core import StorageLoader
+from paths_cli.parameters import INPUT_FILE, OUTPUT_FILE
+from paths_cli.commands.convert import load_simulation_objects
+
+# objects to start from when finding what to keep
+KEEP_CHOICES = ['tags', 'final-samples', 'accepted-steps', 'all-steps']
+
+
+@click.command(
+    'compact',
+    short_help="copy only the data that is still used to a new .db file",
+)
+@INPUT_FILE.clicked(required=True)
+@OUTPUT_FILE.clicked(required=True)
+@click.option('--keep', type=click.Choice(KEEP_CHOICES), multiple=True,
+              default=('tags', 'all-steps'), show_default=True,
+              help=("what to keep (along with everything it refers to); "
+                    "can be used more than once"))
+@click.option('--blocksize', type=click.IntRange(min=1), default=100,
+              show_default=True,
+              help="number of MC steps to load and save at a time")
+def compact(input_file, output_file, keep, blocksize):
+    """Copy the parts of INPUT_FILE that are still used to a new file.
+
+    Simulation objects (engines, CVs, schemes, etc.) are always kept.
+    Other objects are kept if they can be reached from what is chosen
+    with ``--keep``:
+
+    \b
+    * tags: tagged objects, such as initial conditions
+    * final-samples: the sample set from the last MC step
+    * accepted-steps: MC steps where the move was accepted
+    * all-steps: all MC steps, including the trials of rejected moves
+
+    Everything else (e.g., trajectories or snapshots that nothing refers
+    to any more) is dropped. The output is a SimStore (.db) file, which is
+    vacuumed at the end. Disk-cached CV values are not copied; they can be
+    recalculated as needed.
+    """
+    from paths_cli.file_copying import check_simstore_output
+    check_simstore_output(output_file, input_file)
+
+    input_storage = INPUT_FILE.get(input_file)
+    # as in convert: load before opening the SimStore output
+    simulation_objects = load_simulation_objects(input_storage)
+    output_storage = OUTPUT_FILE.get(output_file)
+    compact_main(input_storage, output_storage, simulation_objects, keep,
+                 blocksize)
+
+    # VACUUM needs its own connection, so it waits until the output is closed
+    def vacuum_and_report():
+        vacuum(output_file)
+        print(size_report(input_file, output_file))
+
+    StorageLoader.pool.after_close(output_storage, vacuum_and_report)
+
+
+def vacuum(filename):
+    """Rebuild a SQLite file to remove unused space."""
+    connection = sqlite3.connect(filename, isolation_level=None)
+    try:
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+
+def size_report(input_file, output_file):
+    """Report of how much smaller the output file is than the input"""
+    in_size = os.path.getsize(input_file)
+    out_size = os.path.getsize(output_file)
+    saved = in_size - out_size
+    percent = 100.0 * saved / in_size if in_size else 0.0
+    return (f"{input_file}: {in_size:,} bytes\n"
+            f"{output_file}: {out_size:,} bytes\n"
+            f"Saved {saved:,} bytes ({percent:.1f}%)")
+
+
+def compact_main(input_storage, output_storage, simulation_objects, keep,
+                 blocksize):
+    """Save the objects reachable from the chosen roots.
+
+    Saving an object to SimStore also saves everything it refers to, so
+    saving the roots saves exactly what is reachable from them.
+
+    Parameters
+    ----------
+    input_storage : :class:`openpathsampling.Storage`
+        storage to copy from
+    output_storage : :class:`openpathsampling.Storage`
+        storage to copy to
+    simulation_objects : List[Any]
+        simulation objects, which are always kept
+    keep : List[str]
+        roots to keep; see :data:`.KEEP_CHOICES`
+    blocksize : int
+        number of MC steps to load and save at a time
+    """
+    from tqdm.auto import tqdm
+    from paths_cli.file_copying import iter_blocks
+    output_storage.save(simulation_objects)
+
+    if 'tags' in keep:
+        for key in input_storage.tags.keys():
+            output_storage.tags[key] = input_storage.tags[key]
+
+    steps = input_storage.steps
+    if 'final-samples' in keep and len(steps) > 0:
+        output_storage.save(steps[-1].active)
+
+    if 'all-steps' in keep or 'accepted-steps' in keep:
+        accepted_only = 'all-steps' not in keep
+        n_blocks = -(-len(steps) // blocksize)
+        for block in tqdm(iter_blocks(steps, blocksize), total=n_blocks,
+                          desc="Blocks of steps"):
+            if accepted_only:
+                block = [step for step in block if step.change.accepted]
+            output_storage.save(block)
+
+    return output_storage, None
+
+
+PLUGIN = OPSCommandPlugin(
+    command=compact,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 3)
+)
@@ -7,7 +7,9 @@ from paths_cli import OPSCommandPlugin
 from paths_cli.compiling.plugins import (
     CategoryPlugin, InstanceCompilerPlugin
 )
-from paths_cli.plugin_management import NamespacePluginLoader
+from paths_cli.plugin_management import (
+    NamespacePluginLoader, COMPILING_ENTRY_POINTS
+)
 import importlib
 from paths_cli.utils import get_installed_plugins
 from paths_cli.commands.contents import report_all_tables
@@ -61,7 +63,8 @@ def register_installed_plugins():
     plugins = get_installed_plugins(
         default_loader=NamespacePluginLoader('paths_cli.compiling',
                                              plugin_types),
-        plugin_types=plugin_types
+        plugin_types=plugin_types,
+        entry_point_group=COMPILING_ENTRY_POINTS
     )
     register_plugins(plugins)
 
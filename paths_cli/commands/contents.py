@@ -1,6 +1,10 @@
+import json
+import os
+
 import click
 from paths_cli.parameters import INPUT_FILE
 from paths_cli import OPSCommandPlugin
+from paths_cli.name_index import NameIndex
 
 UNNAMED_SECTIONS = ['steps', 'movechanges', 'samplesets', 'trajectories',
                     'snapshots']
@@ -20,6 +24,15 @@ NAME_TO_ATTR = {
     'Snapshots': 'snapshots'
 }
 
+# sections in the report of all tables, in order
+NAMED_SECTIONS = ['CVs', 'Volumes', 'Engines', 'Networks', 'Move Schemes',
+                  'Simulations', 'Tags']
+DATA_SECTIONS = ['Steps', 'Move Changes', 'SampleSets', 'Trajectories',
+                 'Snapshots']
+
+# netCDF dimension/variable prefix for tables where it isn't the table name
+NETCDF_PREFIXES = {'cvs': 'attributes', 'tags': 'tag'}
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -30,76 +43,213 @@ logger = logging.getLogger(__name__)
 @INPUT_FILE.clicked(required=True)
 @click.option('--table', type=str, required=False,
               help="table to show results from")
-def contents(input_file, table):
+@click.option('--format', 'output_format', type=click.Choice(['text', 'json']),
+              default='text', show_default=True,
+              help="output format; json is for use by other programs")
+@click.option('--sizes', is_flag=True, default=False,
+              help="also report the bytes used by each table and column")
+def contents(input_file, table, output_format, sizes):
     """List the names of named objects in an OPS storage file.
 
     This is particularly useful when getting ready to use a simulation
     command (i.e., to identify exactly how a state or engine is named.)
+
+    For netCDF (.nc) files, the numbers of objects and the names are read
+    directly from the file, without loading any objects, so this is fast
+    even for large files.
+
+    With ``--sizes``, this also reports how many bytes each table (and
+    each column in it) uses, and the average bytes per snapshot and per
+    MC step.
     """
-    storage = INPUT_FILE.get(input_file)
-    try:
-        print(storage.filename)
-    except AttributeError:  # no-cov  (temporary fix)
-        # TODO: this should be removed once SimStore has a `filename`
-        # attribute
-        print(storage)
     if table is None:
-        report_all_tables(storage)
+        summary = summarize_file(input_file)
     else:
+        storage = INPUT_FILE.get(input_file)
         table_attr = table.lower()
         try:
             store = getattr(storage, table_attr)
         except AttributeError:
             raise click.UsageError("Unknown table: '" + table_attr + "'")
+        summary = {'file': os.path.abspath(input_file),
+                   'tables': {table_attr: summarize_store(table_attr, store)}}
+
+    if sizes:
+        from paths_cli.storage_sizes import storage_sizes
+        summary['sizes'] = storage_sizes(
+            input_file, INPUT_FILE._is_simstore(input_file)
+        )
+
+    if output_format == 'json':
+        print(json.dumps(summary, indent=2))
+    else:
+        print(input_file)
+        if table is None:
+            print(get_summary_string(summary))
         else:
-            print(get_section_string(table_attr, store))
+            print(get_section_string_from_summary(
+                table_attr, summary['tables'][table_attr]
+            ))
+        if sizes:
+            from paths_cli.storage_sizes import get_sizes_string
+            print("\n" + get_sizes_string(summary['sizes']))
+
+
+def summarize_store(attr, store):
+    """Number of objects (and the names, if nameable) in a store.
+
+    Counts come from ``len(store)``, which both backends answer without
+    loading objects; names come from the storage's index of names (see
+    :class:`.NameIndex`).
+
+    Parameters
+    ----------
+    attr : str
+        the name of the store as an attribute of the storage (e.g.,
+        ``'engines'``)
+    store : Any
+        the store
+
+    Returns
+    -------
+    Dict[str, Any] :
+        ``count`` for every store; for nameable stores, also ``names`` (a
+        list of the names) and ``n_unnamed``
+    """
+    count = len(store)
+    if attr in UNNAMED_SECTIONS:
+        return {'count': count}
+    if attr in ['tag', 'tags']:
+        names = list(store.keys())
+        n_named = len(names)
+    else:
+        index = NameIndex(store)
+        names = list(index)
+        n_named = index.n_named
+    return {'count': count, 'names': names, 'n_unnamed': count - n_named}
+
+
+def summarize_storage(storage):
+    """Summary of all tables in an open storage.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]] :
+        summary of each table (as from :func:`.summarize_store`), keyed by
+        the table attribute name
+    """
+    attrs = [NAME_TO_ATTR[section]
+             for section in NAMED_SECTIONS + DATA_SECTIONS]
+    return {attr: summarize_store(attr, getattr(storage, attr))
+            for attr in attrs}
+
+
+def _netcdf_names(names, first_wins):
+    # same order and choice of object as the storage's own name index
+    positions = {}
+    for idx, name in enumerate(names):
+        if name and (not first_wins or name not in positions):
+            positions[name] = idx
+    n_named = sum(1 for name in names if name)
+    ordered = sorted(positions, key=positions.get)
+    return ordered, n_named
+
+
+def summarize_netcdf(filename):
+    """Summary of all tables in a netCDF file, read without OPS.
+
+    This reads the length of each store's dimension and the names in each
+    store's ``<prefix>_name`` variable, which is what the OPS stores do
+    for ``len`` and for their name index. Opening the file with OPS also
+    loads the UUIDs of every object, which is slow for large files.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]] or None :
+        as for :func:`.summarize_storage`, or None if the file doesn't
+        have the expected layout
+    """
+    import netCDF4
+    try:
+        dataset = netCDF4.Dataset(filename, mode='r')
+    except OSError:
+        return None
+
+    tables = {}
+    try:
+        for section in NAMED_SECTIONS + DATA_SECTIONS:
+            attr = NAME_TO_ATTR[section]
+            prefix = NETCDF_PREFIXES.get(attr, attr)
+            dimension = dataset.dimensions.get(prefix)
+            if dimension is None:
+                return None
+            count = len(dimension)
+            if attr == 'snapshots':
+                count *= 2  # each snapshot is also stored reversed
+            if attr in UNNAMED_SECTIONS:
+                tables[attr] = {'count': count}
+                continue
+            name_var = dataset.variables.get(prefix + "_name")
+            if name_var is None:
+                return None
+            names, n_named = _netcdf_names([str(name)
+                                            for name in name_var[:]],
+                                           first_wins=(attr == 'tags'))
+            tables[attr] = {'count': count, 'names': names,
+                            'n_unnamed': count - n_named}
+    finally:
+        dataset.close()
+
+    return tables
+
+
+def summarize_file(filename):
+    """Summary of all tables in a storage file.
+
+    netCDF files are read directly (see :func:`.summarize_netcdf`);
+    anything else is opened with OPS.
+
+    Returns
+    -------
+    Dict[str, Any] :
+        with ``file`` (the absolute path to the file) and ``tables`` (as
+        from :func:`.summarize_storage`)
+    """
+    tables = None
+    if not INPUT_FILE._is_simstore(filename):
+        tables = summarize_netcdf(filename)
+    if tables is None:
+        tables = summarize_storage(INPUT_FILE.get(filename))
+    return {'file': os.path.abspath(filename), 'tables': tables}
+
+
+def get_summary_string(summary):
+    tables = summary['tables']
+    lines = [get_section_string_from_summary(section,
+                                             tables[NAME_TO_ATTR[section]])
+             for section in NAMED_SECTIONS]
+    lines.append("\nData Objects:")
+    lines.extend(get_section_string_from_summary(section,
+                                                 tables[NAME_TO_ATTR[section]])
+                 for section in DATA_SECTIONS)
+    return "\n".join(lines)
 
 
 def get_section_string(label, store):
     attr = NAME_TO_ATTR.get(label, label.lower())
     logger.debug(f"Working on {attr}")
-    if attr in UNNAMED_SECTIONS:
-        string = get_unnamed_section_string(label, store)
-    elif attr in ['tag', 'tags']:
-        string = get_section_string_nameable(label, store, _get_named_tags)
-    else:
-        string = get_section_string_nameable(label, store,
-                                             _get_named_namedobj)
-    return string
+    return get_section_string_from_summary(label,
+                                           summarize_store(attr, store))
 
 
 def report_all_tables(storage):
-    store_section_mapping = {
-        'CVs': storage.cvs, 'Volumes': storage.volumes,
-        'Engines': storage.engines, 'Networks': storage.networks,
-        'Move Schemes': storage.schemes,
-        'Simulations': storage.pathsimulators,
-    }
-    for section, store in store_section_mapping.items():
-        print(get_section_string_nameable(section, store,
-                                          _get_named_namedobj))
-    print(get_section_string_nameable('Tags', storage.tags, _get_named_tags))
-
-    print("\nData Objects:")
-    data_object_mapping = {
-        'Steps': lambda storage: storage.steps,
-        'Move Changes': lambda storage: storage.movechanges,
-        'SampleSets': lambda storage: storage.samplesets,
-        'Trajectories': lambda storage: storage.trajectories,
-        'Snapshots': lambda storage: storage.snapshots
-    }
-
-    for section, store_func in data_object_mapping.items():
-        store = store_func(storage)
-        print(get_unnamed_section_string(section, store))
+    print(get_summary_string({'tables': summarize_storage(storage)}))
 
 def _item_or_items(count):
     return "item" if count == 1 else "items"
 
 def get_unnamed_section_string(section, store):
-    len_store = len(store)
-    return (section + ": " + str(len_store) + " unnamed "
-            + _item_or_items(len_store))
+    return get_section_string_from_summary(section, {'count': len(store)})
 
 def _get_named_namedobj(store):
     return [item.name for item in store if item.is_named]
@@ -108,12 +258,21 @@ def _get_named_tags(store):
     return list(store.keys())
 
 def get_section_string_nameable(section, store, get_named):
-    out_str = ""
     len_store = len(store)
-    out_str += (section + ": " + str(len_store) + " "
-                + _item_or_items(len_store))
     named = get_named(store)
-    n_unnamed = len_store - len(named)
+    table_summary = {'count': len_store, 'names': named,
+                     'n_unnamed': len_store - len(named)}
+    return get_section_string_from_summary(section, table_summary)
+
+def get_section_string_from_summary(section, table_summary):
+    count = table_summary['count']
+    if 'names' not in table_summary:
+        return (section + ": " + str(count) + " unnamed "
+                + _item_or_items(count))
+
+    out_str = section + ": " + str(count) + " " + _item_or_items(count)
+    named = table_summary['names']
+    n_unnamed = table_summary['n_unnamed']
     for name in named:
         out_str += "\n* " + name
     if n_unnamed > 0:
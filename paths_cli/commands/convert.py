@@ -0,0 +1,188 @@
+import click
+
+from paths_cli import OPSCommandPlugin
+from paths_cli.parameters import INPUT_FILE, OUTPUT_FILE, APPEND_FILE
+from paths_cli.memory_budget import MEMORY_BUDGET
+
+# stores with simulation objects; these are small, and are loaded all at
+# once (any that don't exist in the input are skipped)
+SIMULATION_STORES = ['topologies', 'cvs', 'volumes', 'ensembles', 'engines',
+                     'shootingpointselectors', 'pathmovers', 'transitions',
+                     'networks', 'interfacesets', 'msouters', 'schemes',
+                     'pathsimulators']
+
+# stores with simulation results, copied in this order in blocks; each
+# block's objects can refer to objects from earlier stages
+DATA_STAGES = ['snapshots', 'trajectories', 'samplesets', 'steps']
+
+
+@click.command(
+    'convert',
+    short_help="convert a netCDF (.nc) file to SimStore (.db)",
+)
+@INPUT_FILE.clicked(required=True)
+@OUTPUT_FILE.clicked(required=True)
+@click.option('--blocksize', type=click.IntRange(min=1), default=100,
+              show_default=True,
+              help="number of objects to load and save at a time")
+@MEMORY_BUDGET.clicked(required=False)
+@click.option('--restart', is_flag=True, default=False,
+              help=("start over, even if an earlier conversion to the "
+                    "output file was interrupted"))
+def convert(input_file, output_file, blocksize, memory_budget, restart):
+    """Convert INPUT_FILE to a SimStore (.db) file.
+
+    Everything in INPUT_FILE is copied: simulation objects (engines, CVs,
+    schemes, etc.), then snapshots, trajectories, sample sets, and MC
+    steps, and finally tags. The simulation results are copied in blocks,
+    so that only one block is in memory at a time.
+
+    Progress is recorded in a sidecar file next to the output file (the
+    output filename with ``.progress`` added). If the conversion is
+    interrupted, running the same command again continues from the last
+    finished block, unless ``--restart`` is given. The sidecar file is
+    removed when the conversion finishes.
+
+    With ``--memory-budget``, the first block of snapshots is sized from
+    the size of a snapshot, and blocks of other objects start at
+    ``--blocksize``; after each block, the block size is adjusted from the
+    memory this process uses.
+    """
+    from paths_cli.file_copying import CopyProgress, check_simstore_output
+    check_simstore_output(output_file, input_file)
+
+    input_storage = INPUT_FILE.get(input_file)
+    # load these before the output is opened: opening SimStore changes
+    # how some OPS classes are loaded, which breaks loading from netCDF
+    simulation_objects = load_simulation_objects(input_storage)
+
+    progress_file = output_file + ".progress"
+    progress = None
+    if not restart:
+        progress = CopyProgress.load(progress_file, input_file)
+
+    if progress is None:
+        progress = CopyProgress(progress_file, input_file)
+        output_storage = OUTPUT_FILE.get(output_file)
+    else:
+        print(f"Resuming conversion to {output_file}")
+        output_storage = APPEND_FILE.get(output_file)
+
+    convert_main(input_storage, output_storage, simulation_objects,
+                 blocksize, progress, memory_budget)
+    progress.remove()
+
+
+def load_simulation_objects(storage):
+    """Load all simulation objects from a storage.
+
+    Returns
+    -------
+    List[Any] :
+        objects from every store in :data:`.SIMULATION_STORES` that exists
+        in the storage
+    """
+    objects = []
+    for store_name in SIMULATION_STORES:
+        store = getattr(storage, store_name, None)
+        if store is not None:
+            objects.extend(store)
+    return objects
+
+
+def _save_durably(storage, objects):
+    from paths_cli.write_behind import flush_storage
+    from paths_cli.staging import staged_output
+    storage.save(objects)
+    # progress may only be recorded after the objects are really saved,
+    # which for staged output means in the file on disk
+    flush_storage(storage)
+    staged = staged_output(storage)
+    if staged is not None:
+        staged.checkpoint()
+
+
+def _bytes_per_snapshot(input_storage):
+    from paths_cli.memory_budget import snapshot_nbytes
+    snapshots = input_storage.snapshots
+    return snapshot_nbytes(snapshots[0]) if len(snapshots) else 0
+
+
+def _stage_blocksize(stage, blocksize, memory_budget, bytes_per_snapshot):
+    if memory_budget is None:
+        return blocksize
+    from paths_cli.memory_budget import (
+        BlocksizeTuner, estimate_blocksize, max_blocksize, current_rss
+    )
+    if stage == 'snapshots':
+        blocksize = estimate_blocksize(memory_budget, bytes_per_snapshot,
+                                       current_rss())
+    # no block of other objects can be bigger than a block of snapshots
+    return BlocksizeTuner(memory_budget, blocksize,
+                          max_blocksize(memory_budget, bytes_per_snapshot))
+
+
+def convert_main(input_storage, output_storage, simulation_objects,
+                 blocksize, progress, memory_budget=None):
+    """Copy everything from one storage to another.
+
+    Parameters
+    ----------
+    input_storage : :class:`openpathsampling.Storage`
+        storage to copy from
+    output_storage : :class:`openpathsampling.Storage`
+        storage to copy to
+    simulation_objects : List[Any]
+        simulation objects to copy, as from
+        :func:`.load_simulation_objects`
+    blocksize : int
+        number of objects to load and save at a time
+    progress : :class:`paths_cli.file_copying.CopyProgress`
+        what has already been copied; this is updated after each block
+    memory_budget : int or None
+        if given, memory budget in bytes that block sizes are adjusted to
+        stay within (``blocksize`` is then only the first block size for
+        stages other than snapshots)
+    """
+    from tqdm.auto import tqdm
+    from paths_cli.file_copying import iter_blocks
+    stages = ['simulation objects'] + DATA_STAGES + ['tags']
+    bytes_per_snapshot = None
+    if memory_budget is not None:
+        bytes_per_snapshot = _bytes_per_snapshot(input_storage)
+    for stage in tqdm(stages, desc="All stages"):
+        desc = "This stage: {}".format(stage)
+        if stage == 'simulation objects':
+            if not progress.n_done(stage):
+                _save_durably(output_storage, simulation_objects)
+                progress.update(stage, len(simulation_objects))
+        elif stage == 'tags':
+            for key in tqdm(list(input_storage.tags.keys()), desc=desc,
+                            leave=False):
+                output_storage.tags[key] = input_storage.tags[key]
+        else:
+            store = getattr(input_storage, stage)
+            n_done = progress.n_done(stage)
+            stage_blocksize = _stage_blocksize(stage, blocksize,
+                                               memory_budget,
+                                               bytes_per_snapshot)
+            with tqdm(total=len(store), initial=n_done, desc=desc,
+                      leave=False) as pbar:
+                for block in iter_blocks(store, stage_blocksize,
+                                         start=n_done):
+                    _save_durably(output_storage, block)
+                    n_done += len(block)
+                    progress.update(stage, n_done)
+                    pbar.update(len(block))
+                    if memory_budget is not None:
+                        stage_blocksize.update(len(block))
+
+    return output_storage, None
+
+
+PLUGIN = OPSCommandPlugin(
+    command=convert,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 3)
+)
@@ -0,0 +1,46 @@
+import json
+
+import click
+from paths_cli import OPSCommandPlugin
+
+
+@click.group(
+    'debug',
+    short_help="tools for debugging the CLI itself",
+)
+def debug():
+    """Tools for debugging problems with the CLI and its plugins."""
+
+
+@debug.command(
+    'startup-profile',
+    short_help="time each phase of starting the CLI",
+)
+@click.option('--json', 'json_file', type=click.File(mode='w'),
+              default=None, help="also write the results to this JSON file")
+@click.option('--preload', type=str, multiple=True,
+              help=("slow module to time importing (instead of "
+                    "OpenPathSampling and its storage); may be used more "
+                    "than once"))
+def startup_profile(json_file, preload):
+    """Report how long each phase of starting the CLI takes.
+
+    This runs a fresh Python process that imports the CLI, then finds and
+    loads every candidate plugin module from each place that plugins can be
+    installed, and then imports the slow modules that most commands need.
+    The results are reported slowest first. This is useful for finding a
+    plugin that makes every command slow to start.
+    """
+    from paths_cli.startup_profile import run_profile, format_report
+    records = run_profile(preload=list(preload) or None)
+    print(format_report(records))
+    if json_file:
+        json.dump(records, json_file, indent=2)
+
+
+PLUGIN = OPSCommandPlugin(
+    command=debug,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 3)
+)
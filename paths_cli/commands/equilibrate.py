@@ -43,6 +43,7 @@ def equilibrate(input_file, output_file, scheme, init_conds, multiplier,
 def equilibrate_main(output_storage, scheme, init_conds, multiplier,
                      extra_steps):
     import openpathsampling as paths
+    from paths_cli.staging import attach_checkpoint_hooks
     init_conds = scheme.initial_conditions_from_trajectories(init_conds)
     scheme.assert_initial_conditions(init_conds)
     simulation = paths.PathSampling(
@@ -50,6 +51,7 @@ def equilibrate_main(output_storage, scheme, init_conds, multiplier,
         move_scheme=scheme,
         sample_set=init_conds
     )
+    attach_checkpoint_hooks(simulation, output_storage)
     simulation.run_until_decorrelated()
     n_decorr = simulation.step
     simulation.run(n_decorr * (multiplier - 1) + extra_steps)
@@ -0,0 +1,98 @@
+import click
+
+from paths_cli import OPSCommandPlugin
+from paths_cli.parameters import INPUT_FILE, OUTPUT_FILE
+from paths_cli.commands.convert import load_simulation_objects
+
+
+def parse_step_range(ctx, param, value):
+    """Click callback to read a range of steps as ``START:STOP``"""
+    start, sep, stop = value.partition(':')
+    try:
+        if not sep:
+            raise ValueError()
+        start = int(start) if start.strip() else None
+        stop = int(stop) if stop.strip() else None
+    except ValueError:
+        raise click.BadParameter("Steps must be given as START:STOP, not "
+                                 f"'{value}'")
+    return start, stop
+
+
+@click.command(
+    'extract',
+    short_help="copy a range of MC steps to a new .db file",
+)
+@INPUT_FILE.clicked(required=True)
+@OUTPUT_FILE.clicked(required=True)
+@click.option('--steps', type=str, required=True,
+              callback=parse_step_range,
+              help=("range of MC steps to copy, as START:STOP (like a "
+                    "Python slice: STOP is not included, and either can "
+                    "be left out)"))
+@click.option('--stride', type=click.IntRange(min=1), default=1,
+              show_default=True, help="copy every STRIDE-th step")
+@click.option('--blocksize', type=click.IntRange(min=1), default=100,
+              show_default=True,
+              help="number of MC steps to load and save at a time")
+def extract(input_file, output_file, steps, stride, blocksize):
+    """Copy some of the MC steps in INPUT_FILE to a new file.
+
+    The output is a SimStore (.db) file with all the simulation objects
+    (engines, CVs, schemes, etc.) from INPUT_FILE, and the selected steps
+    with everything they refer to. Steps are numbered by their position in
+    INPUT_FILE, starting from 0.
+    """
+    from paths_cli.file_copying import check_simstore_output
+    check_simstore_output(output_file, input_file)
+    start, stop = steps
+    input_storage = INPUT_FILE.get(input_file)
+    # as in convert: load before opening the SimStore output
+    simulation_objects = load_simulation_objects(input_storage)
+    output_storage = OUTPUT_FILE.get(output_file)
+    extract_main(input_storage, output_storage, simulation_objects, start,
+                 stop, stride, blocksize)
+
+
+def extract_main(input_storage, output_storage, simulation_objects, start,
+                 stop, stride, blocksize):
+    """Save a range of steps, and the simulation objects.
+
+    Parameters
+    ----------
+    input_storage : :class:`openpathsampling.Storage`
+        storage to copy from
+    output_storage : :class:`openpathsampling.Storage`
+        storage to copy to
+    simulation_objects : List[Any]
+        simulation objects to copy
+    start : int or None
+        index of the first step to copy
+    stop : int or None
+        index of the step to stop before
+    stride : int
+        copy every ``stride``-th step
+    blocksize : int
+        number of MC steps to load and save at a time
+    """
+    from tqdm.auto import tqdm
+    from paths_cli.file_copying import iter_blocks
+    output_storage.save(simulation_objects)
+    steps = input_storage.steps
+    n_steps = len(range(*slice(start, stop, stride).indices(len(steps))))
+    with tqdm(total=n_steps, desc="Steps") as pbar:
+        blocks = iter_blocks(steps, blocksize, start=start or 0, stop=stop,
+                             stride=stride)
+        for block in blocks:
+            output_storage.save(block)
+            pbar.update(len(block))
+
+    return output_storage, None
+
+
+PLUGIN = OPSCommandPlugin(
+    command=extract,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 3)
+)
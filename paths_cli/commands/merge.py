@@ -0,0 +1,173 @@
+import collections
+import os
+import sqlite3
+
+import click
+
+from paths_cli import OPSCommandPlugin
+from paths_cli.param_core import StorageLoader
+from paths_cli.parameters import INPUT_FILE, OUTPUT_FILE
+from paths_cli.commands.convert import load_simulation_objects
+
+# table in the output that says which run each step came from
+RUNS_TABLE = 'merged_runs'
+
+
+@click.command(
+    'merge',
+    short_help="combine several runs into one .db file",
+)
+@click.argument('input_files', nargs=-1, required=True,
+                type=click.Path(exists=True, readable=True))
+@OUTPUT_FILE.clicked(required=True)
+@click.option('--blocksize', type=click.IntRange(min=1), default=100,
+              show_default=True,
+              help="number of MC steps to load and save at a time")
+def merge(input_files, output_file, blocksize):
+    """Combine the runs in INPUT_FILES into one SimStore (.db) file.
+
+    Objects that are in more than one input (such as engines, CVs, and
+    initial conditions from the same setup) are only saved once. The MC
+    steps from each input are all kept. Since the runs are independent,
+    their MC cycle numbers overlap; the output has a table called
+    ``merged_runs`` that gives the run index (the position of the input
+    file in INPUT_FILES) and the input file for each step, by UUID. (A
+    step that is in more than one input is listed with the last one.)
+
+    A tag that is the same object in every input that has it keeps its
+    name. Otherwise, the tag from each input is saved with ``_run<index>``
+    added to its name.
+    """
+    from paths_cli.file_copying import check_simstore_output
+    for input_file in input_files:
+        check_simstore_output(output_file, input_file)
+
+    # as in convert: load from netCDF before opening any SimStore file
+    n_inputs = len(input_files)
+    input_storages = [None] * n_inputs
+    simulation_objects = [None] * n_inputs
+    order = sorted(range(n_inputs),
+                   key=lambda run: StorageLoader._is_simstore(
+                       input_files[run]))
+    for run in order:
+        input_storages[run] = INPUT_FILE.get(input_files[run])
+        simulation_objects[run] = load_simulation_objects(
+            input_storages[run])
+
+    output_storage = OUTPUT_FILE.get(output_file)
+    _, step_runs = merge_main(input_storages, input_files, output_storage,
+                              simulation_objects, blocksize)
+    # the table is written with its own connection, after the output is
+    # closed
+    if step_runs:
+        StorageLoader.pool.after_close(
+            output_storage,
+            lambda: write_runs_table(output_file, step_runs)
+        )
+
+
+def merged_tags(input_storages):
+    """Names for the tags in the merged file.
+
+    Returns
+    -------
+    Dict[str, Tuple[int, str]] :
+        mapping of the tag name in the output to the input index and tag
+        name in that input
+    """
+    by_key = collections.defaultdict(list)
+    for run, storage in enumerate(input_storages):
+        for key in storage.tags.keys():
+            by_key[key].append(run)
+
+    tags = {}
+    for key, runs in by_key.items():
+        uuids = {input_storages[run].tags[key].__uuid__ for run in runs}
+        if len(uuids) == 1:
+            tags[key] = (runs[0], key)
+        else:
+            tags.update({f"{key}_run{run}": (run, key) for run in runs})
+    return tags
+
+
+def write_runs_table(filename, step_runs):
+    """Write the table of which run each step came from.
+
+    Parameters
+    ----------
+    filename : str
+        the SQLite file (must not be open with a different connection that
+        could overwrite it)
+    step_runs : List[Tuple[str, int, str]]
+        step UUID (as a string), run index, and input filename for each
+        step
+    """
+    connection = sqlite3.connect(filename)
+    try:
+        with connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {RUNS_TABLE} "
+                "(step_uuid TEXT PRIMARY KEY, run INTEGER, source TEXT)"
+            )
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {RUNS_TABLE} VALUES (?, ?, ?)",
+                step_runs
+            )
+    finally:
+        connection.close()
+
+
+def merge_main(input_storages, input_files, output_storage,
+               simulation_objects, blocksize):
+    """Save everything from several storages into one.
+
+    Parameters
+    ----------
+    input_storages : List[:class:`openpathsampling.Storage`]
+        storages to copy from
+    input_files : List[str]
+        filenames of the input storages (recorded for each step)
+    output_storage : :class:`openpathsampling.Storage`
+        storage to copy to
+    simulation_objects : List[List[Any]]
+        simulation objects from each input
+    blocksize : int
+        number of MC steps to load and save at a time
+
+    Returns
+    -------
+    output_storage : :class:`openpathsampling.Storage`
+        the output storage
+    step_runs : List[Tuple[str, int, str]]
+        step UUID (as a string), run index, and input filename for each
+        step, as for :func:`.write_runs_table`
+    """
+    from tqdm.auto import tqdm
+    from paths_cli.file_copying import iter_blocks
+    for objects in simulation_objects:
+        output_storage.save(objects)
+
+    for new_key, (run, key) in merged_tags(input_storages).items():
+        output_storage.tags[new_key] = input_storages[run].tags[key]
+
+    step_runs = []
+    for run, (storage, filename) in enumerate(zip(input_storages,
+                                                  input_files)):
+        source = os.path.abspath(filename)
+        steps = storage.steps
+        with tqdm(total=len(steps), desc=f"Run {run}") as pbar:
+            for block in iter_blocks(steps, blocksize):
+                output_storage.save(block)
+                step_runs.extend((str(step.__uuid__), run, source)
+                                 for step in block)
+                pbar.update(len(block))
+
+    return output_storage, step_runs
+
+
+PLUGIN = OPSCommandPlugin(
+    command=merge,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 3)
+)
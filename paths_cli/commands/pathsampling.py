@@ -26,12 +26,14 @@ def pathsampling(input_file, output_file, scheme, init_conds, nsteps):
 
 def pathsampling_main(output_storage, scheme, init_conds, n_steps):
     import openpathsampling as paths
+    from paths_cli.staging import attach_checkpoint_hooks
     init_conds = scheme.initial_conditions_from_trajectories(init_conds)
     simulation = paths.PathSampling(
         storage=output_storage,
         move_scheme=scheme,
         sample_set=init_conds
     )
+    attach_checkpoint_hooks(simulation, output_storage)
     simulation.run(n_steps)
     if output_storage:
         output_storage.tags['final_conditions'] = simulation.sample_set
@@ -0,0 +1,212 @@
+import click
+
+from paths_cli import OPSCommandPlugin
+from paths_cli.param_core import StorageLoader
+from paths_cli.file_copying import INPUT_APPEND_FILE, PRECOMPUTE_CVS
+from paths_cli.memory_budget import MEMORY_BUDGET
+
+
+@click.command(
+    'precompute-cvs',
+    short_help="calculate CVs for all snapshots and save them in the file",
+)
+@INPUT_APPEND_FILE.clicked(required=True)
+@PRECOMPUTE_CVS.clicked(required=False)
+@click.option('--workers', type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help=("number of processes to calculate CVs in (more than "
+                    "one requires a SimStore file)"))
+@click.option('--prefetch', type=click.IntRange(min=1), default=2,
+              show_default=True,
+              help=("number of blocks queued for each worker process; "
+                    "more keeps the workers busy, but uses more memory"))
+@click.option('--blocksize', type=click.IntRange(min=1), default=1000,
+              show_default=True,
+              help="number of snapshots to calculate and save at a time")
+@MEMORY_BUDGET.clicked(required=False)
+def precompute(append_file, cv, workers, prefetch, blocksize,
+               memory_budget):
+    """Calculate CVs for the snapshots in APPEND_FILE, and save the values.
+
+    The values are saved in the disk cache for each CV, so that analysis
+    can load them instead of calculating them again. Values that are
+    already in the disk cache aren't calculated again, so this can be
+    rerun to finish an earlier run that was stopped, or to add values for
+    snapshots saved since the last run.
+
+    For SimStore (.db) files, the CVs can be calculated in several
+    processes with ``--workers``. Each worker loads its snapshots from the
+    file, and this process saves the values as they come in, a block at a
+    time; ``--prefetch`` sets how many blocks each worker has queued.
+    NetCDF (.nc) files can't be read while another process is writing to
+    them, so they are only calculated in this process.
+
+    In SimStore files, only CVs from ``openpathsampling.experimental``
+    have a disk cache.
+
+    With ``--memory-budget``, the block size is estimated from the size of
+    a snapshot. When a SimStore file is calculated in this process, the
+    block size is then adjusted after each block, from the memory this
+    process uses. With several workers, the budget is shared between
+    them.
+    """
+    is_simstore = StorageLoader._is_simstore(append_file)
+    if workers > 1 and not is_simstore:
+        raise click.BadParameter("Using more than one worker requires a "
+                                 "SimStore (.db) file",
+                                 param_hint="'--workers'")
+    storage = INPUT_APPEND_FILE.get(append_file)
+    cvs = PRECOMPUTE_CVS.get(storage, cv)
+    # in SimStore, only storable-function CVs (from
+    # openpathsampling.experimental) have a disk cache
+    no_cache = [cv.name for cv in cvs
+                if is_simstore and not hasattr(cv, 'local_cache')]
+    if no_cache:
+        raise click.UsageError("These CVs can't be saved in the disk "
+                               "cache of a SimStore file: "
+                               + ", ".join(no_cache))
+    precompute_cvs_main(
+        storage=storage,
+        filename=append_file,
+        cvs=cvs,
+        blocksize=blocksize,
+        workers=workers,
+        prefetch=prefetch,
+        memory_budget=memory_budget,
+    )
+
+
+def _precompute_netcdf(storage, cvs, blocksize):
+    from tqdm.auto import tqdm
+    from paths_cli.file_copying import precompute_cvs_func_and_inputs
+    for cv in cvs:
+        # a time-reversible CV gets a complete store, which OPS fills here;
+        # does nothing if the CV already has a disk cache
+        storage.cvs.add_diskcache(cv)
+
+    precompute_func, blocks = precompute_cvs_func_and_inputs(storage, cvs,
+                                                             blocksize)
+    for block in tqdm(blocks, desc="Blocks"):
+        precompute_func(block)
+        for cv in cvs:
+            storage.cvs.sync(cv)
+
+
+def _precompute_simstore(storage, filename, cvs, blocksize, workers,
+                         prefetch):
+    from tqdm.auto import tqdm
+    from paths_cli.file_copying import (
+        simstore_snapshot_blocks, simstore_block_todo,
+        calculate_simstore_block, save_simstore_cv_results,
+        iter_precompute_results
+    )
+    from paths_cli.memory_budget import BlocksizeTuner
+    tuner = blocksize if isinstance(blocksize, BlocksizeTuner) else None
+    pbar = tqdm(total=len(storage.snapshots), desc="Snapshots")
+
+    def blocks_to_calculate():
+        # values already on disk (from an earlier run that was stopped, or
+        # before more steps were added) aren't calculated again
+        for block in simstore_snapshot_blocks(storage, blocksize):
+            todo = simstore_block_todo(storage, cvs, block)
+            if todo:
+                yield block, todo
+            else:
+                _, start, stop = block
+                pbar.update(stop - start)
+
+    items = blocks_to_calculate()
+    if workers == 1:
+        results = ((item, calculate_simstore_block(storage, cvs, item[1]))
+                   for item in items)
+    else:
+        results = iter_precompute_results(filename, cvs, items, workers,
+                                          prefetch)
+
+    with pbar:
+        for ((_, start, stop), _), block_results in results:
+            save_simstore_cv_results(storage, cvs, block_results)
+            pbar.update(stop - start)
+            if tuner is not None:
+                tuner.update(stop - start)
+
+
+def _sample_snapshot(storage, is_simstore):
+    if is_simstore:
+        tables = [table for table in storage.snapshots.tables.values()
+                  if len(table)]
+        return tables[0][0] if tables else None
+    return storage.snapshots[0] if len(storage.snapshots) else None
+
+
+def _budget_blocksize(storage, is_simstore, blocksize, memory_budget,
+                      workers):
+    from paths_cli.memory_budget import (
+        BlocksizeTuner, estimate_blocksize, max_blocksize, snapshot_nbytes,
+        current_rss
+    )
+    snapshot = _sample_snapshot(storage, is_simstore)
+    if snapshot is None:
+        return blocksize  # no snapshots to calculate CVs for
+
+    bytes_per_snapshot = snapshot_nbytes(snapshot)
+    # each worker has a block in memory; workers start about as big as
+    # this process
+    blocksize = estimate_blocksize(memory_budget // workers,
+                                   bytes_per_snapshot, current_rss())
+    if is_simstore and workers == 1:
+        # only adjusted when the blocks are in this process, where the
+        # memory use can be measured
+        blocksize = BlocksizeTuner(
+            memory_budget, blocksize,
+            max_blocksize(memory_budget, bytes_per_snapshot)
+        )
+    return blocksize
+
+
+def precompute_cvs_main(storage, filename, cvs, blocksize, workers,
+                        prefetch=2, memory_budget=None):
+    """Calculate CVs for all snapshots, and save them in the disk cache.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.Storage`
+        storage with the snapshots, opened for appending
+    filename : str
+        filename of the storage (opened by each worker)
+    cvs : List[:class:`openpathsampling.CollectiveVariable`]
+        CVs to calculate
+    blocksize : int
+        number of snapshots to calculate and save at a time
+    workers : int
+        number of worker processes; only SimStore files can use more than
+        one
+    prefetch : int
+        number of blocks queued for each worker process
+    memory_budget : int or None
+        if given, memory budget in bytes to choose the block size from,
+        instead of using ``blocksize``
+    """
+    if not cvs:
+        return storage, None
+
+    is_simstore = StorageLoader._is_simstore(filename)
+    if memory_budget is not None:
+        blocksize = _budget_blocksize(storage, is_simstore, blocksize,
+                                      memory_budget, workers)
+
+    if is_simstore:
+        _precompute_simstore(storage, filename, cvs, blocksize, workers,
+                             prefetch)
+    else:
+        _precompute_netcdf(storage, cvs, blocksize)
+
+    return storage, None
+
+
+PLUGIN = OPSCommandPlugin(
+    command=precompute,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 3)
+)
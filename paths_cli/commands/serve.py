@@ -0,0 +1,40 @@
+import click
+from paths_cli import OPSCommandPlugin
+
+
+@click.command(
+    'serve',
+    short_help="keep the CLI warm to make repeated commands faster",
+)
+@click.option('--socket', 'socket_path', type=click.Path(), default=None,
+              help=("Unix socket to listen on; default is given by "
+                    "$OPENPATHSAMPLING_CLI_SOCKET, or a socket in "
+                    "$XDG_RUNTIME_DIR or in a private (mode 0700) "
+                    "directory in the temporary directory"))
+@click.option('--preload', type=str, multiple=True,
+              help=("module to import when the server starts (in addition "
+                    "to OpenPathSampling); may be used more than once"))
+def serve(socket_path, preload):
+    """Run a server that keeps OpenPathSampling and all plugins loaded.
+
+    Commands are sent to the server with the ``openpathsampling-client``
+    executable, which takes the same arguments as ``openpathsampling``.
+    Each command runs in a fresh process forked from the server, so
+    commands start in milliseconds instead of seconds. Interactive commands
+    (such as the wizard) are not supported through the server. If no server
+    is running, ``openpathsampling-client`` runs the command itself.
+    """
+    from paths_cli.server import (
+        serve_main, default_socket_path, PRELOAD_MODULES
+    )
+    if socket_path is None:
+        socket_path = default_socket_path()
+    serve_main(socket_path, preload=PRELOAD_MODULES + list(preload))
+
+
+PLUGIN = OPSCommandPlugin(
+    command=serve,
+    section="Miscellaneous",
+    requires_ops=(1, 0),
+    requires_cli=(0, 3)
+)
@@ -4,8 +4,12 @@ This is mainly aimed at cases where a file is being copied with some sort of
 modification, or where CVs need to be disk-cached.
 """
 
+import json
+import os
+
 import click
 from tqdm.auto import tqdm
+from paths_cli.file_utils import atomic_write
 from paths_cli.param_core import (
     Option, Argument, StorageLoader, OPSStorageLoadNames
 )
@@ -37,6 +41,45 @@ PRECOMPUTE_CVS = PrecomputeLoadNames(
 )
 
 
+def check_simstore_output(output_file, input_file=None):
+    """Check that a copy can be written to the output file.
+
+    Raises
+    ------
+    click.BadParameter :
+        if the output is not a SimStore file, or is the same as the input
+    """
+    if not StorageLoader._is_simstore(output_file):
+        raise click.BadParameter("Output must be a SimStore file (.db or "
+                                 ".sql)", param_hint="'--output-file'")
+    same_file = (input_file is not None
+                 and os.path.realpath(output_file)
+                 == os.path.realpath(input_file))
+    if same_file:
+        raise click.BadParameter("Output must be a different file from "
+                                 "INPUT_FILE", param_hint="'--output-file'")
+
+
+def generate_blocks(listlike, blocksize):
+    """Make blocks out of a listlike object, one block at a time.
+
+    Parameters
+    ----------
+    listlike : Iterable
+        must be an iterable that supports slicing
+    blocksize : int
+        number of objects per block
+
+    Yields
+    ------
+    List[Any] :
+        each block of the input iterable
+    """
+    n_objs = len(listlike)
+    for start in range(0, n_objs, blocksize):
+        yield listlike[start:min(start + blocksize, n_objs)]
+
+
 def make_blocks(listlike, blocksize):
     """Make blocks out of a listlike object.
 
@@ -53,13 +96,141 @@ def make_blocks(listlike, blocksize):
     List[List[Any]] :
         the input iterable chunked into blocks
     """
-    n_objs = len(listlike)
-    partial_block = 1 if n_objs % blocksize else 0
-    n_blocks = (n_objs // blocksize) + partial_block
-    minval = lambda i: i * blocksize
-    maxval = lambda i: min((i + 1) * blocksize, n_objs)
-    blocks = [listlike[minval(i):maxval(i)] for i in range(n_blocks)]
-    return blocks
+    return list(generate_blocks(listlike, blocksize))
+
+
+class SnapshotProxyBlocks(object):
+    """Blocks of proxies for the snapshots in a netCDF storage.
+
+    The proxies for a block are only made when the iteration gets to that
+    block, so memory use doesn't grow with the number of snapshots (beyond
+    the index of UUIDs that OPS keeps for the open storage). As with
+    ``storage.snapshots.all()``, there is one proxy for each pair of a
+    snapshot and its reverse.
+
+    Parameters
+    ----------
+    snapshots : :class:`openpathsampling.storage.SnapshotWrapperStore`
+        the storage's snapshot store
+    blocksize : int
+        number of snapshots per block
+    """
+    def __init__(self, snapshots, blocksize):
+        self.snapshots = snapshots
+        self.blocksize = blocksize
+        # snapshots saved after this was made are not included
+        self.n_snapshots = len(snapshots.index.list)
+
+    def __len__(self):
+        return -(-self.n_snapshots // self.blocksize)
+
+    def __iter__(self):
+        uuids = self.snapshots.index.list
+        for start in range(0, self.n_snapshots, self.blocksize):
+            stop = min(start + self.blocksize, self.n_snapshots)
+            yield [self.snapshots.proxy(uuid) for uuid in uuids[start:stop]]
+
+
+def _current_blocksize(blocksize):
+    # the size from a BlocksizeTuner can change between blocks
+    size = getattr(blocksize, 'blocksize', blocksize)
+    if size < 1:
+        # would never get past the first block
+        raise ValueError(f"Block size must be at least 1, not {size}")
+    return size
+
+
+def iter_blocks(store, blocksize, start=0, stop=None, stride=1):
+    """Load objects from a store one block at a time.
+
+    Unlike :func:`.make_blocks`, this only loads the objects in a block when
+    that block is needed, so only one block is in memory at a time.
+
+    Parameters
+    ----------
+    store : Sequence
+        store (or other sequence) to load from, by index
+    blocksize : int or :class:`paths_cli.memory_budget.BlocksizeTuner`
+        number of objects per block; a tuner's block size is read again
+        for each block
+    start : int
+        index of the first object to load
+    stop : int or None
+        index to stop before; None for the end of the store
+    stride : int
+        load every ``stride``-th object
+
+    Yields
+    ------
+    List[Any] :
+        the objects in each block
+    """
+    indices = range(*slice(start, stop, stride).indices(len(store)))
+    block_start = 0
+    while block_start < len(indices):
+        block_stop = block_start + _current_blocksize(blocksize)
+        yield [store[i] for i in indices[block_start:block_stop]]
+        block_start = block_stop
+
+
+class CopyProgress(object):
+    """How much of a file copy has been done, recorded in a sidecar file.
+
+    The sidecar file is rewritten (atomically) after each block, so that
+    an interrupted copy can resume from the last finished block.
+
+    Parameters
+    ----------
+    filename : str
+        the sidecar file
+    source : str
+        the file being copied from; a sidecar for a different source is
+        ignored
+    """
+    def __init__(self, filename, source):
+        self.filename = filename
+        self.source = os.path.abspath(source)
+        self.done = {}
+
+    @classmethod
+    def load(cls, filename, source):
+        """Load progress from the sidecar file.
+
+        Returns
+        -------
+        :class:`.CopyProgress` or None :
+            the progress, or None if there is no usable sidecar file
+        """
+        progress = cls(filename, source)
+        try:
+            with open(filename, mode='r') as f:
+                dct = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if dct.get('source') != progress.source:
+            return None
+
+        progress.done = dct.get('done', {})
+        return progress
+
+    def n_done(self, stage):
+        """Number of objects already copied in a stage"""
+        return self.done.get(stage, 0)
+
+    def update(self, stage, n_done):
+        """Record that ``n_done`` objects in a stage have been copied."""
+        self.done[stage] = n_done
+        self.write()
+
+    def write(self):
+        atomic_write(self.filename,
+                     json.dumps({'source': self.source, 'done': self.done}))
+
+    def remove(self):
+        """Remove the sidecar file (when the copy is finished)."""
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
 
 
 def precompute_cvs(cvs, block):
@@ -87,16 +258,374 @@ def precompute_cvs_func_and_inputs(input_storage, cvs, blocksize):
         list of CVs to precompute; if None, use all CVs in ``input_storage``
     blocksize : int
         number of snapshots per block to precompute
+
+    Returns
+    -------
+    precompute_func : Callable
+        function to precompute the CVs for a block
+    snapshot_blocks : :class:`.SnapshotProxyBlocks`
+        blocks of snapshot proxies, made as they are iterated over
     """
     if cvs is None:
         cvs = list(input_storage.cvs)
 
     precompute_func = lambda inps: precompute_cvs(cvs, inps)
-    snapshot_proxies = input_storage.snapshots.all().as_proxies()
-    snapshot_blocks = make_blocks(snapshot_proxies, blocksize)
+    snapshot_blocks = SnapshotProxyBlocks(input_storage.snapshots, blocksize)
     return precompute_func, snapshot_blocks
 
 
+def simstore_snapshot_blocks(storage, blocksize):
+    """Blocks of the snapshots in a SimStore storage.
+
+    SimStore has a table of snapshots for each kind of snapshot, so each
+    block is part of one of those tables. ``blocksize`` can be a
+    :class:`paths_cli.memory_budget.BlocksizeTuner`, in which case its
+    block size is read again for each block.
+
+    Yields
+    ------
+    Tuple[str, int, int] :
+        the table name, and the start and stop indices in that table, for
+        each block
+    """
+    for table_name, table in storage.snapshots.tables.items():
+        len_table = len(table)
+        start = 0
+        while start < len_table:
+            stop = min(start + _current_blocksize(blocksize), len_table)
+            yield (table_name, start, stop)
+            start = stop
+
+
+def simstore_missing_uuids(storage, cv, block):
+    """Snapshots in a block that don't have a value for a CV on disk.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.experimental.storage.Storage`
+        the SimStore storage
+    cv : :class:`openpathsampling.CollectiveVariable`
+        the (storable function) CV
+    block : Tuple[str, int, int]
+        block from :func:`.simstore_snapshot_blocks`
+
+    Returns
+    -------
+    List[str] :
+        UUIDs of the snapshots in the block that don't have a value in the
+        disk cache for the CV, in the order they were saved
+    """
+    import sqlalchemy as sql
+    from openpathsampling.experimental.simstore.serialization_helpers \
+            import get_uuid
+    backend = storage.backend
+    table_name, start, stop = block
+    snapshots = backend.metadata.tables[table_name]
+    # SQL counts from 1; Python counts from 0
+    query = (sql.select(snapshots.c.uuid)
+             .where(snapshots.c.idx > start, snapshots.c.idx <= stop)
+             .order_by(snapshots.c.idx))
+    results_table = get_uuid(cv)
+    if backend.has_table(results_table):
+        results = backend.metadata.tables[results_table]
+        query = query.where(
+            snapshots.c.uuid.notin_(sql.select(results.c.uuid))
+        )
+    with backend.engine.connect() as conn:
+        return [row.uuid for row in conn.execute(query)]
+
+
+def simstore_block_todo(storage, cvs, block):
+    """Which CVs still need to be calculated for which snapshots in a block.
+
+    Returns
+    -------
+    Dict[str, List[str]] :
+        for each CV UUID, the UUIDs of the snapshots that don't have a
+        value in the disk cache; CVs that have all their values are left
+        out, so this is empty if there's nothing to calculate
+    """
+    from openpathsampling.experimental.simstore.serialization_helpers \
+            import get_uuid
+    todo = {}
+    for cv in cvs:
+        missing = simstore_missing_uuids(storage, cv, block)
+        if missing:
+            todo[get_uuid(cv)] = missing
+    return todo
+
+
+def load_snapshots(storage, uuids):
+    """Load snapshots from a SimStore storage by UUID."""
+    # as when iterating over a table: don't keep earlier blocks in memory
+    storage.cache.clear()
+    return storage.load(uuids)
+
+
+def is_block_mdtraj_cv(cv):
+    """Whether a CV can be calculated with one MDTraj call for a block.
+
+    This is true for ``MDTrajFunctionCV`` from
+    ``openpathsampling.experimental`` (which is what the compiler makes for
+    ``type: mdtraj``) with its default processing. On its own, that CV
+    calls its function once for each snapshot.
+    """
+    from openpathsampling.experimental.storage.collective_variables \
+            import MDTrajFunctionCV, MDTrajProcessor
+    if not isinstance(cv, MDTrajFunctionCV):
+        return False
+    config = cv.func_config
+    return (not config.item_preprocessors
+            and len(config.list_preprocessors) == 1
+            and isinstance(config.list_preprocessors[0], MDTrajProcessor))
+
+
+def mdtraj_cv_values(cv, trajectory):
+    """Calculate an MDTraj CV for all frames of a trajectory at once.
+
+    The function is called once, with the whole trajectory. Each frame's
+    part of the result is then processed as the CV would process the
+    result for that frame alone.
+
+    Parameters
+    ----------
+    cv : :class:`openpathsampling.CollectiveVariable`
+        CV for which :func:`.is_block_mdtraj_cv` is true
+    trajectory : :class:`mdtraj.Trajectory`
+        frames to calculate the CV for
+
+    Returns
+    -------
+    List[Any] or None :
+        the value for each frame, or None if the function doesn't return
+        one result for each frame (so the CV must be calculated a frame at
+        a time)
+    """
+    raw = cv.func(trajectory, **cv.kwargs)
+    try:
+        n_results = len(raw)
+    except TypeError:
+        return None
+    if n_results != trajectory.n_frames:
+        return None
+    return [cv.func_config.item_postprocess(raw[i:i + 1])
+            for i in range(n_results)]
+
+
+def _needed_snapshots(cv_uuid, snapshot_uuids, todo):
+    if todo is None:
+        return list(range(len(snapshot_uuids)))
+    needed = set(todo.get(cv_uuid, []))
+    return [i for i, uuid in enumerate(snapshot_uuids) if uuid in needed]
+
+
+def _mdtraj_cv_results(cvs, snapshots, snapshot_uuids, todo):
+    # one trajectory for each topology is shared by all the CVs using it
+    from openpathsampling.experimental.simstore.serialization_helpers \
+            import get_uuid
+    import openpathsampling as paths
+    by_topology = {}
+    for cv in cvs:
+        by_topology.setdefault(get_uuid(cv.topology), []).append(cv)
+
+    results = {}
+    for topology_cvs in by_topology.values():
+        needed = {get_uuid(cv): _needed_snapshots(get_uuid(cv),
+                                                  snapshot_uuids, todo)
+                  for cv in topology_cvs}
+        frames = sorted(set().union(*needed.values()))
+        if not frames:
+            continue
+        trajectory = paths.Trajectory([snapshots[i] for i in frames])
+        trajectory = trajectory.to_mdtraj(
+            topology=topology_cvs[0].mdtraj_topology
+        )
+        frame_number = {snap_idx: frame for frame, snap_idx
+                        in enumerate(frames)}
+        for cv in topology_cvs:
+            cv_needed = needed[get_uuid(cv)]
+            if not cv_needed:
+                continue
+            cv_frames = [frame_number[i] for i in cv_needed]
+            cv_trajectory = trajectory[cv_frames] \
+                    if len(cv_frames) < len(frames) else trajectory
+            values = mdtraj_cv_values(cv, cv_trajectory)
+            if values is not None:
+                results[get_uuid(cv)] = {snapshot_uuids[i]: value
+                                         for i, value in zip(cv_needed,
+                                                             values)}
+    return results
+
+
+def simstore_cv_results(cvs, snapshots, todo=None):
+    """Calculate SimStore CVs for some snapshots.
+
+    MDTraj CVs (see :func:`.is_block_mdtraj_cv`) are calculated with one
+    call to their function for all the snapshots, and the MDTraj trajectory
+    is made once for all of the CVs that use the same topology.
+
+    Parameters
+    ----------
+    cvs : List[:class:`openpathsampling.CollectiveVariable`]
+        CVs to calculate
+    snapshots : List[:class:`openpathsampling.engines.BaseSnapshot`]
+        snapshots to calculate them for
+    todo : Dict[str, List[str]]
+        if given, only calculate each CV for these snapshots (as from
+        :func:`.simstore_block_todo`)
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]] :
+        for each CV UUID, the value for each snapshot UUID
+    """
+    from openpathsampling.experimental.simstore.serialization_helpers \
+            import get_uuid
+    snapshot_uuids = [get_uuid(snap) for snap in snapshots]
+    results = _mdtraj_cv_results([cv for cv in cvs if is_block_mdtraj_cv(cv)],
+                                 snapshots, snapshot_uuids, todo)
+    for cv in cvs:
+        cv_uuid = get_uuid(cv)
+        if cv_uuid in results:
+            continue
+        needed = _needed_snapshots(cv_uuid, snapshot_uuids, todo)
+        cv_snapshots = [snapshots[i] for i in needed]
+        values = cv(cv_snapshots) if cv_snapshots else []
+        results[cv_uuid] = {snapshot_uuids[i]: value
+                            for i, value in zip(needed, values)}
+        # the values are returned; don't also keep them here
+        cv.local_cache.clear()
+    return results
+
+
+def calculate_simstore_block(storage, cvs, todo):
+    """Load the snapshots for a block, and calculate the CVs they need.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.experimental.storage.Storage`
+        the SimStore storage
+    cvs : List[:class:`openpathsampling.CollectiveVariable`]
+        CVs to calculate
+    todo : Dict[str, List[str]]
+        snapshots to calculate each CV for, as from
+        :func:`.simstore_block_todo`
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]] :
+        as from :func:`.simstore_cv_results`
+    """
+    # each snapshot once, in the order they were saved
+    uuids = list(dict.fromkeys(uuid for cv_uuids in todo.values()
+                               for uuid in cv_uuids))
+    snapshots = load_snapshots(storage, uuids)
+    return simstore_cv_results(cvs, snapshots, todo)
+
+
+def save_simstore_cv_results(storage, cvs, results):
+    """Save results from :func:`.simstore_cv_results` to the CV disk cache.
+
+    Each CV's results are saved in one transaction.
+    """
+    from openpathsampling.experimental.simstore.serialization_helpers \
+            import get_uuid
+    for cv in cvs:
+        cv_results = results.get(get_uuid(cv))
+        if not cv_results:
+            continue
+        cv.local_cache.cache_results(cv_results)
+        storage.save_function_results([cv])
+        cv.local_cache.clear()
+
+
+# storage and CVs for this process, when it is a precompute worker
+_PRECOMPUTE_WORKER = {}
+
+
+def _init_precompute_worker(filename, cv_uuids):
+    from openpathsampling.experimental.simstore.serialization_helpers \
+            import get_uuid
+    from paths_cli.parameters import INPUT_FILE
+    storage = INPUT_FILE.get(filename)
+    cvs = {get_uuid(cv): cv for cv in storage.cvs}
+    _PRECOMPUTE_WORKER['storage'] = storage
+    _PRECOMPUTE_WORKER['cvs'] = [cvs[uuid] for uuid in cv_uuids]
+
+
+def _precompute_worker_block(item):
+    _, todo = item
+    return calculate_simstore_block(_PRECOMPUTE_WORKER['storage'],
+                                    _PRECOMPUTE_WORKER['cvs'], todo)
+
+
+def iter_precompute_results(filename, cvs, blocks, workers, prefetch=2):
+    """Calculate SimStore CVs for blocks of snapshots in worker processes.
+
+    Each worker opens ``filename`` itself (OPS objects can't be sent
+    between processes), and returns the values of the CVs for each block
+    of snapshots it is given. Blocks are taken from ``blocks`` as workers
+    need them, and at most ``prefetch`` blocks per worker are queued at a
+    time, so results don't pile up if saving them is slower than
+    calculating them.
+
+    Parameters
+    ----------
+    filename : str
+        the SimStore file with the snapshots and CVs
+    cvs : List[:class:`openpathsampling.CollectiveVariable`]
+        CVs to calculate (as loaded from ``filename`` in this process)
+    blocks : Iterable[Tuple[Tuple[str, int, int], Dict[str, List[str]]]]
+        each block of snapshots (as from :func:`.simstore_snapshot_blocks`)
+        with the snapshots each CV needs to be calculated for in it (as
+        from :func:`.simstore_block_todo`)
+    workers : int
+        number of worker processes
+    prefetch : int
+        number of blocks queued for each worker (at least 1)
+
+    Yields
+    ------
+    Tuple[Tuple[Tuple[str, int, int], Dict[str, List[str]]], Dict] :
+        each item of ``blocks``, and its results as from
+        :func:`.simstore_cv_results`, in the order the blocks finish
+    """
+    import concurrent.futures
+    import multiprocessing
+    from openpathsampling.experimental.simstore.serialization_helpers \
+            import get_uuid
+    # fork could copy open SQLite connections (and locks held by other
+    # threads) into the workers
+    pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_precompute_worker,
+        initargs=(os.path.abspath(filename),
+                  [get_uuid(cv) for cv in cvs])
+    )
+    with pool:
+        blocks = iter(blocks)
+        pending = {}
+
+        def submit_next():
+            block = next(blocks, None)
+            if block is not None:
+                future = pool.submit(_precompute_worker_block, block)
+                pending[future] = block
+
+        for _ in range(max(prefetch, 1) * workers):
+            submit_next()
+
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                block = pending.pop(future)
+                submit_next()
+                yield block, future.result()
+
+
 def rewrite_file(stage_names, stage_mapping):
     stages = tqdm(stage_names, desc="All stages")
     for stage in stages:
@@ -0,0 +1,38 @@
+"""Helpers for files that other processes may read while they are written.
+
+This only uses the standard library, since it is used while the CLI starts
+(for the command manifest and the plugin bytecode cache).
+"""
+import os
+import tempfile
+
+
+def atomic_write(path, data):
+    """Replace the contents of a file, so readers never see a partial file.
+
+    The data is written to a temporary file in the same directory, synced
+    to disk, and then moved into place. The directory is created if it
+    doesn't exist. If anything fails, the temporary file is removed and
+    the original file (if any) is unchanged.
+
+    Parameters
+    ----------
+    path : str
+        the file to write
+    data : str or bytes
+        the new contents; str is written as UTF-8
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode='wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
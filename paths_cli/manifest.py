@@ -0,0 +1,224 @@
+"""Cache of the metadata for command plugins.
+
+Finding the command plugins requires executing (or importing) every module
+that might contain one, which is slow. The manifest stores the metadata
+needed to list the commands and to build the help (name, section, short
+help) for each candidate module, along with a fingerprint of that module.
+A module is only loaded again when its fingerprint changes; otherwise, it is
+only loaded when one of its commands is actually used.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import sys
+import warnings
+
+from .file_utils import atomic_write
+from .plugin_management import OPSCommandPlugin, PluginRegistrationError
+from .utils import app_dir_cache
+from . import version
+
+logger = logging.getLogger(__name__)
+
+# changed when the metadata saved for each command changes, so that older
+# manifests aren't used
+MANIFEST_FORMAT = 2
+
+
+def manifest_filename():
+    """Default location of the manifest file.
+
+    Each Python environment gets its own manifest, since different
+    environments can have different plugins installed.
+    """
+    env_hash = hashlib.sha1(sys.prefix.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(app_dir_cache(), f"command-manifest-{env_hash}.json")
+
+
+class CachedCommandPlugin(OPSCommandPlugin):
+    """Command plugin created from the manifest.
+
+    This knows everything needed to be listed in the help, but only loads
+    the module that defines the command when the command is needed.
+
+    Parameters
+    ----------
+    name : str
+        name of the command
+    section : str
+        the section of the help where this command should appear
+    short_help : str or None
+        the short help for this command
+    requires_ops : Iterable[int]
+        the minimum allowed version of OPS
+    requires_cli : Iterable[int]
+        the minimum allowed version of the OPS CLI
+    load_plugins : Callable[[], List[:class:`.OPSCommandPlugin`]]
+        loads the plugins from the module where this command is defined
+    hidden : bool
+        whether the command is hidden from the help
+    """
+    def __init__(self, name, section, short_help, requires_ops,
+                 requires_cli, load_plugins, hidden=False):
+        super().__init__(command=None, section=section,
+                         requires_ops=tuple(requires_ops),
+                         requires_cli=tuple(requires_cli))
+        self._name = name
+        self._short_help = short_help
+        self._hidden = hidden
+        self._load_plugins = load_plugins
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def short_help(self):
+        return self._short_help
+
+    @property
+    def hidden(self):
+        return self._hidden
+
+    @property
+    def command(self):
+        if self._command is None:
+            plugins = {p.name: p for p in self._load_plugins()}
+            try:
+                self._command = plugins[self.name].command
+            except KeyError:
+                raise PluginRegistrationError(
+                    f"The command '{self.name}' is no longer defined in "
+                    f"{self.location}"
+                )
+        return self._command
+
+    @command.setter
+    def command(self, value):
+        self._command = value
+
+    def __repr__(self):
+        return f"CachedCommandPlugin({self.name})"
+
+
+class CommandManifest(object):
+    """Find command plugins, using cached metadata when possible.
+
+    Parameters
+    ----------
+    loaders : List[:class:`.CLIPluginLoader`]
+        loaders for the places where plugins can be found, in order of
+        precedence
+    filename : str or None
+        the JSON file used to cache the metadata; if None, nothing is cached
+        and every candidate module is loaded
+    """
+    def __init__(self, loaders, filename):
+        self.loaders = loaders
+        self.filename = filename
+        self._loaded = {}
+
+    @staticmethod
+    def _metadata(plugin):
+        return {
+            'name': plugin.name,
+            'section': plugin.section,
+            'short_help': plugin.short_help,
+            'hidden': plugin.hidden,
+            'requires_ops': list(plugin.requires_ops),
+            'requires_cli': list(plugin.requires_cli),
+        }
+
+    def _read(self):
+        if self.filename is None:
+            return {}
+
+        try:
+            with open(self.filename, mode='r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if (manifest.get('cli_version') != version.version
+                or manifest.get('format') != MANIFEST_FORMAT):
+            return {}
+
+        return manifest.get('candidates', {})
+
+    def _write(self, candidates):
+        if self.filename is None:
+            return
+
+        manifest = {'cli_version': version.version,
+                    'format': MANIFEST_FORMAT,
+                    'candidates': candidates}
+        try:
+            atomic_write(self.filename, json.dumps(manifest))
+        except OSError as e:  # -no-cov-
+            logger.debug(f"Unable to write command manifest: {e}")
+
+    def _load_location(self, loader, location):
+        key = (loader.plugin_type, location)
+        if key not in self._loaded:
+            self._loaded[key] = loader.load_location(location)
+        return self._loaded[key]
+
+    def _cached_plugins(self, loader, location, metadata):
+        load = functools.partial(self._load_location, loader, location)
+        plugins = [CachedCommandPlugin(load_plugins=load, **meta)
+                   for meta in metadata]
+        for plugin in plugins:
+            plugin.attach_metadata(location, loader.plugin_type)
+        return plugins
+
+    def plugins(self):
+        """Find the command plugins.
+
+        Candidate modules whose fingerprint matches the cache give
+        :class:`.CachedCommandPlugin` objects; other candidates are loaded,
+        and the cache is updated. Candidates that raise an error when
+        loaded are skipped with a warning.
+
+        Returns
+        -------
+        List[:class:`.OPSCommandPlugin`] :
+            the plugins, in the order they were found
+        """
+        cached = self._read()
+        candidates = {}
+        plugins = []
+        for loader in self.loaders:
+            for location in loader._find_candidate_locations():
+                key = f"{loader.plugin_type}:{location}"
+                if key in candidates:
+                    continue
+
+                fingerprint = loader._fingerprint(location)
+                entry = cached.get(key)
+                if entry is not None and entry['fingerprint'] == fingerprint:
+                    found = self._cached_plugins(loader, location,
+                                                 entry['plugins'])
+                else:
+                    logger.debug(f"Updating command manifest for {key}")
+                    try:
+                        found = self._load_location(loader, location)
+                    except Exception as e:
+                        # a broken plugin shouldn't break other commands;
+                        # it isn't cached, so we try again next time
+                        warnings.warn(f"Unable to load plugins from "
+                                      f"{location}: {e!r}")
+                        continue
+                    entry = {
+                        'fingerprint': fingerprint,
+                        'plugins': [self._metadata(p) for p in found],
+                    }
+
+                candidates[key] = entry
+                plugins.extend(found)
+
+        if candidates != cached:
+            self._write(candidates)
+
+        return plugins
@@ -0,0 +1,226 @@
+"""Choosing block sizes from a memory budget.
+
+Commands that load and save objects in blocks can be given a memory budget
+(``--memory-budget``) instead of a fixed block size. The first block size
+is estimated from the size of a snapshot's arrays (coordinates,
+velocities, box vectors), which also limits how big blocks can get. After
+that, a :class:`.BlocksizeTuner` adjusts the block size between blocks,
+from how much each block made the resident memory (RSS) of the process
+grow, and how fast the blocks are processed.
+"""
+import os
+import re
+import time
+
+import click
+
+from paths_cli.param_core import Option
+
+_MEMORY_SIZE = re.compile(r"^\s*(\d+(?:\.\d*)?|\.\d+)\s*([kmgt]?)(i?)b?\s*$",
+                          re.IGNORECASE)
+_PREFIX_POWERS = {'': 0, 'k': 1, 'm': 2, 'g': 3, 't': 4}
+
+# memory for each snapshot beyond its arrays (Python objects, proxies,
+# cache entries), and how many copies of the arrays a block can need at
+# once (e.g., as loaded, and as serialized or converted for MDTraj)
+SNAPSHOT_OVERHEAD = 4096
+ARRAY_COPIES = 3
+
+
+def parse_memory_size(value):
+    """Number of bytes in a size like ``8GB``, ``512M``, or ``1.5GiB``.
+
+    Prefixes are decimal (``8GB`` is 8 * 1000**3 bytes) unless written as
+    binary (``8GiB`` is 8 * 1024**3 bytes); the ``B`` is optional.
+
+    Raises
+    ------
+    ValueError :
+        if the size can't be read
+    """
+    match = _MEMORY_SIZE.match(str(value))
+    if not match:
+        raise ValueError(f"Can't read '{value}' as a memory size")
+    number, prefix, binary = match.groups()
+    base = 1024 if binary else 1000
+    return int(float(number) * base**_PREFIX_POWERS[prefix.lower()])
+
+
+def memory_budget_callback(ctx, param, value):
+    """Click callback to read a memory budget (None if not given)"""
+    if value is None:
+        return None
+    try:
+        budget = parse_memory_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if budget <= 0:
+        raise click.BadParameter("Memory budget must be more than 0 bytes")
+    return budget
+
+
+MEMORY_BUDGET = Option(
+    '--memory-budget', type=str, default=None,
+    callback=memory_budget_callback,
+    help=("memory to use, e.g., 8GB or 512MiB; block sizes are chosen "
+          "(and adjusted while running) to stay within this, instead of "
+          "using --blocksize")
+)
+
+
+def current_rss():
+    """Resident memory of this process in bytes, or None if unknown.
+
+    This reads ``/proc``, so it is only available on Linux.
+    """
+    try:
+        with open("/proc/self/statm", mode='r') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def snapshot_nbytes(snapshot):
+    """Bytes in the coordinates, velocities, and box vectors of a snapshot"""
+    import numpy as np
+    total = 0
+    for attr in ['coordinates', 'velocities', 'box_vectors']:
+        value = getattr(snapshot, attr, None)
+        if value is None:
+            continue
+        # remove units (OpenMM quantities keep the numbers in _value)
+        value = getattr(value, '_value', value)
+        total += np.asarray(value).nbytes
+    return total
+
+
+def _bytes_in_block(bytes_per_snapshot):
+    return ARRAY_COPIES * bytes_per_snapshot + SNAPSHOT_OVERHEAD
+
+
+def estimate_blocksize(budget, bytes_per_snapshot, rss=None):
+    """Block size for a budget, given the bytes in each snapshot.
+
+    Half of the memory left in the budget (after what the process already
+    uses) is for the block; the rest is headroom for everything else.
+
+    Parameters
+    ----------
+    budget : int
+        memory budget in bytes
+    bytes_per_snapshot : int
+        bytes in each snapshot's arrays, as from :func:`.snapshot_nbytes`
+    rss : int or None
+        memory already used by the process; None to ignore
+
+    Returns
+    -------
+    int :
+        number of snapshots per block (at least 1)
+    """
+    available = budget - (rss or 0)
+    return max(1, available // (2 * _bytes_in_block(bytes_per_snapshot)))
+
+
+def max_blocksize(budget, bytes_per_snapshot):
+    """Largest block size that could fit in a budget.
+
+    This is the number of snapshots that would use the whole budget, so
+    it is an upper limit for a :class:`.BlocksizeTuner`.
+
+    Parameters
+    ----------
+    budget : int
+        memory budget in bytes
+    bytes_per_snapshot : int
+        bytes in each snapshot's arrays, as from :func:`.snapshot_nbytes`
+    """
+    return max(1, budget // _bytes_in_block(bytes_per_snapshot))
+
+
+class BlocksizeTuner(object):
+    """Block size that is adjusted to stay within a memory budget.
+
+    After each block, call :meth:`.update`, which measures how much the
+    memory used by the process grew during the block. If the process then
+    uses more memory than the budget, the block size is cut by the part of
+    that growth that went over the budget; if memory didn't grow during
+    the block (it was already over the budget), the block size is halved.
+    If a block twice the size would fit in the budget, based on the growth
+    per object, the block size is doubled, as long as bigger blocks have
+    been faster (more objects per second) than smaller ones. If the memory
+    use can't be measured, the block size doesn't change.
+
+    Parameters
+    ----------
+    budget : int
+        memory budget in bytes
+    blocksize : int
+        first block size
+    max_blocksize : int or None
+        largest block size to use, as from :func:`.max_blocksize`; None
+        for no limit
+    rss : Callable[[], Optional[int]]
+        function giving the memory the process uses (default
+        :func:`.current_rss`)
+    clock : Callable[[], float]
+        function giving the time in seconds
+    """
+    def __init__(self, budget, blocksize, max_blocksize=None,
+                 rss=current_rss, clock=time.perf_counter):
+        self.budget = budget
+        self.max_blocksize = max_blocksize
+        self.blocksize = self._clamp(blocksize)
+        self._rss = rss
+        self._clock = clock
+        self._last_time = clock()
+        self._last_rate = None
+        self._last_rss = rss()
+        self._growth_per_object = None
+
+    def _clamp(self, blocksize):
+        if self.max_blocksize is not None:
+            blocksize = min(blocksize, self.max_blocksize)
+        return max(1, int(blocksize))
+
+    def _has_room(self, rss):
+        """Whether a block twice the size should fit in the budget"""
+        if self._growth_per_object is None:
+            return rss < self.budget / 2
+        growth = self.blocksize * self._growth_per_object
+        return rss + growth <= self.budget
+
+    def update(self, n_objects):
+        """Adjust the block size after a block of ``n_objects`` is done."""
+        now = self._clock()
+        elapsed = now - self._last_time
+        self._last_time = now
+        rate = n_objects / elapsed if elapsed > 0 else None
+        rss = self._rss()
+        if rss is None:
+            return
+
+        growth = None
+        if self._last_rss is not None:
+            growth = rss - self._last_rss
+        self._last_rss = rss
+        if growth is not None and growth > 0 and n_objects > 0:
+            self._growth_per_object = growth / n_objects
+
+        if rss > self.budget:
+            if growth is not None and growth > 0:
+                # the part of the block that fit in the budget
+                fraction = 1 - (rss - self.budget) / growth
+                self.blocksize = self._clamp(
+                    min(self.blocksize, n_objects) * fraction
+                )
+            else:
+                self.blocksize = self._clamp(self.blocksize // 2)
+            self._last_rate = None
+        elif self._has_room(rss):
+            faster = (self._last_rate is None or rate is None
+                      or rate > self._last_rate)
+            if faster:
+                self.blocksize = self._clamp(2 * self.blocksize)
+            self._last_rate = rate
@@ -0,0 +1,77 @@
+"""Find named objects in a store without loading every object.
+
+Finding the named objects in a store by iterating over it loads (and
+deserializes) every object in the store, including the many unnamed ones
+(such as auto-generated ensembles and volumes). Both storage backends
+already keep an index of names: netCDF stores have ``name_idx`` (name to
+the indices of objects with that name), and the SimStore tables of
+simulation objects have ``_name_to_uuid``. A :class:`.NameIndex` uses
+these when they exist, and only falls back to iterating over the store
+when they don't.
+"""
+from collections import abc
+
+
+def _netcdf_index(store):
+    name_idx = getattr(store, 'name_idx', None)
+    if not isinstance(name_idx, dict):
+        return None
+    # like loading by name: if several objects have a name, use the last
+    entries = sorted((max(idxs), name) for name, idxs in name_idx.items()
+                     if idxs)
+    index = {name: idx for idx, name in entries}
+    n_named = sum(len(idxs) for idxs in name_idx.values())
+    return index, store.__getitem__, n_named
+
+
+def _simstore_index(store):
+    name_to_uuid = getattr(store, '_name_to_uuid', None)
+    if not isinstance(name_to_uuid, dict):
+        return None
+    return dict(name_to_uuid), store.get_by_uuid, len(name_to_uuid)
+
+
+def _scanned_index(store):
+    named = [obj for obj in store if obj.is_named]
+    index = {obj.name: obj for obj in named}
+    return index, lambda obj: obj, len(named)
+
+
+class NameIndex(abc.Mapping):
+    """Named objects in a store, by name.
+
+    This behaves as a read-only dict of name to object. The names come
+    from the storage's own index of names, where there is one, and each
+    object is only loaded when it is accessed. If several objects have the
+    same name, the last one saved is used.
+
+    Parameters
+    ----------
+    store : Any
+        the store (e.g., ``storage.engines``)
+
+    Attributes
+    ----------
+    n_named : int
+        number of named objects in the store; this includes all objects
+        with a repeated name
+    """
+    def __init__(self, store):
+        for make_index in [_netcdf_index, _simstore_index, _scanned_index]:
+            result = make_index(store)
+            if result is not None:
+                break
+
+        self._keys, self._load, self.n_named = result
+
+    def __getitem__(self, name):
+        return self._load(self._keys[name])
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, name):
+        return name in self._keys
@@ -1,6 +1,12 @@
+import atexit
+import contextlib
+import functools
+import logging
 import click
 import os
 
+logger = logging.getLogger(__name__)
+
 
 class AbstractParameter(object):
     """Abstract wrapper for click parameters.
@@ -62,9 +68,160 @@ class AbstractLoader(object):
         raise NotImplementedError()
 
 
+class _PoolEntry(object):
+    def __init__(self, path, mode, storage):
+        self.path = path
+        self.mode = mode
+        self.storage = storage
+        self.refcount = 0
+        self.after_close = []
+
+
+class StoragePool(object):
+    """Process-wide pool of open storages, with reference counting.
+
+    Each call to :meth:`.acquire` must be matched by a call to
+    :meth:`.release`. A storage that is open in a compatible mode is reused:
+    a file open for writing or appending can also be used to read or
+    append. Getting a file in mode ``'w'`` always opens a new storage. When
+    the last reference to a storage is released, it is closed, unless the
+    pool is :meth:`.sharing`.
+    """
+    # modes of open storages that can be reused for each requested mode
+    COMPATIBLE = {'r': ['r', 'a', 'w'], 'a': ['a', 'w'], 'w': []}
+
+    def __init__(self):
+        self._entries = []
+        self._sharing_depth = 0
+
+    @property
+    def is_sharing(self):
+        return self._sharing_depth > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _find(self, path, mode):
+        for compatible_mode in self.COMPATIBLE[mode]:
+            for entry in self._entries:
+                if entry.path == path and entry.mode == compatible_mode:
+                    return entry
+        return None
+
+    def _close(self, entry):
+        self._entries.remove(entry)
+        entry.storage.close()
+        for callback in entry.after_close:
+            callback()
+
+    def acquire(self, name, mode, open_storage):
+        """Get a storage for a file, opening it if necessary.
+
+        Parameters
+        ----------
+        name : str
+            the filename
+        mode : 'r', 'w', or 'a'
+            the mode for the file
+        open_storage : Callable[[str], Any]
+            opens the file (in the given mode) if there's no compatible
+            storage in the pool
+
+        Returns
+        -------
+        :class:`openpathsampling.Storage` :
+            the storage
+        """
+        path = os.path.realpath(name)
+        entry = self._find(path, mode)
+        if entry is None:
+            # idle storages for this file would conflict with the new one
+            idle = [e for e in self._entries
+                    if e.path == path and e.refcount == 0]
+            for old in idle:
+                self._close(old)
+            entry = _PoolEntry(path, mode, open_storage(name))
+            self._entries.append(entry)
+
+        entry.refcount += 1
+        return entry.storage
+
+    def release(self, storage):
+        """Release a reference to a storage from :meth:`.acquire`.
+
+        Storages that aren't from this pool are closed.
+        """
+        for entry in self._entries:
+            if entry.storage is storage:
+                break
+        else:
+            storage.close()
+            return
+
+        entry.refcount -= 1
+        if entry.refcount <= 0 and not self.is_sharing:
+            self._close(entry)
+
+    def after_close(self, storage, callback):
+        """Call ``callback()`` once the pool has closed a storage.
+
+        This is for work on the file that needs the storage to be closed
+        first (such as changing the file with another connection). If the
+        pool is sharing, this is at the end of the sharing context.
+
+        Raises
+        ------
+        ValueError :
+            if the storage isn't from this pool
+        """
+        for entry in self._entries:
+            if entry.storage is storage:
+                entry.after_close.append(callback)
+                return
+        raise ValueError("Storage is not from this pool")
+
+    def close_idle(self):
+        """Close all storages that have no references."""
+        for entry in [e for e in self._entries if e.refcount <= 0]:
+            self._close(entry)
+
+    def close_all(self):
+        """Close all storages, even those that are still referenced."""
+        for entry in list(self._entries):
+            try:
+                self._close(entry)
+            except Exception as e:  # -no-cov-
+                logger.warning(f"Error closing {entry.path}: {e!r}")
+
+    @contextlib.contextmanager
+    def sharing(self):
+        """Context where storages stay open after they are released.
+
+        Storages opened within this context are reused by later uses of
+        the same file (if the mode is compatible), and are closed at the
+        end of the (outermost) context.
+        """
+        self._sharing_depth += 1
+        try:
+            yield self
+        finally:
+            self._sharing_depth -= 1
+            if not self.is_sharing:
+                self.close_idle()
+
+
+STORAGE_POOL = StoragePool()
+atexit.register(STORAGE_POOL.close_all)
+
+
 class StorageLoader(AbstractLoader):
     """Open an OPS storage file
 
+    Storages are kept in the process-wide :data:`.STORAGE_POOL`. When used
+    within a click command, each storage is released when the command
+    finishes; the storage is then closed, unless the pool is sharing (see
+    :meth:`.sharing`), in which case it can be reused by later commands.
+
     Parameters
     ----------
     param : :class:`.AbstractParameter`
@@ -73,10 +230,28 @@ class StorageLoader(AbstractLoader):
         the mode for the file
     """
     has_simstore_patch = False
+    pool = STORAGE_POOL
+    # how to open SimStore files; see paths_cli.sqlite_settings
+    sqlite_pragmas = {}
+    sqlite_read_mode = 'default'
+    # kwargs for paths_cli.staging.StagedOutput; None if not staging
+    sqlite_staging = None
+    # kwargs for paths_cli.write_behind.WriteBehindStorage; None to save
+    # directly
+    write_behind = None
+
     def __init__(self, param, mode):
         super(StorageLoader, self).__init__(param)
         self.mode = mode
 
+    @classmethod
+    def sharing(cls):
+        """Context where each file is opened once, and shared between uses.
+
+        See :meth:`.StoragePool.sharing`.
+        """
+        return cls.pool.sharing()
+
     @staticmethod
     def _is_simstore(name):
         return name.endswith(".db") or name.endswith(".sql")
@@ -95,6 +270,131 @@ class StorageLoader(AbstractLoader):
             st.close()
 
     def get(self, name):
+        ctx = click.get_current_context(silent=True)
+        if ctx is None and not self.pool.is_sharing:
+            # nothing would release it; the caller owns the storage
+            return self._open(name)
+
+        storage = self.pool.acquire(name, self.mode, self._open)
+        if ctx is not None:
+            ctx.call_on_close(functools.partial(self.pool.release, storage))
+        return storage
+
+    def release(self, storage):
+        """Release a storage from :meth:`.get` that won't be released when a
+        click command finishes.
+
+        Storages that aren't in the pool are closed.
+        """
+        self.pool.release(storage)
+
+    @classmethod
+    def configure_sqlite(cls, profile=None, pragmas=None,
+                         read_mode='default'):
+        """Set how SimStore files are opened.
+
+        Parameters
+        ----------
+        profile : str or None
+            name of a profile in
+            :data:`paths_cli.sqlite_settings.STORAGE_PROFILES`
+        pragmas : Dict[str, Any] or None
+            individual pragma settings; these override the profile
+        read_mode : str
+            how to open files in mode ``'r'``; one of
+            :data:`paths_cli.sqlite_settings.READ_MODES`
+        """
+        from paths_cli.sqlite_settings import resolve_pragmas, READ_MODES
+        if read_mode not in READ_MODES:
+            raise ValueError(f"Unknown read mode '{read_mode}'. Allowed "
+                             f"modes are: {', '.join(READ_MODES)}")
+        StorageLoader.sqlite_pragmas = resolve_pragmas(profile, pragmas)
+        StorageLoader.sqlite_read_mode = read_mode
+
+    @classmethod
+    def configure_staging(cls, every_steps=None, every_seconds=None,
+                          enabled=True):
+        """Set whether SimStore output files are staged in memory.
+
+        See :class:`paths_cli.staging.StagedOutput`.
+
+        Parameters
+        ----------
+        every_steps : int or None
+            number of MC steps between checkpoints to the file
+        every_seconds : float or None
+            number of seconds between checkpoints to the file
+        enabled : bool
+            whether to stage output files
+        """
+        if enabled:
+            StorageLoader.sqlite_staging = {'every_steps': every_steps,
+                                            'every_seconds': every_seconds}
+        else:
+            StorageLoader.sqlite_staging = None
+
+    @classmethod
+    def configure_write_behind(cls, max_queue=None, enabled=True):
+        """Set whether output files are saved in a background thread.
+
+        See :class:`paths_cli.write_behind.WriteBehindStorage`.
+
+        Parameters
+        ----------
+        max_queue : int or None
+            maximum number of queued writes; default is
+            :data:`paths_cli.write_behind.DEFAULT_MAX_QUEUE`
+        enabled : bool
+            whether to save output files in a background thread
+        """
+        if enabled:
+            kwargs = {}
+            if max_queue is not None:
+                kwargs['max_queue'] = max_queue
+            StorageLoader.write_behind = kwargs
+        else:
+            StorageLoader.write_behind = None
+
+    def _uses_write_behind(self, name):
+        # Only for SimStore output. NetCDF can't be used from two threads,
+        # and OPS reads from it during the simulation. Staged output shares
+        # one connection, so background writes could be rolled back by the
+        # simulation's reads; it also has little to gain.
+        return (self.mode == 'w'
+                and self.write_behind is not None
+                and self._is_simstore(name)
+                and self.sqlite_staging is None)
+
+    def _sqlite_kwargs(self, name):
+        from paths_cli.sqlite_settings import WRITE_PRAGMAS, SQLiteConnector
+        pragmas = dict(self.sqlite_pragmas)
+        if self.mode != 'r' and self.sqlite_staging is not None:
+            from paths_cli.staging import StagedOutput
+            from sqlalchemy.pool import StaticPool
+            staged = StagedOutput(os.path.abspath(name), pragmas,
+                                  **self.sqlite_staging)
+            return {'creator': staged, 'poolclass': StaticPool}
+
+        read_mode = 'default'
+        if self.mode == 'r':
+            read_mode = self.sqlite_read_mode
+            for pragma in WRITE_PRAGMAS:
+                pragmas.pop(pragma, None)
+
+        if not pragmas and read_mode == 'default':
+            return {}
+
+        # absolute path, in case the working directory changes
+        connector = SQLiteConnector(os.path.abspath(name), pragmas,
+                                    read_mode=read_mode)
+        kwargs = {'creator': connector}
+        if read_mode == 'memory':
+            # every new connection would be another copy of the file
+            from sqlalchemy.pool import StaticPool
+            kwargs['poolclass'] = StaticPool
+        return kwargs
+
+    def _open(self, name):
         if self._is_simstore(name):
             import openpathsampling as paths
             from openpathsampling.experimental.storage import \
@@ -107,12 +407,21 @@ class StorageLoader(AbstractLoader):
 
             from openpathsampling.experimental.simstore import \
                 SQLStorageBackend
-            backend = SQLStorageBackend(name, mode=self.mode)
+            backend = SQLStorageBackend(name, mode=self.mode,
+                                        **self._sqlite_kwargs(name))
+            # OPS reuses the storage it last made for the same URI and
+            # mode, even if it is closed (or for another directory's file
+            # with the same relative name); the pool decides what to reuse
+            Storage._known_storages.pop(backend.identifier, None)
             storage = Storage.from_backend(backend)
         else:
             from openpathsampling import Storage
             self._workaround(name)
             storage = Storage(name, self.mode)
+
+        if self._uses_write_behind(name):
+            from paths_cli.write_behind import WriteBehindStorage
+            storage = WriteBehindStorage(storage, **self.write_behind)
         return storage
 
 
@@ -215,10 +524,11 @@ class GetOnly(Getter):
 class GetOnlyNamed(Getter):
     """Strategy selecting item from store if it is the only named item"""
     def __call__(self, storage):
-        store = getattr(storage, self.store_name)
-        named_things = [o for o in store if o.is_named]
-        if len(named_things) == 1:
-            return named_things[0]
+        from paths_cli.name_index import NameIndex
+        named_things = NameIndex(getattr(storage, self.store_name))
+        if named_things.n_named == 1:
+            name, = named_things
+            return named_things[name]
 
 
 class GetOnlySnapshot(Getter):
@@ -1,9 +1,28 @@
 import collections
+import hashlib
+import logging
+import marshal
 import pkgutil
 import importlib
+import importlib.machinery
+import importlib.util
+import struct
+import sys
 import warnings
 import os
 
+from .file_utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# mtime (in ns) and size of the source, stored after the magic number
+_BYTECODE_STAT = struct.Struct("<QQ")
+
+# entry point groups for each kind of plugin
+COMMAND_ENTRY_POINTS = "paths_cli.commands"
+COMPILING_ENTRY_POINTS = "paths_cli.compiling"
+WIZARD_ENTRY_POINTS = "paths_cli.wizard"
+
 class PluginRegistrationError(RuntimeError):
     pass
 
@@ -86,6 +105,14 @@ class OPSCommandPlugin(OPSPlugin):
         # (this is what calling functions ask for
         return self.command
 
+    @property
+    def short_help(self):
+        return self.command.short_help
+
+    @property
+    def hidden(self):
+        return getattr(self.command, 'hidden', False)
+
     def __repr__(self):
         return f"OPSCommandPlugin({self.name})"
 
@@ -122,9 +149,22 @@ class CLIPluginLoader(object):
         self.search_path = search_path
         self.plugin_class = plugin_class
 
+    def _find_candidate_locations(self):
+        """Find where candidate modules are, without loading them"""
+        raise NotImplementedError()
+
+    def _load_candidate(self, location):
+        raise NotImplementedError()
+
+    @staticmethod
+    def _fingerprint(location):
+        """Cheap summary of a candidate; changes when the candidate does"""
+        raise NotImplementedError()
+
     # TODO: this should be _find_candidate_modules
     def _find_candidates(self):
-        raise NotImplementedError()
+        return [self._load_candidate(loc)
+                for loc in self._find_candidate_locations()]
 
     @staticmethod
     def _make_nsdict(candidate):
@@ -135,6 +175,23 @@ class CLIPluginLoader(object):
         namespaces = {cand: self._make_nsdict(cand) for cand in candidates}
         return namespaces
 
+    def load_location(self, location):
+        """Load the plugins from a single candidate location.
+
+        Parameters
+        ----------
+        location : str
+            a location as given by ``_find_candidate_locations``
+
+        Returns
+        -------
+        List[:class:`.Plugin`] :
+            the plugins found at that location
+        """
+        candidate = self._load_candidate(location)
+        namespaces = {candidate: self._make_nsdict(candidate)}
+        return list(self._find_plugins(namespaces))
+
     def _is_my_plugin(self, obj):
         return isinstance(obj, self.plugin_class)
 
@@ -161,12 +218,16 @@ class FilePluginLoader(CLIPluginLoader):
     plugin_class: type
         plugins are identified as instances of this class (override in
         ``_is_my_plugin``)
+    bytecode_cache : str or None
+        directory to cache the compiled plugin modules in; if None, the
+        modules are compiled every time they are loaded
     """
-    def __init__(self, search_path, plugin_class):
+    def __init__(self, search_path, plugin_class, bytecode_cache=None):
         super().__init__(plugin_type="file", search_path=search_path,
                          plugin_class=plugin_class)
+        self.bytecode_cache = bytecode_cache
 
-    def _find_candidates(self):
+    def _find_candidate_locations(self):
         def is_plugin(filename):
             return (
                 filename.endswith(".py") and not filename.startswith("_")
@@ -181,12 +242,70 @@ class FilePluginLoader(CLIPluginLoader):
                       if is_plugin(f)]
         return candidates
 
+    def _load_candidate(self, location):
+        return location
+
     @staticmethod
-    def _make_nsdict(candidate):
-        ns = {}
+    def _fingerprint(location):
+        stat = os.stat(location)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @staticmethod
+    def _compile(candidate):
         with open(candidate) as f:
-            code = compile(f.read(), candidate, 'exec')
-            eval(code, ns, ns)
+            return compile(f.read(), candidate, 'exec')
+
+    def _cache_filename(self, candidate):
+        # different plugin directories can contain files with the same
+        # name, so the name includes a hash of the full path
+        path = os.path.abspath(candidate)
+        path_hash = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+        stem = os.path.splitext(os.path.basename(candidate))[0]
+        tag = sys.implementation.cache_tag
+        return os.path.join(self.bytecode_cache,
+                            f"{stem}.{path_hash}.{tag}.pyc")
+
+    def _read_bytecode(self, cache_file, header):
+        try:
+            with open(cache_file, mode='rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if not data.startswith(header):
+            return None  # stale, or from a different Python
+
+        try:
+            return marshal.loads(data[len(header):])
+        except (EOFError, ValueError, TypeError):
+            return None  # corrupt; treat the same as stale
+
+    def _write_bytecode(self, cache_file, header, code):
+        try:
+            atomic_write(cache_file, header + marshal.dumps(code))
+        except OSError as e:  # -no-cov-
+            logger.debug(f"Unable to cache bytecode for {cache_file}: {e}")
+
+    def _code(self, candidate):
+        """Code object for a candidate, using the cache if possible"""
+        if self.bytecode_cache is None:
+            return self._compile(candidate)
+
+        # like a .pyc, this is invalidated when the source changes or when
+        # the bytecode format changes
+        stat = os.stat(candidate)
+        header = (importlib.util.MAGIC_NUMBER
+                  + _BYTECODE_STAT.pack(stat.st_mtime_ns, stat.st_size))
+        cache_file = self._cache_filename(candidate)
+        code = self._read_bytecode(cache_file, header)
+        if code is None:
+            code = self._compile(candidate)
+            self._write_bytecode(cache_file, header, code)
+        return code
+
+    def _make_nsdict(self, candidate):
+        ns = {}
+        eval(self._code(candidate), ns, ns)
         return ns
 
 
@@ -205,8 +324,10 @@ class NamespacePluginLoader(CLIPluginLoader):
         super().__init__(plugin_type="namespace", search_path=search_path,
                          plugin_class=plugin_class)
 
-    def _find_candidates(self):
+    def _find_candidate_locations(self):
         # based on https://packaging.python.org/guides/creating-and-discovering-plugins/#using-namespace-packages
+        # only the namespace package itself is imported here; its modules
+        # are imported in _load_candidate
         def iter_namespace(ns_pkg):
             return pkgutil.iter_modules(ns_pkg.__path__,
                                         ns_pkg.__name__ + ".")
@@ -216,12 +337,118 @@ class NamespacePluginLoader(CLIPluginLoader):
         except ModuleNotFoundError:
             candidates = []
         else:
-            candidates = [
-                importlib.import_module(name)
-                for _, name, _ in iter_namespace(ns)
-            ]
+            candidates = [name for _, name, _ in iter_namespace(ns)]
         return candidates
 
+    def _load_candidate(self, location):
+        return importlib.import_module(location)
+
+    @staticmethod
+    def _fingerprint(location):
+        spec = importlib.util.find_spec(location)
+        if spec is None or not spec.has_location:
+            return [None, None]
+        stat = os.stat(spec.origin)
+        return [stat.st_mtime_ns, stat.st_size]
+
     @staticmethod
     def _make_nsdict(candidate):
         return vars(candidate)
+
+
+def _entry_points(group):
+    """All entry points in a group (empty if they can't be read)"""
+    try:
+        from importlib import metadata
+    except ImportError:  # -no-cov-  (Python 3.7)
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            return []
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=group))
+    else:  # -no-cov-  (Python < 3.10)
+        return list(entry_points.get(group, []))
+
+
+def _module_origin(name):
+    """File that defines a module, found without importing any package"""
+    path = None
+    spec = None
+    parts = name.split('.')
+    for n_parts in range(1, len(parts) + 1):
+        if n_parts > 1 and path is None:
+            return None  # parent is not a package
+
+        partial = ".".join(parts[:n_parts])
+        spec = importlib.machinery.PathFinder.find_spec(partial, path)
+        if spec is None:
+            return None
+        path = spec.submodule_search_locations
+
+    return spec.origin if spec.has_location else None
+
+
+class EntryPointPluginLoader(CLIPluginLoader):
+    """Load plugins named by package entry points.
+
+    Each entry point in the group names either a plugin object
+    (``package.module:PLUGIN``) or a module to search for plugins
+    (``package.module``). Only the modules named by entry points in the
+    requested group are imported, so a package can provide plugins of
+    different kinds without all its modules being imported for each kind.
+
+    Parameters
+    ----------
+    search_path : str
+        name of the entry point group
+    plugin_class: type
+        plugins are identified as instances of this class (override in
+        ``_is_my_plugin``)
+    """
+    def __init__(self, search_path, plugin_class):
+        super().__init__(plugin_type="entry_point", search_path=search_path,
+                         plugin_class=plugin_class)
+
+    def _find_candidate_locations(self):
+        # locations are the entry point values (object references)
+        candidates = []
+        for entry_point in _entry_points(self.search_path):
+            value = entry_point.value
+            if value not in candidates:
+                candidates.append(value)
+        return candidates
+
+    def _load_candidate(self, location):
+        return location
+
+    @staticmethod
+    def _split_reference(location):
+        # ignore extras, as in "module:attr [extra]"
+        reference = location.split('[')[0].strip()
+        module, _, attrs = reference.partition(':')
+        return module.strip(), attrs.strip()
+
+    @classmethod
+    def _fingerprint(cls, location):
+        # avoid importing the package: that might be what we're trying
+        # to skip
+        module, _ = cls._split_reference(location)
+        origin = _module_origin(module)
+        if origin is None:
+            return [None, None]
+        stat = os.stat(origin)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @classmethod
+    def _make_nsdict(cls, candidate):
+        module, attrs = cls._split_reference(candidate)
+        obj = importlib.import_module(module)
+        if not attrs:
+            return vars(obj)
+
+        for attr in attrs.split('.'):
+            obj = getattr(obj, attr)
+        return {attr: obj}
@@ -0,0 +1,396 @@
+"""Server to keep the CLI warm, and the thin client that talks to it.
+
+Most of the time for short commands goes to importing OpenPathSampling and
+its dependencies. The server does those imports (and loads all the command
+plugins) once, and then handles each invocation in a forked child process,
+so every invocation starts from the same warm state. Communication uses a
+local Unix socket: the client sends its arguments, working directory, and
+the environment variables that the CLI reads (see :func:`.forwarded_env`);
+the server streams back stdout, stderr, and the exit code. The default
+socket is in a directory that only the user can access, and the client
+only connects to sockets owned by the user.
+
+Each message on the socket is a one-byte channel, a four-byte length, and
+the payload.
+"""
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import traceback
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!cI")
+_PEERCRED = struct.Struct("3i")  # pid, uid, gid
+REQUEST = b'r'
+STDOUT = b'o'
+STDERR = b'e'
+EXIT = b'x'
+
+# imports that are slow, but are needed by most commands
+PRELOAD_MODULES = ['openpathsampling', 'openpathsampling.experimental.storage']
+
+# environment variables sent from the client: the CLI's own settings, and
+# what affects the output (locale and terminal size)
+FORWARDED_ENV_PREFIXES = ('OPENPATHSAMPLING_', 'LC_')
+FORWARDED_ENV_VARS = ['LANG', 'LANGUAGE', 'TERM', 'COLUMNS', 'LINES']
+
+
+def _is_forwarded(name):
+    return (name in FORWARDED_ENV_VARS
+            or name.startswith(FORWARDED_ENV_PREFIXES))
+
+
+def forwarded_env(environ=None):
+    """Environment variables the client sends to the server.
+
+    Parameters
+    ----------
+    environ : Mapping[str, str]
+        the environment; default ``os.environ``
+    """
+    if environ is None:
+        environ = os.environ
+    return {name: value for name, value in environ.items()
+            if _is_forwarded(name)}
+
+
+def _check_private_directory(path):
+    """Raise PermissionError unless only this user can use the directory"""
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not a directory owned by this "
+                              "user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        raise PermissionError(f"{path} can be used by other users; its "
+                              "mode must be 0700")
+    return path
+
+
+def _private_directory(path):
+    """Create (if needed) and check a directory only this user can use"""
+    try:
+        os.mkdir(path, mode=0o700)
+    except FileExistsError:
+        pass
+    return _check_private_directory(path)
+
+
+def default_socket_path():
+    """Socket used if none is given.
+
+    This can be set with the ``OPENPATHSAMPLING_CLI_SOCKET`` environment
+    variable. Otherwise, the socket is in ``$XDG_RUNTIME_DIR`` or, if that
+    isn't set, in a directory in the temporary directory that is created
+    for the user with mode 0700.
+
+    Raises
+    ------
+    PermissionError :
+        if the directory for the socket can be used by other users
+    """
+    try:
+        return os.environ['OPENPATHSAMPLING_CLI_SOCKET']
+    except KeyError:
+        pass
+
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        directory = _check_private_directory(runtime_dir)
+    else:
+        directory = _private_directory(os.path.join(
+            tempfile.gettempdir(), f"openpathsampling-cli-{os.getuid()}"
+        ))
+    return os.path.join(directory, "openpathsampling-cli.sock")
+
+
+class ServerUnavailable(OSError):
+    """There's no server that the client can use.
+
+    Nothing has been sent to a server, so the command can run locally.
+    """
+
+
+def check_socket_owner(socket_path):
+    """Raise PermissionError unless this user owns the socket"""
+    if os.stat(socket_path).st_uid != os.getuid():
+        raise PermissionError(f"{socket_path} is owned by another user")
+
+
+def send_message(sock, channel, payload):
+    sock.sendall(_HEADER.pack(channel, len(payload)) + payload)
+
+
+def _recv_exactly(sock, n_bytes):
+    data = b''
+    while len(data) < n_bytes:
+        chunk = sock.recv(n_bytes - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def recv_message(sock):
+    """Receive a single message.
+
+    Returns
+    -------
+    Tuple[bytes, bytes] or None :
+        the channel and the payload, or None if the socket was closed
+    """
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    channel, length = _HEADER.unpack(header)
+    payload = _recv_exactly(sock, length)
+    if payload is None:
+        return None
+    return channel, payload
+
+
+class _ChannelWriter(io.RawIOBase):
+    """Raw stream that sends everything written as messages on a channel"""
+    def __init__(self, sock, channel):
+        super().__init__()
+        self.sock = sock
+        self.channel = channel
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            send_message(self.sock, self.channel, data)
+        return len(data)
+
+
+def _text_stream(sock, channel):
+    return io.TextIOWrapper(io.BufferedWriter(_ChannelWriter(sock, channel)),
+                            encoding='utf-8', line_buffering=True,
+                            write_through=True)
+
+
+def _exit_code(code):
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def run_invocation(argv):
+    """Run the CLI in this process, returning the exit code."""
+    from paths_cli.cli import main
+    try:
+        main.main(args=argv, prog_name="openpathsampling",
+                  standalone_mode=True)
+    except SystemExit as e:
+        return _exit_code(e.code)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0  # -no-cov-  (standalone mode always raises SystemExit)
+
+
+class _InvocationHandler(socketserver.BaseRequestHandler):
+    """Run one invocation. This is called in the forked child process."""
+    def handle(self):
+        message = recv_message(self.request)
+        if message is None or message[0] != REQUEST:
+            return
+
+        request = json.loads(message[1].decode('utf-8'))
+        os.chdir(request['cwd'])
+        # the client's settings replace the server's, including unset ones
+        for name in [name for name in os.environ if _is_forwarded(name)]:
+            del os.environ[name]
+        os.environ.update(request['env'])
+        sys.stdin = open(os.devnull, mode='r')
+        sys.stdout = _text_stream(self.request, STDOUT)
+        sys.stderr = _text_stream(self.request, STDERR)
+        try:
+            code = run_invocation(request['argv'])
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        send_message(self.request, EXIT, struct.pack("!i", code))
+
+
+class CLIServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """Server that runs each CLI invocation in a forked process.
+
+    Parameters
+    ----------
+    socket_path : str
+        path for the Unix socket
+    """
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _InvocationHandler)
+        # the directory may not be private if the path was chosen by hand
+        os.chmod(socket_path, 0o600)
+
+    def verify_request(self, request, client_address):
+        uid = peer_uid(request)
+        if uid is not None and uid != os.getuid():
+            logger.warning(f"Refused a connection from user {uid}")
+            return False
+        return True
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def peer_uid(sock):
+    """User ID of the process on the other end of a Unix socket.
+
+    Returns None if the platform can't tell (``SO_PEERCRED`` is Linux
+    only).
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None  # -no-cov-
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                            _PEERCRED.size)
+    _, uid, _ = _PEERCRED.unpack(creds)
+    return uid
+
+
+def _remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)  # nothing is listening
+        else:
+            # the server may have forked a handler that has a copy of this
+            # socket; shutting it down (not just closing) ends the handler
+            sock.shutdown(socket.SHUT_RDWR)
+            raise RuntimeError("A server is already running at "
+                               + socket_path)
+
+
+def warm_up(preload=None):
+    """Do the slow setup that would otherwise be done for each invocation.
+
+    Parameters
+    ----------
+    preload : List[str]
+        modules to import; default is :data:`PRELOAD_MODULES`. Modules that
+        can't be imported are skipped.
+    """
+    import importlib
+    from paths_cli.cli import main
+    if preload is None:
+        preload = PRELOAD_MODULES
+
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except ImportError:  # -no-cov-
+            logger.warning(f"Unable to preload {module}")
+
+    for name in main.list_commands(ctx=None):
+        _ = main.get_command(ctx=None, name=name).command
+
+
+def serve_main(socket_path, preload=None):
+    warm_up(preload)
+    server = CLIServer(socket_path)
+    print(f"Serving OpenPathSampling CLI at {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:  # -no-cov-
+        pass
+    finally:
+        server.server_close()
+
+
+def run_client(argv, socket_path, stdout=None, stderr=None):
+    """Send an invocation to the server.
+
+    Parameters
+    ----------
+    argv : List[str]
+        the arguments to the ``openpathsampling`` command
+    socket_path : str
+        the server's socket
+    stdout : binary stream
+        where to write the standard output; default ``sys.stdout.buffer``
+    stderr : binary stream
+        where to write the standard error; default ``sys.stderr.buffer``
+
+    Returns
+    -------
+    int :
+        the exit code
+
+    Raises
+    ------
+    ServerUnavailable :
+        if there's no server at the socket, or the socket is owned by
+        another user; the invocation hasn't been sent
+    """
+    if stdout is None:
+        stdout = sys.stdout.buffer
+    if stderr is None:
+        stderr = sys.stderr.buffer
+
+    outputs = {STDOUT: stdout, STDERR: stderr}
+    request = {'argv': list(argv), 'cwd': os.getcwd(),
+               'env': forwarded_env()}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            check_socket_owner(socket_path)
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError,
+                PermissionError) as e:
+            raise ServerUnavailable(str(e)) from e
+
+        # from here on, the server may have started running the command,
+        # so it must not be run again
+        try:
+            send_message(sock, REQUEST, json.dumps(request).encode('utf-8'))
+            while True:
+                message = recv_message(sock)
+                if message is None:
+                    break
+                channel, payload = message
+                if channel == EXIT:
+                    return struct.unpack("!i", payload)[0]
+                outputs[channel].write(payload)
+                outputs[channel].flush()
+        except ConnectionError:
+            pass
+        stderr.write(b"Lost connection to the server\n")
+        return 1
+
+
+def client_main():  # no-cov
+    """Entry point for the thin client.
+
+    If no server is running, this runs the command in this process.
+    """
+    argv = sys.argv[1:]
+    try:
+        code = run_client(argv, default_socket_path())
+    except (ServerUnavailable, PermissionError):
+        # nothing has been sent to a server
+        code = run_invocation(argv)
+    sys.exit(code)
@@ -0,0 +1,205 @@
+"""Performance settings for SQLite (SimStore) storage files.
+
+SQLite is tuned with ``PRAGMA`` statements, which must be run on each new
+connection. The CLI gives SQLAlchemy a :class:`.SQLiteConnector` that makes
+connections with the pragmas already set. Pragmas can be given one at a
+time, or by choosing one of the profiles in :data:`.STORAGE_PROFILES`.
+
+Files that are only read can also be opened as immutable (no locking), or
+copied into memory; see :data:`.READ_MODES`.
+"""
+import os
+import sqlite3
+import urllib.parse
+
+# allowed values for each pragma; None means any integer
+PRAGMAS = {
+    'journal_mode': ['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL',
+                     'OFF'],
+    'synchronous': ['OFF', 'NORMAL', 'FULL', 'EXTRA'],
+    'cache_size': None,
+    'mmap_size': None,
+    'temp_store': ['DEFAULT', 'FILE', 'MEMORY'],
+}
+
+# these change the file itself (or its durability), so they aren't used
+# when a file is opened to read
+WRITE_PRAGMAS = ['journal_mode', 'synchronous']
+
+# ways to open SQLite files that are only read:
+# * default: normal read; other processes can write to the file
+# * immutable: no locking; nothing may change the file while it is open
+# * memory: copy the file into memory when it is opened
+READ_MODES = ['default', 'immutable', 'memory']
+
+STORAGE_PROFILES = {
+    # SQLite's defaults
+    'default': {},
+    # never lose a committed step, even if the machine crashes
+    'safe': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+    },
+    # long simulations: fewer syncs per step, bigger cache. WAL needs all
+    # processes using the file to be on the same machine, so it doesn't
+    # work on most network file systems.
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,  # negative is in KiB, so 64 MB
+        'temp_store': 'MEMORY',
+    },
+    # reading and analyzing existing files
+    'analysis': {
+        'cache_size': -256000,
+        'mmap_size': 2**30,
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def validate_pragma(name, value):
+    """Check a pragma setting, returning it in normalized form.
+
+    Parameters
+    ----------
+    name : str
+        the pragma name
+    value : Any
+        the value to set
+
+    Returns
+    -------
+    Tuple[str, Union[str, int]] :
+        the normalized name and value
+
+    Raises
+    ------
+    ValueError :
+        if the pragma or value is not allowed
+    """
+    name = name.strip().lower()
+    try:
+        allowed = PRAGMAS[name]
+    except KeyError:
+        raise ValueError(f"Unknown SQLite pragma '{name}'. Allowed "
+                         f"pragmas are: {', '.join(PRAGMAS)}")
+
+    if allowed is None:
+        try:
+            return name, int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"SQLite pragma '{name}' must be an integer, "
+                             f"not '{value}'")
+
+    value = str(value).strip().upper()
+    if value not in allowed:
+        raise ValueError(f"SQLite pragma '{name}' must be one of "
+                         f"{', '.join(allowed)}; not '{value}'")
+    return name, value
+
+
+def parse_pragma(setting):
+    """Parse a pragma setting from the command line, as ``name=value``"""
+    name, sep, value = setting.partition('=')
+    if not sep:
+        raise ValueError(f"SQLite pragma must be given as name=value, not "
+                         f"'{setting}'")
+    return validate_pragma(name, value)
+
+
+def resolve_pragmas(profile=None, pragmas=None):
+    """Combine a profile with individual pragma settings.
+
+    Parameters
+    ----------
+    profile : str or None
+        name of a profile in :data:`.STORAGE_PROFILES`
+    pragmas : Dict[str, Any] or None
+        individual pragma settings; these override the profile
+
+    Returns
+    -------
+    Dict[str, Union[str, int]] :
+        the validated pragma settings
+    """
+    if profile is None:
+        profile = 'default'
+    try:
+        settings = dict(STORAGE_PROFILES[profile])
+    except KeyError:
+        raise ValueError(f"Unknown storage profile '{profile}'. Allowed "
+                         f"profiles are: {', '.join(STORAGE_PROFILES)}")
+
+    if pragmas:
+        settings.update(pragmas)
+
+    return dict(validate_pragma(name, value)
+                for name, value in settings.items())
+
+
+def file_uri(filename, read_only=False, immutable=False):
+    """SQLite URI for a file; immutable files are also opened read-only"""
+    uri = "file:" + urllib.parse.quote(os.path.abspath(filename))
+    if immutable:
+        uri += "?mode=ro&immutable=1"
+    elif read_only:
+        uri += "?mode=ro"
+    return uri
+
+
+class SQLiteConnector(object):
+    """Make SQLite connections with pragmas set.
+
+    This is given to SQLAlchemy as the ``creator`` for the engine. It is a
+    class (instead of a closure) so that the storage can still be pickled.
+
+    Parameters
+    ----------
+    filename : str
+        the database file
+    pragmas : Dict[str, Union[str, int]]
+        pragma settings, as from :func:`.resolve_pragmas`
+    read_mode : str
+        one of :data:`.READ_MODES`; anything but ``'default'`` should only
+        be used for files opened to read. In ``'memory'`` mode, each
+        connection is a new in-memory copy of the file, so the engine
+        should only use a single connection (``StaticPool``).
+    """
+    def __init__(self, filename, pragmas, read_mode='default'):
+        if read_mode not in READ_MODES:
+            raise ValueError(f"Unknown read mode '{read_mode}'. Allowed "
+                             f"modes are: {', '.join(READ_MODES)}")
+        self.filename = filename
+        self.pragmas = dict(validate_pragma(name, value)
+                            for name, value in pragmas.items())
+        self.read_mode = read_mode
+
+    def _connect(self):
+        # SQLAlchemy, not sqlite3, is responsible for thread safety
+        if self.read_mode == 'default':
+            return sqlite3.connect(self.filename, check_same_thread=False)
+
+        uri = file_uri(self.filename, immutable=True)
+        connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        if self.read_mode == 'memory':
+            source = connection
+            connection = sqlite3.connect(":memory:",
+                                         check_same_thread=False)
+            try:
+                source.backup(connection)
+            finally:
+                source.close()
+        return connection
+
+    def __call__(self):
+        connection = self._connect()
+        for name, value in self.pragmas.items():
+            # safe to format: validated names, and values that are either
+            # from a fixed list or integers
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def __repr__(self):
+        return (f"SQLiteConnector({self.filename!r}, {self.pragmas!r}, "
+                f"read_mode={self.read_mode!r})")
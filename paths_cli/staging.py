@@ -0,0 +1,204 @@
+"""Write SimStore output in memory, with checkpoints to the file.
+
+Saving every MC step to a file on a slow (e.g., network) file system can
+take longer than the step itself. With staged output, the SQLite database
+for the output file is kept in memory, and copied to the file (with
+SQLite's backup API) at checkpoints: every so many steps, every so many
+seconds, and when the storage is closed. A crash can only lose the steps
+since the last checkpoint; the file always contains a complete database as
+of some checkpoint.
+"""
+import atexit
+import logging
+import os
+import signal
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _StagedConnection(sqlite3.Connection):
+    """In-memory connection that tells its owner about commits and close"""
+    staged_output = None
+
+    def commit(self):
+        super().commit()
+        if self.staged_output is not None:
+            self.staged_output.maybe_checkpoint()
+
+    def close(self):
+        if self.staged_output is not None:
+            self.staged_output.checkpoint()
+            atexit.unregister(self.staged_output.checkpoint)
+            self.staged_output._connection = None
+            self.staged_output = None
+        super().close()
+
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+_SIGTERM_INSTALLED = False
+
+
+def _install_sigterm_handler():
+    # turn SIGTERM (e.g., from a batch scheduler) into a normal exit, so
+    # that storages are closed (and checkpointed) as the stack unwinds
+    global _SIGTERM_INSTALLED
+    if _SIGTERM_INSTALLED:
+        return
+    if threading.current_thread() is not threading.main_thread():
+        return  # -no-cov-  (can only set signal handlers in main thread)
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _raise_system_exit)
+        _SIGTERM_INSTALLED = True
+
+
+class StagedOutput(object):
+    """In-memory SQLite database that is checkpointed to a file.
+
+    This is given to SQLAlchemy as the ``creator`` for the engine (with a
+    ``StaticPool``, so there is only one connection).
+
+    Parameters
+    ----------
+    filename : str
+        the file to checkpoint to; if it exists when the database is first
+        connected, its contents are loaded into memory
+    pragmas : Dict[str, Union[str, int]]
+        SQLite pragmas for the connection to the file
+    every_steps : int or None
+        checkpoint after this many MC steps (see :meth:`.attach_hooks`)
+    every_seconds : float or None
+        checkpoint when this much time has passed since the last
+        checkpoint; checked whenever the database commits
+    """
+    def __init__(self, filename, pragmas=None, every_steps=None,
+                 every_seconds=None):
+        self.filename = filename
+        self.pragmas = dict(pragmas or {})
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.n_checkpoints = 0
+        self._connection = None
+        self._steps = 0
+        self._last_time = time.monotonic()
+        self._last_changes = None
+
+    def _file_connection(self):
+        from paths_cli.sqlite_settings import SQLiteConnector
+        return SQLiteConnector(self.filename, self.pragmas)()
+
+    def __call__(self):
+        connection = sqlite3.connect(":memory:", factory=_StagedConnection,
+                                     check_same_thread=False)
+        if os.path.exists(self.filename):
+            source = self._file_connection()
+            try:
+                source.backup(connection)
+            finally:
+                source.close()
+
+        connection.staged_output = self
+        self._connection = connection
+        self._last_changes = self._changes()
+        self._last_time = time.monotonic()
+        _install_sigterm_handler()
+        atexit.register(self.checkpoint)
+        return connection
+
+    def _changes(self):
+        # total_changes only counts rows; the schema version counts tables
+        schema, = self._connection.execute("PRAGMA schema_version").fetchone()
+        return (self._connection.total_changes, schema)
+
+    @property
+    def is_dirty(self):
+        """Whether there are changes since the last checkpoint"""
+        return (self._connection is not None
+                and self._changes() != self._last_changes)
+
+    def checkpoint(self):
+        """Copy the in-memory database to the file, if it has changed."""
+        if not self.is_dirty:
+            return
+
+        destination = self._file_connection()
+        try:
+            self._connection.backup(destination)
+        finally:
+            destination.close()
+
+        self.n_checkpoints += 1
+        self._steps = 0
+        self._last_time = time.monotonic()
+        self._last_changes = self._changes()
+        logger.debug(f"Checkpoint {self.n_checkpoints} to {self.filename}")
+
+    def maybe_checkpoint(self):
+        """Checkpoint if enough steps or time have passed."""
+        steps_due = (self.every_steps is not None
+                     and self._steps >= self.every_steps)
+        elapsed = time.monotonic() - self._last_time
+        time_due = (self.every_seconds is not None
+                    and elapsed >= self.every_seconds)
+        if steps_due or time_due:
+            self.checkpoint()
+
+    def after_step(self, sim, step_number, step_info, state, results,
+                   hook_state):
+        self._steps += 1
+        self.maybe_checkpoint()
+
+    def after_simulation(self, sim, hook_state):
+        self.checkpoint()
+
+    def attach_hooks(self, simulation):
+        """Attach hooks to checkpoint based on MC steps to a simulation.
+
+        Parameters
+        ----------
+        simulation : :class:`openpathsampling.PathSimulator`
+            the simulation
+        """
+        simulation.attach_hook(self.after_step, hook_for='after_step')
+        simulation.attach_hook(self.after_simulation,
+                               hook_for='after_simulation')
+
+    def __getstate__(self):
+        # the in-memory database belongs to this process
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def __repr__(self):
+        return (f"StagedOutput({self.filename!r}, "
+                f"every_steps={self.every_steps}, "
+                f"every_seconds={self.every_seconds})")
+
+
+def staged_output(storage):
+    """The :class:`.StagedOutput` for a storage, or None if not staged"""
+    kwargs = getattr(getattr(storage, 'backend', None), 'kwargs', {})
+    creator = kwargs.get('creator')
+    if isinstance(creator, StagedOutput):
+        return creator
+    return None
+
+
+def attach_checkpoint_hooks(simulation, storage):
+    """Attach checkpoint hooks to a simulation, if its output is staged.
+
+    Parameters
+    ----------
+    simulation : :class:`openpathsampling.PathSimulator`
+        the simulation
+    storage : :class:`openpathsampling.Storage` or None
+        the output storage for the simulation
+    """
+    staged = staged_output(storage)
+    if staged is not None:
+        staged.attach_hooks(simulation)
@@ -0,0 +1,212 @@
+"""Measure where the time goes when the CLI starts.
+
+The measurements need a fresh interpreter, since anything that has already
+been imported is free to import again. :func:`run_profile` runs this module
+in a subprocess, which does the measurements and writes them to stdout as
+JSON.
+
+The phases are measured in the order that a real invocation would hit them:
+importing the CLI itself (which includes reading the command manifest),
+then, for each plugin loader, finding its candidate modules and loading
+each candidate, and finally the slow imports that most commands need. This
+order means that a plugin that imports OpenPathSampling when it is loaded
+is charged for that import.
+"""
+import importlib
+import json
+import pathlib
+import subprocess
+import sys
+import time
+
+import click
+
+from .server import PRELOAD_MODULES
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _record(phase, name, seconds, detail=""):
+    return {'phase': phase, 'name': name, 'seconds': seconds,
+            'detail': detail}
+
+
+def _loader_name(loader):
+    return f"{loader.plugin_type}:{loader.search_path}"
+
+
+def profile_loader(loader):
+    """Time finding and loading each candidate for a plugin loader.
+
+    Parameters
+    ----------
+    loader : :class:`.CLIPluginLoader`
+        the loader to profile
+
+    Returns
+    -------
+    List[dict] :
+        records for finding the candidates, and for loading each candidate
+    """
+    locations, seconds = _timed(loader._find_candidate_locations)
+    records = [_record('find', _loader_name(loader), seconds,
+                       f"{len(locations)} candidates")]
+    for location in locations:
+        start = time.perf_counter()
+        try:
+            plugins = loader.load_location(location)
+        except Exception as e:
+            detail = f"error: {e!r}"
+        else:
+            detail = ", ".join(p.name for p in plugins)
+        seconds = time.perf_counter() - start
+        records.append(_record('load', location, seconds, detail))
+    return records
+
+
+def profile_import(module):
+    """Time importing a module (and anything not yet imported that it needs)
+    """
+    start = time.perf_counter()
+    try:
+        importlib.import_module(module)
+    except ImportError as e:
+        detail = f"error: {e!r}"
+    else:
+        detail = ""
+    seconds = time.perf_counter() - start
+    return _record('import', module, seconds, detail)
+
+
+def profile_startup(preload=None, cli_record=None):
+    """Profile startup in this process.
+
+    This only gives meaningful results in a fresh interpreter; see
+    :func:`run_profile`.
+
+    Parameters
+    ----------
+    preload : List[str]
+        slow modules to time importing; default is
+        :data:`.PRELOAD_MODULES`
+    cli_record : dict
+        record for importing the CLI, if it was measured before this module
+        was imported; otherwise importing the CLI is timed here
+
+    Returns
+    -------
+    List[dict] :
+        a record for each step, in the order the steps were run, with keys
+        ``phase``, ``name``, ``seconds``, and ``detail``
+    """
+    if preload is None:
+        preload = PRELOAD_MODULES
+
+    if cli_record is None:
+        cli_record = profile_import('paths_cli')
+
+    records = [cli_record]
+
+    from .plugin_management import (
+        FilePluginLoader, OPSCommandPlugin, COMMAND_ENTRY_POINTS
+    )
+    from .utils import installed_plugin_loaders
+    commands = str(pathlib.Path(__file__).parent.resolve() / 'commands')
+    loaders = installed_plugin_loaders(
+        default_loader=FilePluginLoader(commands, OPSCommandPlugin),
+        plugin_types=OPSCommandPlugin,
+        entry_point_group=COMMAND_ENTRY_POINTS
+    )
+    for loader in loaders:
+        records.extend(profile_loader(loader))
+
+    records.extend(profile_import(module) for module in preload)
+    return records
+
+
+# importing this module imports paths_cli (and therefore the CLI), so the
+# script times that import itself before handing over to _subprocess_main
+_SUBPROCESS_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import paths_cli
+seconds = time.perf_counter() - start
+from paths_cli.startup_profile import _subprocess_main
+_subprocess_main(seconds, sys.argv[1:])
+"""
+
+
+def _subprocess_main(cli_seconds, preload):
+    cli_record = _record('import', 'paths_cli', cli_seconds)
+    # plugins may print while being loaded; keep stdout for our results
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        records = profile_startup(preload or None, cli_record)
+    finally:
+        sys.stdout = stdout
+    json.dump(records, sys.stdout)
+
+
+def run_profile(preload=None, python=None):
+    """Profile startup in a fresh Python process.
+
+    Parameters
+    ----------
+    preload : List[str]
+        slow modules to time importing; default is
+        :data:`.PRELOAD_MODULES`
+    python : str
+        Python executable to use; default is the current one
+
+    Returns
+    -------
+    List[dict] :
+        the records from :func:`.profile_startup`, followed by a record
+        for the total time taken by the process
+
+    Raises
+    ------
+    click.ClickException :
+        if the profiling process fails
+    """
+    if python is None:
+        python = sys.executable
+    cmd = [python, '-c', _SUBPROCESS_SCRIPT]
+    if preload is not None:
+        cmd.extend(preload)
+    # the total includes interpreter startup, which the per-phase times
+    # can't see
+    try:
+        proc, seconds = _timed(subprocess.run, cmd, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, check=True)
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode('utf-8', errors='replace').strip()
+        raise click.ClickException(
+            f"Profiling process failed with exit code {e.returncode}:\n"
+            + stderr
+        )
+    records = json.loads(proc.stdout.decode('utf-8'))
+    records.append(_record('total', "python process", seconds))
+    return records
+
+
+def format_report(records):
+    """Report of the records, slowest first.
+
+    Returns
+    -------
+    str :
+        the report, as a table with one line per record
+    """
+    records = sorted(records, key=lambda rec: rec['seconds'], reverse=True)
+    lines = [f"{'seconds':>8}  {'phase':<6}  name"]
+    for rec in records:
+        line = f"{rec['seconds']:8.3f}  {rec['phase']:<6}  {rec['name']}"
+        if rec['detail']:
+            line += f" ({rec['detail']})"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,185 @@
+"""Report how much of a storage file each table (and column) uses.
+
+Both backends are read directly, without opening the file with OPS:
+
+* for SimStore (SQLite) files, the bytes on disk for each table (with its
+  indexes) come from SQLite's ``dbstat`` virtual table, where SQLite was
+  built with it; the bytes for each column are the total length of the
+  serialized values in that column.
+* for netCDF files, each variable is a column of the table given by its
+  first dimension. The bytes for a column are the size of its data
+  (before any compression, and without HDF5 overhead). Reading the sizes
+  of string variables means reading the strings, so this is slower for
+  large files than the rest of ``contents``.
+
+Snapshots are stored in one table for each kind of snapshot; these tables
+are named ``snapshot<number>`` in both backends.
+"""
+import os
+import re
+import sqlite3
+
+from paths_cli.sqlite_settings import file_uri
+
+SNAPSHOT_TABLE = re.compile(r"snapshot\d+$")
+
+
+def _sqlite_column_bytes(connection, table):
+    columns = [row[1] for row in
+               connection.execute(f'PRAGMA table_info("{table}")')]
+    if not columns:
+        return {}
+    totals = ", ".join(f'SUM(LENGTH(CAST("{col}" AS BLOB)))'
+                       for col in columns)
+    row = connection.execute(f'SELECT {totals} FROM "{table}"').fetchone()
+    return {col: total or 0 for col, total in zip(columns, row)}
+
+
+def _sqlite_disk_bytes(connection):
+    try:
+        rows = connection.execute(
+            "SELECT m.tbl_name, SUM(d.pgsize) FROM dbstat AS d "
+            "JOIN sqlite_master AS m ON d.name = m.name "
+            "GROUP BY m.tbl_name"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return None  # SQLite built without dbstat
+    return dict(rows)
+
+
+def simstore_sizes(filename):
+    """Sizes of the tables and columns in a SimStore (SQLite) file.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]] :
+        for each table, ``rows`` (number of rows), ``bytes`` (bytes on
+        disk, including indexes, or None if SQLite can't report it), and
+        ``columns`` (bytes of data in each column)
+    """
+    connection = sqlite3.connect(file_uri(filename, read_only=True),
+                                 uri=True)
+    try:
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%'"
+        )]
+        disk_bytes = _sqlite_disk_bytes(connection)
+        sizes = {}
+        for table in tables:
+            n_rows, = connection.execute(
+                f'SELECT COUNT(*) FROM "{table}"'
+            ).fetchone()
+            sizes[table] = {
+                'rows': n_rows,
+                'bytes': None if disk_bytes is None
+                else disk_bytes.get(table, 0),
+                'columns': _sqlite_column_bytes(connection, table),
+            }
+    finally:
+        connection.close()
+    return sizes
+
+
+def _netcdf_variable_bytes(variable):
+    if variable.dtype is str:
+        return sum(len(str(value).encode()) for value in variable[:])
+    return variable.size * variable.dtype.itemsize
+
+
+def netcdf_sizes(filename):
+    """Sizes of the tables and columns in a netCDF file.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]] :
+        as for :func:`.simstore_sizes`; here ``bytes`` is the total of the
+        columns
+    """
+    import netCDF4
+    dataset = netCDF4.Dataset(filename, mode='r')
+    try:
+        sizes = {}
+        for name, variable in dataset.variables.items():
+            if not variable.dimensions:
+                continue
+            table = variable.dimensions[0]
+            if table not in sizes:
+                sizes[table] = {'rows': len(dataset.dimensions[table]),
+                                'bytes': 0, 'columns': {}}
+            column = name[len(table) + 1:] if name.startswith(table + "_") \
+                    else name
+            n_bytes = _netcdf_variable_bytes(variable)
+            sizes[table]['columns'][column] = n_bytes
+            sizes[table]['bytes'] += n_bytes
+    finally:
+        dataset.close()
+    return sizes
+
+
+def _per_row(n_bytes, n_rows):
+    return n_bytes / n_rows if n_bytes is not None and n_rows else None
+
+
+def storage_sizes(filename, is_simstore):
+    """Where the bytes go in a storage file.
+
+    Parameters
+    ----------
+    filename : str
+        the storage file
+    is_simstore : bool
+        whether the file is SimStore (instead of netCDF)
+
+    Returns
+    -------
+    Dict[str, Any] :
+        ``file_bytes`` (the size of the file), ``tables`` (as from
+        :func:`.simstore_sizes` or :func:`.netcdf_sizes`), and the
+        averages ``bytes_per_snapshot`` (over the snapshot tables) and
+        ``bytes_per_step`` (the whole file, divided by the number of MC
+        steps); each average is None if it can't be calculated
+    """
+    tables = simstore_sizes(filename) if is_simstore \
+            else netcdf_sizes(filename)
+    snapshot_tables = [size for table, size in tables.items()
+                       if SNAPSHOT_TABLE.match(table)]
+    snapshot_bytes = sum(size['bytes'] for size in snapshot_tables) \
+            if all(size['bytes'] is not None for size in snapshot_tables) \
+            else None
+    n_snapshots = sum(size['rows'] for size in snapshot_tables)
+    file_bytes = os.path.getsize(filename)
+    n_steps = tables.get('steps', {}).get('rows', 0)
+    return {
+        'file_bytes': file_bytes,
+        'tables': tables,
+        'bytes_per_snapshot': _per_row(snapshot_bytes, n_snapshots),
+        'bytes_per_step': _per_row(file_bytes, n_steps),
+    }
+
+
+def _bytes_string(n_bytes):
+    return "unknown size" if n_bytes is None else f"{n_bytes:,} bytes"
+
+
+def get_sizes_string(sizes):
+    """Text report of the result of :func:`.storage_sizes`"""
+    lines = ["Sizes:", "File: " + _bytes_string(sizes['file_bytes'])]
+    by_size = sorted(sizes['tables'].items(),
+                     key=lambda item: (item[1]['bytes'] or 0,
+                                       sum(item[1]['columns'].values())),
+                     reverse=True)
+    for table, size in by_size:
+        lines.append(f"{table} ({size['rows']:,} rows): "
+                     + _bytes_string(size['bytes']))
+        columns = sorted(size['columns'].items(), key=lambda item: item[1],
+                         reverse=True)
+        lines.extend(f"* {column}: {_bytes_string(n_bytes)}"
+                     for column, n_bytes in columns)
+
+    for label, key in [("snapshot", 'bytes_per_snapshot'),
+                       ("step", 'bytes_per_step')]:
+        average = sizes[key]
+        value = "unknown" if average is None else f"{average:,.1f}"
+        lines.append(f"Bytes per {label}: {value}")
+    return "\n".join(lines)
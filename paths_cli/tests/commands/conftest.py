@@ -1 +1,38 @@
+import sqlite3
+
+import pytest
+
+import openpathsampling as paths
+
 from paths_cli.tests.wizard.conftest import ad_openmm
+
+
+@pytest.fixture
+def make_tps_file(tps_fixture):
+    """Factory for a netCDF file with a short TPS run.
+
+    The file has the scheme, network, and engine, the initial conditions
+    (tagged as ``initial_conditions``), and the steps from ``n_steps`` MC
+    steps. The factory returns the filename.
+    """
+    def make(filename="run.nc", n_steps=5):
+        scheme, network, engine, init_conds = tps_fixture
+        storage = paths.Storage(filename, mode='w')
+        storage.save([scheme, network, engine])
+        storage.tags['initial_conditions'] = init_conds
+        from paths_cli.commands.pathsampling import pathsampling_main
+        pathsampling_main(storage, scheme, init_conds, n_steps)
+        storage.close()
+        return filename
+
+    return make
+
+
+def count_rows(filename, table):
+    """Number of rows in a table of a SQLite file"""
+    db = sqlite3.connect(filename)
+    try:
+        n_rows, = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+    finally:
+        db.close()
+    return n_rows
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+
+import openpathsampling as paths
+
+from paths_cli.commands.batch import *
+from paths_cli.param_core import StorageLoader
+from .utils import assert_click_success
+
+PLANS = {
+    'yml': ("commands:\n"
+            "  - append setup.nc -a out.nc --volume A\n"
+            "  - [append, setup.nc, -a, out.nc, --volume, B]\n"
+            "  - contents out.nc --table volumes\n"),
+    'json': ('[["append", "setup.nc", "-a", "out.nc", "--volume", "A"],'
+             ' "append setup.nc -a out.nc --volume B",'
+             ' "contents out.nc --table volumes"]'),
+}
+
+
+def _make_setup(tps_network_and_traj):
+    storage = paths.Storage("setup.nc", mode='w')
+    for obj in tps_network_and_traj:
+        storage.save(obj)
+    storage.close()
+
+
+@pytest.mark.parametrize('ext', ['yml', 'json'])
+def test_load_plan(ext):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("plan." + ext, mode='w') as f:
+            f.write(PLANS[ext])
+        commands = load_plan("plan." + ext)
+    assert commands[0] == ['append', 'setup.nc', '-a', 'out.nc',
+                           '--volume', 'A']
+    assert commands[2] == ['contents', 'out.nc', '--table', 'volumes']
+    assert len(commands) == 3
+
+
+def test_batch(tps_network_and_traj):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup(tps_network_and_traj)
+        with open("plan.yml", mode='w') as f:
+            f.write(PLANS['yml'])
+
+        opened = []
+        real_open = StorageLoader._open
+        def counting_open(self, name):
+            opened.append((name, self.mode))
+            return real_open(self, name)
+
+        with patch.object(StorageLoader, '_open', counting_open):
+            result = runner.invoke(batch, ['plan.yml'])
+
+        assert_click_success(result)
+        # each file is only opened once; reading out.nc reuses the handle
+        # used for appending
+        assert opened == [('setup.nc', 'r'), ('out.nc', 'a')]
+        assert "volumes: 2 items" in result.output
+        assert len(StorageLoader.pool) == 0
+
+        storage = paths.Storage("out.nc", mode='r')
+        assert len(storage.volumes) == 2
+        storage.close()
+
+
+def test_batch_error(tps_network_and_traj):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup(tps_network_and_traj)
+        with open("plan.yml", mode='w') as f:
+            f.write("- contents setup.nc --table foo\n"
+                    "- contents setup.nc\n")
+        result = runner.invoke(batch, ['plan.yml'])
+        assert result.exit_code != 0
+        assert "Volumes" not in result.output
+        assert len(StorageLoader.pool) == 0
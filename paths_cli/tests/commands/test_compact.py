@@ -0,0 +1,107 @@
+import os
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+import openpathsampling as paths
+from openpathsampling.tests.test_helpers import make_1d_traj
+
+from paths_cli.commands.compact import *
+from .conftest import count_rows
+
+pytestmark = pytest.mark.usefixtures('clean_simstore_patch')
+
+
+def make_input_file(make_tps_file, ext):
+    filename = make_tps_file(n_steps=3)
+    storage = paths.Storage(filename, mode='a')
+    # nothing refers to this, so it should be dropped
+    unused = make_1d_traj([5.0, 6.0, 7.0])
+    storage.save(unused)
+    # a rejected trial, which is only kept with all steps
+    last = storage.steps[-1]
+    sample = last.active[0]
+    trial = paths.Sample(replica=sample.replica,
+                         trajectory=make_1d_traj([-0.1, 0.4, 1.1]),
+                         ensemble=sample.ensemble)
+    change = paths.RejectedSampleMoveChange(samples=[trial],
+                                            mover=last.change.mover)
+    rejected = paths.MCStep(mccycle=last.mccycle + 1, previous=last.active,
+                            active=last.active, change=change)
+    storage.save(rejected)
+    storage.close()
+    if ext == 'db':
+        # within one process, SimStore can't load objects after the
+        # monkey-patches are undone, so the .db input is made (and then
+        # read) with them in place
+        from paths_cli.commands.convert import convert
+        result = CliRunner().invoke(convert, [filename, '-o', 'run.db'])
+        assert result.exit_code == 0
+        filename = 'run.db'
+    return filename, unused, trial.trajectory
+
+
+@pytest.mark.parametrize('ext', ['nc', 'db'])
+@pytest.mark.parametrize('keep, n_steps, n_tags', [
+    ([], 5, 2),
+    (['--keep', 'tags'], 0, 2),
+    (['--keep', 'final-samples'], 0, 0),
+    (['--keep', 'accepted-steps', '--keep', 'tags'], 4, 2),
+])
+def test_compact(tps_fixture, make_tps_file, keep, n_steps, n_tags, ext):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file, unused, rejected = make_input_file(make_tps_file, ext)
+        result = runner.invoke(compact, [in_file, '-o', 'small.db',
+                                         '--blocksize', '2'] + keep)
+        assert result.exception is None
+        assert result.exit_code == 0
+        assert count_rows("small.db", "steps") == n_steps
+        assert count_rows("small.db", "tags") == n_tags
+        assert "Saved" in result.output
+        db = sqlite3.connect("small.db")
+        stored = {row[0] for row in db.execute("SELECT uuid FROM uuid")}
+        db.close()
+        assert str(unused.__uuid__) not in stored
+        assert str(unused[0].__uuid__) not in stored
+        assert (str(rejected.__uuid__) in stored) == (n_steps == 5)
+        init_conds = tps_fixture[3]
+        assert (str(init_conds.__uuid__) in stored) == (n_tags > 0)
+
+
+@pytest.mark.parametrize('output', ['out.nc', 'run.db'])
+def test_compact_bad_output(output):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        open("run.db", mode='w').close()
+        result = runner.invoke(compact, ['run.db', '-o', output])
+        assert result.exit_code == 2
+
+
+def test_vacuum():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        db = sqlite3.connect("test.db")
+        db.execute("CREATE TABLE data (value BLOB)")
+        db.executemany("INSERT INTO data VALUES (?)",
+                       [(b'x' * 1000,) for _ in range(100)])
+        db.commit()
+        db.execute("DELETE FROM data")
+        db.commit()
+        db.close()
+        size = os.path.getsize("test.db")
+        vacuum("test.db")
+        assert os.path.getsize("test.db") < size
+
+
+def test_size_report():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        with open("in.db", mode='wb') as f:
+            f.write(b'x' * 2000)
+        with open("out.db", mode='wb') as f:
+            f.write(b'x' * 500)
+        report = size_report("in.db", "out.db")
+        assert "in.db: 2,000 bytes" in report
+        assert "Saved 1,500 bytes (75.0%)" in report
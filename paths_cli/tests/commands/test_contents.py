@@ -1,3 +1,4 @@
+import json
 import os
 import tempfile
 import pytest
@@ -7,6 +8,8 @@ from click.testing import CliRunner
 import openpathsampling as paths
 
 from paths_cli.commands.contents import *
+from paths_cli.commands.contents import _get_named_namedobj, _get_named_tags
+from paths_cli.parameters import INPUT_FILE
 from .utils import assert_click_success
 
 def test_contents(tps_fixture):
@@ -20,9 +23,8 @@ def test_contents(tps_fixture):
         storage.tags['initial_conditions'] = init_conds
 
         results = runner.invoke(contents, ['setup.nc'])
-        cwd = os.getcwd()
         expected = [
-            f"{cwd}/setup.nc",
+            "setup.nc",
             "CVs: 1 item", "* x",
             "Volumes: 8 items", "* A", "* B", "* plus 6 unnamed items",
             "Engines: 2 items", "* flat", "* plus 1 unnamed item",
@@ -53,20 +55,19 @@ def test_contents_table(tps_fixture, table):
         storage.tags['initial_conditions'] = init_conds
 
         results = runner.invoke(contents, ['setup.nc', '--table', table])
-        cwd = os.getcwd()
         expected = {
             'volumes': [
-                f"{cwd}/setup.nc",
+                "setup.nc",
                 "volumes: 8 items", "* A", "* B", "* plus 6 unnamed items",
                 ""
             ],
             'trajectories': [
-                f"{cwd}/setup.nc",
+                "setup.nc",
                 "trajectories: 1 unnamed item",
                 ""
             ],
             'tags': [
-                f"{cwd}/setup.nc",
+                "setup.nc",
                 "tags: 1 item",
                 "* initial_conditions",
                 ""
@@ -82,3 +83,101 @@ def test_contents_table_error():
         storage.close()
         results = runner.invoke(contents, ['temp.nc', '--table', 'foo'])
         assert results.exit_code != 0
+
+def _make_setup_file(tps_fixture, filename):
+    scheme, network, engine, init_conds = tps_fixture
+    storage = paths.Storage(filename, 'w')
+    for obj in tps_fixture:
+        storage.save(obj)
+    storage.tags['initial_conditions'] = init_conds
+    storage.close()
+
+def test_contents_json(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        # the netCDF file is read directly, not opened with OPS
+        with patch.object(type(INPUT_FILE), 'get',
+                          side_effect=AssertionError):
+            results = runner.invoke(contents,
+                                    ['setup.nc', '--format', 'json'])
+        assert_click_success(results)
+        summary = json.loads(results.output)
+        assert summary['file'] == os.path.join(os.getcwd(), "setup.nc")
+        tables = summary['tables']
+        assert tables['volumes'] == {'count': 8, 'names': ['A', 'B'],
+                                     'n_unnamed': 6}
+        assert tables['tags'] == {'count': 1,
+                                  'names': ['initial_conditions'],
+                                  'n_unnamed': 0}
+        assert tables['steps'] == {'count': 0}
+        assert tables['snapshots'] == {
+            'count': 2 * len(tps_fixture[3][0].trajectory)
+        }
+
+def test_contents_table_json(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        results = runner.invoke(contents, ['setup.nc', '--table', 'engines',
+                                           '--format', 'json'])
+        assert_click_success(results)
+        assert json.loads(results.output)['tables'] == {
+            'engines': {'count': 2, 'names': ['flat'], 'n_unnamed': 1}
+        }
+
+def test_summarize_netcdf_matches_storage(tps_fixture):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "setup.nc")
+        _make_setup_file(tps_fixture, filename)
+        storage = paths.Storage(filename, mode='r')
+        try:
+            expected = summarize_storage(storage)
+        finally:
+            storage.close()
+        assert summarize_netcdf(filename) == expected
+
+def test_summarize_netcdf_other_layout():
+    import netCDF4
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "other.nc")
+        netCDF4.Dataset(filename, mode='w').close()
+        assert summarize_netcdf(filename) is None
+
+@pytest.mark.parametrize('output_format', ['text', 'json'])
+def test_contents_sizes(tps_fixture, output_format):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        _make_setup_file(tps_fixture, "setup.nc")
+        results = runner.invoke(contents, ['setup.nc', '--sizes',
+                                           '--format', output_format])
+        assert_click_success(results)
+        file_bytes = os.path.getsize("setup.nc")
+        if output_format == 'json':
+            sizes = json.loads(results.output)['sizes']
+            assert sizes['file_bytes'] == file_bytes
+            assert sizes['tables']['volumes']['rows'] == 8
+            assert sizes['bytes_per_step'] is None  # no steps
+        else:
+            lines = results.output.split("\n")
+            assert "Data Objects:" in lines
+            assert f"File: {file_bytes:,} bytes" in lines
+            assert "Bytes per step: unknown" in lines
+
+def test_section_string_helpers(tps_fixture):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "setup.nc")
+        _make_setup_file(tps_fixture, filename)
+        storage = paths.Storage(filename, mode='r')
+        try:
+            engines = get_section_string_nameable('Engines', storage.engines,
+                                                  _get_named_namedobj)
+            tags = get_section_string_nameable('Tags', storage.tags,
+                                               _get_named_tags)
+            trajectories = get_unnamed_section_string('Trajectories',
+                                                      storage.trajectories)
+        finally:
+            storage.close()
+        assert engines == "Engines: 2 items\n* flat\n* plus 1 unnamed item"
+        assert tags == "Tags: 1 item\n* initial_conditions"
+        assert trajectories == "Trajectories: 1 unnamed item"
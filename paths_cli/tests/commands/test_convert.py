@@ -0,0 +1,154 @@
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+
+import openpathsampling as paths
+
+import paths_cli
+
+from paths_cli.commands.convert import *
+from paths_cli.file_copying import iter_blocks
+from paths_cli.file_copying import CopyProgress
+from .conftest import count_rows
+from .utils import assert_click_success
+
+
+pytestmark = pytest.mark.usefixtures('clean_simstore_patch')
+
+
+def test_convert(make_tps_file):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_tps_file()
+        result = runner.invoke(convert, [in_file, '-o', 'run.db',
+                                         '--blocksize', '4'])
+        assert result.exception is None
+        assert result.exit_code == 0
+        assert not os.path.exists("run.db.progress")
+        assert count_rows("run.db", "steps") == 6
+        assert count_rows("run.db", "tags") == 2
+
+
+def test_convert_resume(make_tps_file, clean_simstore_patch):
+    runner = CliRunner()
+    update = CopyProgress.update
+
+    def interrupt_trajectories(self, stage, n_done):
+        update(self, stage, n_done)
+        if stage == 'trajectories':
+            raise KeyboardInterrupt()
+
+    with runner.isolated_filesystem():
+        in_file = make_tps_file()
+        with patch.object(CopyProgress, 'update', interrupt_trajectories):
+            result = runner.invoke(convert, [in_file, '-o', 'run.db',
+                                             '--blocksize', '2'])
+        assert result.exit_code != 0
+        progress = CopyProgress.load("run.db.progress", in_file)
+        assert progress.n_done('trajectories') == 2
+        assert progress.n_done('steps') == 0
+
+        # a real restart is a new process, without the SimStore patch
+        clean_simstore_patch()
+        with patch('paths_cli.file_copying.iter_blocks',
+                   wraps=iter_blocks) as blocks:
+            result = runner.invoke(convert, [in_file, '-o', 'run.db',
+                                             '--blocksize', '2'])
+        assert result.exit_code == 0
+        starts = [call.kwargs['start'] for call in blocks.call_args_list]
+        n_snapshots = progress.n_done('snapshots')
+        assert starts == [n_snapshots, 2, 0, 0]
+        assert "Resuming" in result.output
+        assert not os.path.exists("run.db.progress")
+        assert count_rows("run.db", "steps") == 6
+
+
+_CRASH_SCRIPT = """
+import os
+import sys
+from unittest.mock import patch
+from paths_cli.cli import main
+from paths_cli.file_copying import CopyProgress
+
+update = CopyProgress.update
+
+def crash_after_trajectories(self, stage, n_done):
+    update(self, stage, n_done)
+    if stage == 'trajectories':
+        os._exit(17)  # no cleanup, as if the process were killed
+
+with patch.object(CopyProgress, 'update', crash_after_trajectories):
+    main(sys.argv[1:])
+"""
+
+
+def test_convert_resume_after_crash_staged(make_tps_file):
+    # with staged output, the sidecar may only say a block is done once
+    # the block is in the file on disk
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_tps_file()
+        # run from the directory with paths_cli, which may not be installed
+        root = os.path.dirname(os.path.dirname(paths_cli.__file__))
+        proc = subprocess.run([sys.executable, '-c', _CRASH_SCRIPT,
+                               '--staged-output', 'convert',
+                               os.path.abspath(in_file),
+                               '-o', os.path.abspath('run.db'),
+                               '--blocksize', '2'],
+                              cwd=root, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE)
+        assert proc.returncode == 17, proc.stderr.decode()
+        progress = CopyProgress.load("run.db.progress", in_file)
+        n_trajectories = progress.n_done('trajectories')
+        assert n_trajectories == 2
+        assert count_rows("run.db", "trajectories") >= n_trajectories
+
+        result = runner.invoke(convert, [in_file, '-o', 'run.db',
+                                         '--blocksize', '2'])
+        assert_click_success(result)
+        assert "Resuming" in result.output
+        assert count_rows("run.db", "steps") == 6
+        with paths.Storage(in_file, mode='r') as storage:
+            n_input_trajectories = len(storage.trajectories)
+        assert count_rows("run.db", "trajectories") == n_input_trajectories
+
+
+def test_convert_memory_budget(make_tps_file):
+    from paths_cli.memory_budget import BlocksizeTuner
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_tps_file()
+        with patch('paths_cli.file_copying.iter_blocks',
+                   wraps=iter_blocks) as blocks:
+            result = runner.invoke(convert, [in_file, '-o', 'run.db',
+                                             '--memory-budget', '64GB'])
+        assert result.exit_code == 0
+        tuners = [call.args[1] for call in blocks.call_args_list]
+        assert len(tuners) == 4
+        assert all(isinstance(tuner, BlocksizeTuner) for tuner in tuners)
+        assert tuners[0].budget == 64 * 10**9
+        assert all(tuner.max_blocksize is not None for tuner in tuners)
+        assert count_rows("run.db", "steps") == 6
+
+
+def test_convert_bad_blocksize(make_tps_file):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_tps_file(n_steps=1)
+        result = runner.invoke(convert, [in_file, '-o', 'run.db',
+                                         '--blocksize', '0'])
+        assert result.exit_code == 2
+        assert "--blocksize" in result.output
+
+
+def test_convert_not_simstore(make_tps_file):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_tps_file(n_steps=1)
+        result = runner.invoke(convert, [in_file, '-o', 'out.nc'])
+        assert result.exit_code == 2
+        assert "SimStore" in result.output
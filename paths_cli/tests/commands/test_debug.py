@@ -0,0 +1,26 @@
+import json
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from paths_cli.commands.debug import *
+
+RECORDS = [
+    {'phase': 'import', 'name': 'paths_cli', 'seconds': 0.5, 'detail': ""},
+    {'phase': 'load', 'name': 'foo.py', 'seconds': 1.5, 'detail': "foo"},
+]
+
+
+@patch('paths_cli.startup_profile.run_profile', return_value=RECORDS)
+def test_startup_profile(run_profile):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        result = runner.invoke(debug, ['startup-profile', '--preload', 'bar',
+                                       '--json', 'profile.json'])
+        assert result.exit_code == 0
+        run_profile.assert_called_once_with(preload=['bar'])
+        lines = result.output.splitlines()
+        assert "foo.py" in lines[1]
+        assert "paths_cli" in lines[2]
+        with open('profile.json') as f:
+            assert json.load(f) == RECORDS
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+from paths_cli.commands.extract import *
+
+pytestmark = pytest.mark.usefixtures('clean_simstore_patch')
+
+
+def stored_mccycles(filename):
+    db = sqlite3.connect(filename)
+    try:
+        rows = db.execute("SELECT mccycle FROM steps").fetchall()
+    finally:
+        db.close()
+    return sorted(row[0] for row in rows)
+
+
+@pytest.mark.parametrize('steps, stride, expected', [
+    ('1:4', 1, [1, 2, 3]),
+    (':', 2, [0, 2, 4]),
+    ('4:', 1, [4, 5]),
+    ('10:', 1, []),
+])
+def test_extract(make_tps_file, steps, stride, expected):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        in_file = make_tps_file()
+        result = runner.invoke(extract, [in_file, '-o', 'part.db',
+                                         '--steps', steps,
+                                         '--stride', str(stride),
+                                         '--blocksize', '2'])
+        assert result.exception is None
+        assert result.exit_code == 0
+        assert stored_mccycles("part.db") == expected
+
+
+@pytest.mark.parametrize('value', ['1', '1:x', 'a:b'])
+def test_parse_step_range_error(value):
+    with pytest.raises(click.BadParameter):
+        parse_step_range(None, None, value)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1:4', (1, 4)), (':4', (None, 4)), ('-3:', (-3, None)),
+    (':', (None, None)),
+])
+def test_parse_step_range(value, expected):
+    assert parse_step_range(None, None, value) == expected
@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+from paths_cli.commands.merge import *
+
+pytestmark = pytest.mark.usefixtures('clean_simstore_patch')
+
+
+def query(filename, sql):
+    db = sqlite3.connect(filename)
+    try:
+        return db.execute(sql).fetchall()
+    finally:
+        db.close()
+
+
+def test_merge(tps_fixture, make_tps_file):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        run0 = make_tps_file("run0.nc", n_steps=3)
+        run1 = make_tps_file("run1.nc", n_steps=2)
+        result = runner.invoke(merge, [run0, run1, '-o', 'all.db'])
+        assert result.exception is None
+        assert result.exit_code == 0
+
+        runs = query("all.db", "SELECT run, COUNT(*) FROM merged_runs "
+                               "GROUP BY run ORDER BY run")
+        assert runs == [(0, 4), (1, 3)]
+        assert query("all.db", "SELECT COUNT(*) FROM steps") == [(7,)]
+        tags = {row[0] for row in query("all.db", "SELECT name FROM tags")}
+        assert tags == {'initial_conditions', 'final_conditions_run0',
+                        'final_conditions_run1'}
+
+        # shared objects are only saved once
+        init_conds = tps_fixture[3]
+        uuids = query("all.db", "SELECT uuid FROM uuid WHERE uuid = "
+                                f"'{init_conds.__uuid__}'")
+        assert len(uuids) == 1
+
+
+def test_merge_same_output():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        open("run.db", mode='w').close()
+        result = runner.invoke(merge, ['run.db', '-o', 'run.db'])
+        assert result.exit_code == 2
+
+
+def test_write_runs_table():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        write_runs_table("test.db", [("1", 0, "a.db"), ("2", 1, "b.db")])
+        write_runs_table("test.db", [("2", 1, "b.db"), ("3", 1, "b.db")])
+        rows = query("test.db", "SELECT * FROM merged_runs "
+                                "ORDER BY step_uuid")
+        assert rows == [("1", 0, "a.db"), ("2", 1, "b.db"),
+                        ("3", 1, "b.db")]
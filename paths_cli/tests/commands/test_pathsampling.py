@@ -44,3 +44,13 @@ def test_pathsampling_main(tps_fixture):
         assert len(storage.schemes) == 1
 
 
+@patch('paths_cli.staging.attach_checkpoint_hooks')
+def test_pathsampling_main_checkpoint_hooks(attach, tps_fixture):
+    scheme, _, _, init_conds = tps_fixture
+    with CliRunner().isolated_filesystem():
+        storage = paths.Storage("tps.nc", mode='w')
+        try:
+            _, sim = pathsampling_main(storage, scheme, init_conds, 1)
+        finally:
+            storage.close()
+        attach.assert_called_once_with(sim, storage)
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+
+import openpathsampling as paths
+from openpathsampling.tests.test_helpers import make_1d_traj
+
+from paths_cli.commands.precompute_cvs import *
+from .utils import assert_click_success
+
+pytestmark = pytest.mark.usefixtures('clean_simstore_patch')
+
+
+def make_input_file(tps_fixture, filename="setup.nc"):
+    scheme, network, engine, init_conds = tps_fixture
+    storage = paths.Storage(filename, mode='w')
+    storage.save([scheme, network, engine, init_conds])
+    storage.close()
+    return filename
+
+
+def cached_values(filename):
+    import netCDF4
+    dataset = netCDF4.Dataset(filename, mode='r')
+    try:
+        if 'cv0_value' not in dataset.variables:
+            return None
+        # the CV is the x coordinate of the snapshot
+        expected = list(dataset.variables['snapshot0_coordinates'][:, 0, 0])
+        return expected, list(dataset.variables['cv0_value'][:])
+    finally:
+        dataset.close()
+
+
+def test_precompute_cvs_netcdf(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        filename = make_input_file(tps_fixture)
+        result = runner.invoke(precompute, [filename, '--blocksize', '3'])
+        assert_click_success(result)
+        expected, values = cached_values(filename)
+        assert values == pytest.approx(expected)
+
+
+def test_precompute_cvs_none(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        filename = make_input_file(tps_fixture)
+        result = runner.invoke(precompute, [filename, '--cv', '--'])
+        assert_click_success(result)
+        assert cached_values(filename) is None
+
+
+def test_precompute_cvs_netcdf_workers(tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        filename = make_input_file(tps_fixture)
+        result = runner.invoke(precompute, [filename, '--workers', '2'])
+        assert result.exit_code != 0
+        assert "SimStore" in result.output
+
+
+@patch('paths_cli.commands.precompute_cvs.precompute_cvs_main')
+def test_precompute_cvs_prefetch(precompute_main, tps_fixture):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        filename = make_input_file(tps_fixture)
+        result = runner.invoke(precompute, [filename, '--prefetch', '5'])
+        assert_click_success(result)
+        assert precompute_main.call_args.kwargs['prefetch'] == 5
+        result = runner.invoke(precompute, [filename, '--prefetch', '0'])
+        assert result.exit_code == 2
+
+
+def test_precompute_cvs_netcdf_rerun(tps_fixture):
+    # snapshots saved after a run get their values from the next run
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        filename = make_input_file(tps_fixture)
+        result = runner.invoke(precompute, [filename])
+        assert_click_success(result)
+        storage = paths.Storage(filename, mode='a')
+        storage.save(make_1d_traj([1.3, 1.5], [2.0, 2.0]))
+        storage.close()
+        result = runner.invoke(precompute, [filename])
+        assert_click_success(result)
+        expected, values = cached_values(filename)
+        assert len(expected) == 9
+        assert values == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('budget', ['1GB', 'lots'])
+def test_precompute_cvs_memory_budget(tps_fixture, budget):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        filename = make_input_file(tps_fixture)
+        result = runner.invoke(precompute, [filename, '--memory-budget',
+                                            budget])
+        if budget == 'lots':
+            assert result.exit_code != 0
+            assert "memory size" in result.output
+        else:
+            assert_click_success(result)
+            expected, values = cached_values(filename)
+            assert values == pytest.approx(expected)
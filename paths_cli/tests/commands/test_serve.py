@@ -0,0 +1,25 @@
+from unittest.mock import patch
+from click.testing import CliRunner
+
+from paths_cli.commands.serve import *
+from paths_cli.server import PRELOAD_MODULES
+
+
+@patch('paths_cli.server.serve_main')
+def test_serve(serve_main):
+    runner = CliRunner()
+    result = runner.invoke(serve, ['--socket', 'foo.sock',
+                                   '--preload', 'bar'])
+    assert result.exit_code == 0
+    serve_main.assert_called_once_with('foo.sock',
+                                       preload=PRELOAD_MODULES + ['bar'])
+
+
+@patch('paths_cli.server.serve_main')
+def test_serve_default_socket(serve_main, monkeypatch):
+    monkeypatch.setenv('OPENPATHSAMPLING_CLI_SOCKET', "/tmp/foo.sock")
+    runner = CliRunner()
+    result = runner.invoke(serve, [])
+    assert result.exit_code == 0
+    serve_main.assert_called_once_with("/tmp/foo.sock",
+                                       preload=PRELOAD_MODULES)
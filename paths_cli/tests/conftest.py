@@ -58,3 +58,29 @@ def tis_network(cv_and_states):
                                           [0.0, 0.1, 0.2])
     network = paths.MISTISNetwork([(state_A, interfaces, state_B)])
     return network
+
+
+def unpatch_simstore():
+    """Undo the OPS monkey-patches from opening a SimStore file"""
+    from openpathsampling.experimental.storage.monkey_patches import unpatch
+    from paths_cli.param_core import StorageLoader
+    unpatch(paths)
+    paths.InterfaceSet.simstore = False
+    StorageLoader.has_simstore_patch = False
+    # TODO: remove with OPS releases containing
+    # openpathsampling/openpathsampling#1065 (see test_compile)
+    import importlib
+    importlib.reload(paths.netcdfplus)
+    importlib.reload(paths.collectivevariable)
+    importlib.reload(paths.collectivevariables)
+    importlib.reload(paths)
+
+
+@pytest.fixture
+def clean_simstore_patch():
+    # writing SimStore monkey-patches OPS; other tests may have left it
+    # partly undone, and later tests need it undone. Tests that need to
+    # act like a new process can call the yielded function.
+    unpatch_simstore()
+    yield unpatch_simstore
+    unpatch_simstore()
@@ -1,5 +1,6 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, PropertyMock
+import click
 from click.testing import CliRunner
 
 from paths_cli.cli import *
@@ -13,6 +14,7 @@ class TestOpenPathSamplingCLI(object):
                 return_val = name
             mock = MagicMock(return_value=return_val)
             mock.name = name
+            mock.hidden = False
             if helpless:
                 mock.short_help = None
             else:
@@ -62,13 +64,18 @@ class TestOpenPathSamplingCLI(object):
     def test_get_command(self, command):
         # this tests that renamings work
         cmd = self.cli.get_command(ctx=None, name=command)
+        assert isinstance(cmd, LazyCommand)
         assert cmd() == 'foobar'
 
+    def test_get_command_missing(self):
+        assert self.cli.get_command(ctx=None, name='baz') is None
+
     def test_format_commands(self):
         class MockFormatter(object):
             def __init__(self):
                 self.title = None
                 self.contents = {}
+                self.width = 80
 
             def section(self, title):
                 self.title = title
@@ -80,6 +87,11 @@ class TestOpenPathSamplingCLI(object):
         formatter = MockFormatter()
         # add a non-existent command; tests when get_command is None
         self.cli._sections['Workflow'] = ['baz']
+        # hidden commands aren't listed
+        hidden = MagicMock(short_help="hidden help", hidden=True)
+        hidden.name = 'hidden'
+        self.cli._register_plugin(OPSCommandPlugin(command=hidden,
+                                                   section="Analysis"))
         self.cli.format_commands(ctx=None, formatter=formatter)
         foo_row = ('foo', 'foo help')
         foobar_row = ('foo-bar', '')
@@ -88,6 +100,81 @@ class TestOpenPathSamplingCLI(object):
         assert len(formatter.contents) == 2
 
 
+class TestLazyCommand(object):
+    def setup(self):
+        @click.command('real', short_help="real help")
+        @click.option('--value', type=int)
+        def real(value):
+            print(f"value: {value}")
+
+        self.real = real
+        self.plugin = MagicMock(short_help="real help", hidden=False)
+        self.plugin.name = 'real'
+        self.func = PropertyMock(return_value=real)
+        type(self.plugin).func = self.func
+        self.lazy = LazyCommand(self.plugin)
+
+    def _n_loads(self):
+        return self.func.call_count
+
+    def test_metadata_without_loading(self):
+        assert self.lazy.name == 'real'
+        assert self.lazy.short_help == "real help"
+        assert self.lazy.get_short_help_str() == "real help"
+        assert not self.lazy.hidden
+        assert self._n_loads() == 0
+
+    def test_hidden(self):
+        self.plugin.hidden = True
+        assert LazyCommand(self.plugin).hidden
+        assert self._n_loads() == 0
+
+    def test_short_help_limit(self):
+        self.lazy.short_help = "calculate all the things in the file"
+        assert self.lazy.get_short_help_str(limit=20) == "calculate all the..."
+        assert self.lazy.get_short_help_str() == self.lazy.short_help
+
+    def test_attributes_from_command(self):
+        assert [p.name for p in self.lazy.params] == ['value']
+        assert self.lazy.callback is self.real.callback
+        assert self._n_loads() > 0
+
+    def test_missing_private_attribute(self):
+        with pytest.raises(AttributeError):
+            self.lazy._foo
+        assert self._n_loads() == 0
+
+    def test_invoke(self):
+        runner = CliRunner()
+        result = runner.invoke(self.lazy, ['--value', '3'])
+        assert result.exit_code == 0
+        assert result.output == "value: 3\n"
+
+    def test_help(self):
+        runner = CliRunner()
+        result = runner.invoke(self.lazy, ['--help'])
+        assert result.exit_code == 0
+        assert "--value" in result.output
+
+
+def test_main_help_loads_nothing():
+    cli = OpenPathSamplingCLI()
+    plugins = [MagicMock(section=p.section, short_help=p.short_help,
+                         hidden=False)
+               for p in cli.plugins]
+    for plugin, mock in zip(cli.plugins[:], plugins):
+        mock.name = plugin.name
+        cli._deregister_plugin(plugin)
+        cli._register_plugin(mock)
+
+    formatter = click.HelpFormatter()
+    cli.format_commands(ctx=None, formatter=formatter)
+    assert "pathsampling" in formatter.getvalue()
+    for mock in plugins:
+        assert not mock.func.called
+        assert not mock.command.called
+
+
 @pytest.mark.parametrize('with_log', [True, False])
 def test_main_log(with_log):
     logged_stdout = "About to run command\n"
@@ -118,3 +205,88 @@ def test_main_log(with_log):
             result = runner.invoke(main, invocation)
     found = result.stdout_bytes
     assert found.decode('utf-8') == expected
+
+
+def test_sqlite_choices():
+    from paths_cli.sqlite_settings import STORAGE_PROFILES, READ_MODES
+    assert set(STORAGE_PROFILE_NAMES) == set(STORAGE_PROFILES)
+    assert SQLITE_READ_MODES == READ_MODES
+
+
+@pytest.mark.parametrize('use_envvar', [True, False])
+def test_main_sqlite_settings(use_envvar, monkeypatch):
+    from paths_cli.param_core import StorageLoader
+    monkeypatch.setattr(StorageLoader, 'sqlite_pragmas', {})
+    monkeypatch.setattr(StorageLoader, 'sqlite_read_mode', 'default')
+    if use_envvar:
+        monkeypatch.setenv('OPENPATHSAMPLING_STORAGE_PROFILE', 'safe')
+        monkeypatch.setenv('OPENPATHSAMPLING_SQLITE_PRAGMAS',
+                           "cache_size=-100 temp_store=memory")
+        monkeypatch.setenv('OPENPATHSAMPLING_INPUT_STORAGE', 'immutable')
+        invocation = ['null-command']
+    else:
+        invocation = ['--storage-profile', 'safe',
+                      '--sqlite-pragma', 'cache_size=-100',
+                      '--sqlite-pragma', 'temp_store=memory',
+                      '--input-storage', 'immutable',
+                      'null-command']
+
+    runner = CliRunner()
+    with NullCommandContext(main):
+        result = runner.invoke(main, invocation)
+    assert result.exit_code == 0
+    assert StorageLoader.sqlite_pragmas == {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -100,
+        'temp_store': 'MEMORY',
+    }
+    assert StorageLoader.sqlite_read_mode == 'immutable'
+
+
+def test_main_sqlite_bad_pragma(monkeypatch):
+    from paths_cli.param_core import StorageLoader
+    monkeypatch.setattr(StorageLoader, 'sqlite_pragmas', {})
+    runner = CliRunner()
+    with NullCommandContext(main):
+        result = runner.invoke(main, ['--sqlite-pragma', 'foo=bar',
+                                      'null-command'])
+    assert result.exit_code == 2
+    assert "Unknown SQLite pragma" in result.output
+    assert StorageLoader.sqlite_pragmas == {}
+
+
+@pytest.mark.parametrize('use_envvar', [True, False])
+def test_main_staged_output(use_envvar, monkeypatch):
+    from paths_cli.param_core import StorageLoader
+    monkeypatch.setattr(StorageLoader, 'sqlite_staging', None)
+    if use_envvar:
+        monkeypatch.setenv('OPENPATHSAMPLING_STAGED_OUTPUT', 'true')
+        monkeypatch.setenv('OPENPATHSAMPLING_CHECKPOINT_STEPS', '10')
+        invocation = ['null-command']
+    else:
+        invocation = ['--staged-output', '--checkpoint-steps', '10',
+                      'null-command']
+
+    runner = CliRunner()
+    with NullCommandContext(main):
+        result = runner.invoke(main, invocation)
+    assert result.exit_code == 0
+    assert StorageLoader.sqlite_staging == {'every_steps': 10,
+                                            'every_seconds': 300.0}
+
+    with NullCommandContext(main):
+        result = runner.invoke(main, ['--no-staged-output', 'null-command'])
+    assert result.exit_code == 0
+    assert StorageLoader.sqlite_staging is None
+
+
+def test_main_write_behind(monkeypatch):
+    from paths_cli.param_core import StorageLoader
+    monkeypatch.setattr(StorageLoader, 'write_behind', None)
+    runner = CliRunner()
+    with NullCommandContext(main):
+        result = runner.invoke(main, ['--write-behind', '--write-queue-size',
+                                      '10', 'null-command'])
+    assert result.exit_code == 0
+    assert StorageLoader.write_behind == {'max_queue': 10}
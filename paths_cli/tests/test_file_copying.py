@@ -3,6 +3,7 @@ import functools
 import os
 import tempfile
 from unittest.mock import MagicMock, patch
+import numpy as np
 import pytest
 
 import openpathsampling as paths
@@ -52,6 +53,12 @@ def test_make_blocks(blocksize):
     assert sum(blocks, []) == ll
 
 
+def test_generate_blocks():
+    blocks = generate_blocks(list(range(5)), 2)
+    assert next(blocks) == [0, 1]
+    assert list(blocks) == [[2, 3], [4]]
+
+
 class TestPrecompute(object):
     def setup(self):
         class RunOnceFunction(object):
@@ -99,8 +106,241 @@ class TestPrecompute(object):
             for block in blocks:
                 assert len(block) == 2
 
+            proxied = [snap.__uuid__ for block in blocks for snap in block]
+            expected = [snap.__uuid__ for snap in storage.snapshots.all()]
+            assert proxied == expected
+
             # smoke test: only effect should be caching results
-            precompute_func(blocks[0])
+            precompute_func(next(iter(blocks)))
+
+
+def test_simstore_snapshot_blocks():
+    tables = {'snapshot0': list(range(5)), 'snapshot1': list(range(2))}
+    storage = MagicMock()
+    storage.snapshots.tables = tables
+    blocks = list(simstore_snapshot_blocks(storage, 2))
+    assert blocks == [('snapshot0', 0, 2), ('snapshot0', 2, 4),
+                      ('snapshot0', 4, 5), ('snapshot1', 0, 2)]
+    tuner = MagicMock(blocksize=3)
+    assert list(simstore_snapshot_blocks(storage, tuner)) == [
+        ('snapshot0', 0, 3), ('snapshot0', 3, 5), ('snapshot1', 0, 2)
+    ]
+    storage.load.return_value = ['snap']
+    assert load_snapshots(storage, ['uuid']) == ['snap']
+    storage.cache.clear.assert_called_once()
+    storage.load.assert_called_once_with(['uuid'])
+
+
+class FakeSimStoreBackend(object):
+    # just the parts of the SQL backend used to find missing CV values
+    def __init__(self, snapshot_uuids, cv_results):
+        import sqlalchemy as sql
+        self.engine = sql.create_engine("sqlite://")
+        self.metadata = sql.MetaData()
+        snapshots = sql.Table('snapshot0', self.metadata,
+                              sql.Column('idx', sql.Integer),
+                              sql.Column('uuid', sql.String))
+        tables = {'snapshot0': snapshots}
+        for cv_uuid in cv_results:
+            tables[cv_uuid] = sql.Table(cv_uuid, self.metadata,
+                                        sql.Column('uuid', sql.String),
+                                        sql.Column('value', sql.Float))
+        self.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(snapshots.insert(),
+                         [{'idx': idx + 1, 'uuid': uuid}
+                          for idx, uuid in enumerate(snapshot_uuids)])
+            for cv_uuid, results in cv_results.items():
+                if results:
+                    conn.execute(tables[cv_uuid].insert(),
+                                 [{'uuid': uuid, 'value': value}
+                                  for uuid, value in results.items()])
+
+    def has_table(self, table_name):
+        return table_name in self.metadata.tables
+
+
+class TestSimStoreMissing(object):
+    def setup(self):
+        self.cvs = [MagicMock(__uuid__=name) for name in ['cv0', 'cv1',
+                                                          'cv2']]
+        self.storage = MagicMock()
+        # cv0 has some values; cv1 has all values; cv2 has no table yet
+        self.storage.backend = FakeSimStoreBackend(
+            snapshot_uuids=['s0', 's1', 's2', 's3', 's4'],
+            cv_results={'cv0': {'s1': 1.0, 's4': 4.0},
+                        'cv1': {uuid: 0.0 for uuid in
+                                ['s0', 's1', 's2', 's3', 's4']}}
+        )
+
+    @pytest.mark.parametrize('cv_idx, expected', [
+        (0, ['s2', 's3']), (1, []), (2, ['s1', 's2', 's3']),
+    ])
+    def test_simstore_missing_uuids(self, cv_idx, expected):
+        block = ('snapshot0', 1, 4)
+        missing = simstore_missing_uuids(self.storage, self.cvs[cv_idx],
+                                         block)
+        assert missing == expected
+
+    def test_simstore_block_todo(self):
+        todo = simstore_block_todo(self.storage, self.cvs,
+                                   ('snapshot0', 3, 5))
+        assert todo == {'cv0': ['s3'], 'cv2': ['s3', 's4']}
+        assert simstore_block_todo(self.storage, self.cvs[:2],
+                                   ('snapshot0', 4, 5)) == {}
+
+
+class TestSimStoreCVResults(object):
+    def setup(self):
+        from openpathsampling.experimental.storage.collective_variables \
+                import CoordinateFunctionCV
+        from openpathsampling.experimental.simstore.serialization_helpers \
+                import get_uuid
+        self.get_uuid = get_uuid
+        self.cv = CoordinateFunctionCV(lambda s: s.xyz[0][0]).named('x')
+        self.snapshots = make_1d_traj([1.0, 2.0, 3.0])
+
+    def test_simstore_cv_results(self):
+        results = simstore_cv_results([self.cv], self.snapshots)
+        expected = {self.get_uuid(snap): snap.xyz[0][0]
+                    for snap in self.snapshots}
+        assert results == {self.get_uuid(self.cv): expected}
+        assert len(self.cv.local_cache) == 0
+
+    def test_simstore_cv_results_todo(self):
+        uuids = [self.get_uuid(snap) for snap in self.snapshots]
+        todo = {self.get_uuid(self.cv): uuids[1:]}
+        results = simstore_cv_results([self.cv], self.snapshots, todo)
+        assert results == {self.get_uuid(self.cv): {uuids[1]: 2.0,
+                                                    uuids[2]: 3.0}}
+
+    def test_calculate_simstore_block(self):
+        by_uuid = {self.get_uuid(snap): snap for snap in self.snapshots}
+        storage = MagicMock()
+        storage.load.side_effect = lambda uuids: [by_uuid[uuid]
+                                                  for uuid in uuids]
+        uuids = list(by_uuid)
+        todo = {self.get_uuid(self.cv): [uuids[2], uuids[0]]}
+        results = calculate_simstore_block(storage, [self.cv], todo)
+        storage.load.assert_called_once_with([uuids[2], uuids[0]])
+        assert results == {self.get_uuid(self.cv): {uuids[0]: 1.0,
+                                                    uuids[2]: 3.0}}
+
+    def test_save_simstore_cv_results_nothing_new(self):
+        storage = MagicMock()
+        save_simstore_cv_results(storage, [self.cv],
+                                 {self.get_uuid(self.cv): {}})
+        storage.save_function_results.assert_not_called()
+
+    def test_save_simstore_cv_results(self):
+        saved = []
+        storage = MagicMock()
+        storage.save_function_results.side_effect = \
+                lambda cvs: saved.append(dict(cvs[0].local_cache.result_dict))
+        results = simstore_cv_results([self.cv], self.snapshots)
+        save_simstore_cv_results(storage, [self.cv], results)
+        assert saved == [results[self.get_uuid(self.cv)]]
+        assert len(self.cv.local_cache) == 0
+
+
+class TestMDTrajBlockCVs(object):
+    def setup(self):
+        md = pytest.importorskip('mdtraj')
+        from openpathsampling.engines import features, SnapshotFactory
+        from openpathsampling.experimental.storage.collective_variables \
+                import MDTrajFunctionCV
+        from openpathsampling.experimental.simstore.serialization_helpers \
+                import get_uuid
+        self.get_uuid = get_uuid
+        md_topology = md.Topology()
+        residue = md_topology.add_residue('XXX', md_topology.add_chain())
+        for i in range(4):
+            md_topology.add_atom('X' + str(i), md.element.argon, residue)
+        topology = paths.engines.MDTrajTopology(md_topology)
+        snapshot_class = SnapshotFactory(
+            'BoxSnapshot', [features.coordinates, features.box_vectors,
+                            features.velocities, features.engine]
+        )
+        rng = np.random.default_rng(42)
+        self.snapshots = [
+            snapshot_class(coordinates=rng.random((4, 3)),
+                           velocities=np.zeros((4, 3)),
+                           box_vectors=1.5 * np.identity(3))
+            for _ in range(5)
+        ]
+        self.calls = collections.Counter()
+
+        def counted(name, func):
+            def wrapper(traj, **kwargs):
+                self.calls[name] += 1
+                return func(traj, **kwargs)
+            return wrapper
+
+        self.cvs = [
+            MDTrajFunctionCV(counted('dist', md.compute_distances),
+                             topology, atom_pairs=[[0, 1]]).named('dist'),
+            MDTrajFunctionCV(counted('dists', md.compute_distances),
+                             topology,
+                             atom_pairs=[[0, 1], [2, 3]]).named('dists'),
+            MDTrajFunctionCV(counted('angle', md.compute_angles), topology,
+                             angle_indices=[[0, 1, 2]]).named('angle'),
+        ]
+
+    def _one_at_a_time(self, cv, snapshots):
+        values = cv(snapshots)
+        cv.local_cache.clear()
+        return dict(zip([self.get_uuid(snap) for snap in snapshots],
+                        values))
+
+    def test_is_block_mdtraj_cv(self):
+        from openpathsampling.experimental.storage.collective_variables \
+                import CoordinateFunctionCV
+        from openpathsampling.experimental.simstore.storable_functions \
+                import StorableFunctionConfig
+        assert is_block_mdtraj_cv(self.cvs[0])
+        other = CoordinateFunctionCV(lambda s: s.xyz[0][0])
+        assert not is_block_mdtraj_cv(other)
+        self.cvs[0].func_config = StorableFunctionConfig([])
+        assert not is_block_mdtraj_cv(self.cvs[0])
+
+    def test_simstore_cv_results(self):
+        results = simstore_cv_results(self.cvs, self.snapshots)
+        assert self.calls == {'dist': 1, 'dists': 1, 'angle': 1}
+        for cv in self.cvs:
+            expected = self._one_at_a_time(cv, self.snapshots)
+            cv_results = results[self.get_uuid(cv)]
+            assert set(cv_results) == set(expected)
+            for uuid, value in cv_results.items():
+                assert np.shape(value) == np.shape(expected[uuid])
+                assert value == pytest.approx(expected[uuid])
+
+    def test_simstore_cv_results_shared_trajectory(self):
+        uuids = [self.get_uuid(snap) for snap in self.snapshots]
+        todo = {self.get_uuid(self.cvs[0]): uuids[1:3],
+                self.get_uuid(self.cvs[1]): uuids[2:4]}
+        with patch.object(paths.Trajectory, 'to_mdtraj',
+                          autospec=True,
+                          side_effect=paths.Trajectory.to_mdtraj) as to_md:
+            results = simstore_cv_results(self.cvs, self.snapshots, todo)
+        assert to_md.call_count == 1
+        assert len(to_md.call_args[0][0]) == 3
+        dists = results[self.get_uuid(self.cvs[1])]
+        assert set(dists) == set(uuids[2:4])
+        expected = self._one_at_a_time(self.cvs[1], self.snapshots[2:4])
+        for uuid in dists:
+            assert dists[uuid] == pytest.approx(expected[uuid])
+        assert results[self.get_uuid(self.cvs[2])] == {}
+
+    def test_mdtraj_cv_values_not_per_frame(self):
+        # a function that gives one value for the whole trajectory can't be
+        # split into frames, so it is calculated one snapshot at a time
+        self.cvs[0].func = lambda traj, **kwargs: traj.n_frames
+        traj = paths.Trajectory(self.snapshots).to_mdtraj(
+            topology=self.cvs[0].mdtraj_topology
+        )
+        assert mdtraj_cv_values(self.cvs[0], traj) is None
+        results = simstore_cv_results(self.cvs[:1], self.snapshots)
+        assert set(results[self.get_uuid(self.cvs[0])].values()) == {1}
 
 
 def test_rewrite_file():
@@ -128,3 +368,86 @@ def test_rewrite_file():
 
     assert storage._stores['foo'] == [0, 1, 2]
     assert storage._stores['bar'] == [[3], [4], [5]]
+
+
+@pytest.mark.parametrize('start, expected', [
+    (0, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]),
+    (6, [[6, 7, 8, 9]]),
+    (10, []),
+])
+def test_iter_blocks(start, expected):
+    store = MagicMock(__len__=lambda self: 10,
+                      __getitem__=lambda self, i: i)
+    blocks = iter_blocks(store, 4, start=start)
+    assert not isinstance(blocks, list)  # loaded lazily
+    assert list(blocks) == expected
+
+
+@pytest.mark.parametrize('blocksize', [0, -1])
+def test_iter_blocks_bad_blocksize(blocksize):
+    store = MagicMock(__len__=lambda self: 10,
+                      __getitem__=lambda self, i: i)
+    with pytest.raises(ValueError, match="at least 1"):
+        next(iter_blocks(store, blocksize))
+
+
+@pytest.mark.parametrize('stop, stride, expected', [
+    (8, 1, [[2, 3, 4], [5, 6, 7]]),
+    (None, 3, [[2, 5, 8]]),
+    (20, 2, [[2, 4, 6], [8]]),
+])
+def test_iter_blocks_stop_stride(stop, stride, expected):
+    store = MagicMock(__len__=lambda self: 10,
+                      __getitem__=lambda self, i: i)
+    blocks = iter_blocks(store, 3, start=2, stop=stop, stride=stride)
+    assert list(blocks) == expected
+
+
+def test_iter_blocks_changing_blocksize():
+    class Tuner(object):
+        blocksize = 2
+
+    tuner = Tuner()
+    store = MagicMock(__len__=lambda self: 10,
+                      __getitem__=lambda self, i: i)
+    blocks = iter_blocks(store, tuner)
+    assert next(blocks) == [0, 1]
+    tuner.blocksize = 5
+    assert next(blocks) == [2, 3, 4, 5, 6]
+    tuner.blocksize = 1
+    assert list(blocks) == [[7], [8], [9]]
+
+
+class TestCopyProgress(object):
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "out.db.progress")
+        self.progress = CopyProgress(self.filename, "in.nc")
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def test_update_and_load(self):
+        assert CopyProgress.load(self.filename, "in.nc") is None
+        self.progress.update('snapshots', 10)
+        self.progress.update('trajectories', 2)
+        loaded = CopyProgress.load(self.filename, "in.nc")
+        assert loaded.n_done('snapshots') == 10
+        assert loaded.n_done('trajectories') == 2
+        assert loaded.n_done('steps') == 0
+        assert os.listdir(self.tmpdir.name) == ["out.db.progress"]
+
+    def test_load_other_source(self):
+        self.progress.update('snapshots', 10)
+        assert CopyProgress.load(self.filename, "other.nc") is None
+
+    def test_load_corrupt(self):
+        with open(self.filename, mode='w') as f:
+            f.write("{not json")
+        assert CopyProgress.load(self.filename, "in.nc") is None
+
+    def test_remove(self):
+        self.progress.update('snapshots', 10)
+        self.progress.remove()
+        assert not os.path.exists(self.filename)
+        self.progress.remove()  # already gone; no error
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+from unittest.mock import patch
+
+from paths_cli.file_utils import *
+
+
+@pytest.mark.parametrize('data, expected', [("foo", b"foo"),
+                                            (b"\x00bar", b"\x00bar")])
+def test_atomic_write(tmp_path, data, expected):
+    path = tmp_path / "new_dir" / "file.json"
+    atomic_write(str(path), data)
+    assert path.read_bytes() == expected
+    atomic_write(str(path), data + data)
+    assert path.read_bytes() == expected + expected
+    assert os.listdir(tmp_path / "new_dir") == ["file.json"]
+
+
+def test_atomic_write_error(tmp_path):
+    path = tmp_path / "file.json"
+    path.write_bytes(b"old")
+    with patch('os.replace', side_effect=OSError("failed")):
+        with pytest.raises(OSError, match="failed"):
+            atomic_write(str(path), "new")
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["file.json"]
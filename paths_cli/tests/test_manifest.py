@@ -0,0 +1,141 @@
+import json
+import os
+
+import pytest
+import click
+
+from paths_cli.plugin_management import (
+    FilePluginLoader, OPSCommandPlugin, PluginRegistrationError
+)
+from paths_cli.manifest import *
+
+_PLUGIN_TEMPLATE = """
+import click
+from paths_cli import OPSCommandPlugin
+
+with open({logfile!r}, mode='a') as log:
+    log.write("loaded\\n")
+
+@click.command({name!r}, short_help={short_help!r})
+def command():
+    print("ran {name}")
+
+PLUGIN = OPSCommandPlugin(command=command, section="Workflow")
+"""
+
+
+class TestCommandManifest(object):
+    def _write_plugin(self, tmp_path, name, short_help):
+        plugin_dir = tmp_path / "plugins"
+        plugin_dir.mkdir(exist_ok=True)
+        self.logfile = str(tmp_path / "load.log")
+        with open(plugin_dir / (name + ".py"), mode='w') as f:
+            f.write(_PLUGIN_TEMPLATE.format(logfile=self.logfile, name=name,
+                                            short_help=short_help))
+        return plugin_dir
+
+    def _n_loads(self):
+        if not os.path.exists(self.logfile):
+            return 0
+        with open(self.logfile) as f:
+            return len(f.readlines())
+
+    def _manifest(self, tmp_path, plugin_dir):
+        loader = FilePluginLoader(str(plugin_dir), OPSCommandPlugin)
+        return CommandManifest([loader],
+                               filename=str(tmp_path / "manifest.json"))
+
+    def test_first_run_loads(self, tmp_path):
+        plugin_dir = self._write_plugin(tmp_path, 'foo', "foo help")
+        plugins = self._manifest(tmp_path, plugin_dir).plugins()
+        assert self._n_loads() == 1
+        assert len(plugins) == 1
+        assert not isinstance(plugins[0], CachedCommandPlugin)
+        with open(tmp_path / "manifest.json") as f:
+            manifest = json.load(f)
+        (entry,) = manifest['candidates'].values()
+        assert entry['plugins'][0]['name'] == 'foo'
+        assert entry['plugins'][0]['short_help'] == "foo help"
+
+    def test_cached_run_is_lazy(self, tmp_path):
+        plugin_dir = self._write_plugin(tmp_path, 'foo', "foo help")
+        _ = self._manifest(tmp_path, plugin_dir).plugins()
+        plugins = self._manifest(tmp_path, plugin_dir).plugins()
+        assert self._n_loads() == 1
+        (plugin,) = plugins
+        assert isinstance(plugin, CachedCommandPlugin)
+        assert plugin.name == 'foo'
+        assert plugin.section == "Workflow"
+        assert plugin.short_help == "foo help"
+        assert not plugin.hidden
+        assert plugin.plugin_type == 'file'
+        assert self._n_loads() == 1
+        assert isinstance(plugin.func, click.Command)
+        assert plugin.func.name == 'foo'
+        assert self._n_loads() == 2
+        _ = plugin.func  # only loaded once
+        assert self._n_loads() == 2
+
+    def test_changed_plugin_reloads(self, tmp_path):
+        plugin_dir = self._write_plugin(tmp_path, 'foo', "foo help")
+        _ = self._manifest(tmp_path, plugin_dir).plugins()
+        _ = self._write_plugin(tmp_path, 'foo', "changed help")
+        (plugin,) = self._manifest(tmp_path, plugin_dir).plugins()
+        assert self._n_loads() == 2
+        assert plugin.short_help == "changed help"
+        (plugin,) = self._manifest(tmp_path, plugin_dir).plugins()
+        assert isinstance(plugin, CachedCommandPlugin)
+        assert plugin.short_help == "changed help"
+
+    @pytest.mark.parametrize('key, value', [('cli_version', "0.0.0"),
+                                            ('format', 1)])
+    def test_version_change_reloads(self, tmp_path, key, value):
+        plugin_dir = self._write_plugin(tmp_path, 'foo', "foo help")
+        manifest = self._manifest(tmp_path, plugin_dir)
+        _ = manifest.plugins()
+        with open(manifest.filename) as f:
+            contents = json.load(f)
+        contents[key] = value
+        with open(manifest.filename, mode='w') as f:
+            json.dump(contents, f)
+        (plugin,) = self._manifest(tmp_path, plugin_dir).plugins()
+        assert not isinstance(plugin, CachedCommandPlugin)
+        assert self._n_loads() == 2
+
+    def test_removed_command(self, tmp_path):
+        plugin_dir = self._write_plugin(tmp_path, 'foo', "foo help")
+        _ = self._manifest(tmp_path, plugin_dir).plugins()
+        (plugin,) = self._manifest(tmp_path, plugin_dir).plugins()
+        # simulate the file changing between listing and loading
+        plugin._load_plugins = lambda: []
+        with pytest.raises(PluginRegistrationError):
+            plugin.func
+
+    def test_broken_plugin(self, tmp_path):
+        plugin_dir = self._write_plugin(tmp_path, 'foo', "foo help")
+        with open(plugin_dir / "broken.py", mode='w') as f:
+            f.write("raise RuntimeError('oops')\n")
+
+        manifest = self._manifest(tmp_path, plugin_dir)
+        with pytest.warns(UserWarning, match="broken.py"):
+            plugins = manifest.plugins()
+
+        assert [p.name for p in plugins] == ['foo']
+        with open(manifest.filename) as f:
+            candidates = json.load(f)['candidates']
+        assert len(candidates) == 1
+
+    def test_no_filename(self, tmp_path):
+        plugin_dir = self._write_plugin(tmp_path, 'foo', "foo help")
+        loader = FilePluginLoader(str(plugin_dir), OPSCommandPlugin)
+        for _ in range(2):
+            (plugin,) = CommandManifest([loader], filename=None).plugins()
+            assert not isinstance(plugin, CachedCommandPlugin)
+        assert self._n_loads() == 2
+
+
+def test_manifest_filename():
+    # smoke test; details are OS-dependent
+    filename = manifest_filename()
+    assert filename.endswith(".json")
+    assert "command-manifest" in filename
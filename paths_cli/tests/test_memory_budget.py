@@ -0,0 +1,119 @@
+import click
+import pytest
+
+from openpathsampling.tests.test_helpers import make_1d_traj
+
+from paths_cli.memory_budget import *
+
+
+@pytest.mark.parametrize('value, expected', [
+    ("8GB", 8 * 10**9), ("512M", 512 * 10**6), ("1.5GiB", 3 * 2**29),
+    ("100", 100), ("2 kib", 2048), ("10tb", 10 * 10**12),
+])
+def test_parse_memory_size(value, expected):
+    assert parse_memory_size(value) == expected
+
+
+@pytest.mark.parametrize('value', ["", "GB", "8XB", "-1GB", "1.2.3G"])
+def test_parse_memory_size_error(value):
+    with pytest.raises(ValueError):
+        parse_memory_size(value)
+
+
+def test_memory_budget_callback():
+    assert memory_budget_callback(None, None, None) is None
+    assert memory_budget_callback(None, None, "1KiB") == 1024
+    with pytest.raises(click.BadParameter, match="memory size"):
+        memory_budget_callback(None, None, "lots")
+    with pytest.raises(click.BadParameter, match="more than 0"):
+        memory_budget_callback(None, None, "0GB")
+
+
+def test_current_rss():
+    rss = current_rss()
+    # only available on Linux
+    assert rss is None or rss > 0
+
+
+def test_snapshot_nbytes():
+    snap = make_1d_traj([1.0])[0]
+    expected = snap.coordinates.nbytes + snap.velocities.nbytes
+    assert snapshot_nbytes(snap) == expected
+
+
+@pytest.mark.parametrize('n_used, expected', [(None, 200), (200, 100),
+                                               (800, 1)])
+def test_estimate_blocksize(n_used, expected):
+    # memory is given in units of what each snapshot needs
+    per_snapshot = ARRAY_COPIES * 1000 + SNAPSHOT_OVERHEAD
+    rss = n_used and n_used * per_snapshot
+    assert estimate_blocksize(400 * per_snapshot, 1000, rss) == expected
+
+
+def test_max_blocksize():
+    per_snapshot = ARRAY_COPIES * 1000 + SNAPSHOT_OVERHEAD
+    assert max_blocksize(400 * per_snapshot, 1000) == 400
+    assert max_blocksize(10, 1000) == 1
+
+
+class TestBlocksizeTuner(object):
+    def setup(self):
+        self.rss = 0
+        self.time = 0.0
+        self.tuner = BlocksizeTuner(1000, 10, max_blocksize=100,
+                                    rss=lambda: self.rss,
+                                    clock=lambda: self.time)
+
+    def _block(self, rss, seconds):
+        self.rss = rss
+        self.time += seconds
+        self.tuner.update(self.tuner.blocksize)
+
+    def test_shrink_over_budget(self):
+        # grew 1000 for 10 objects; the first 800 of that fit
+        self.rss = 200
+        self.tuner._last_rss = 200
+        self._block(rss=1200, seconds=1.0)
+        assert self.tuner.blocksize == 8
+        self._block(rss=4000, seconds=1.0)
+        assert self.tuner.blocksize == 1
+        self._block(rss=4000, seconds=1.0)
+        assert self.tuner.blocksize == 1
+
+    @pytest.mark.parametrize('rss', [2000, 1500])
+    def test_over_budget_without_growth(self, rss):
+        # no growth to scale by (or memory was freed): halve the block size
+        self.tuner._last_rss = 2000
+        self._block(rss=rss, seconds=1.0)
+        assert self.tuner.blocksize == 5
+        for _ in range(3):
+            self._block(rss=rss, seconds=1.0)
+        assert self.tuner.blocksize == 1
+
+    def test_grow_while_faster(self):
+        self._block(rss=100, seconds=1.0)  # 10 per second
+        assert self.tuner.blocksize == 20
+        self._block(rss=100, seconds=1.0)  # 20 per second
+        assert self.tuner.blocksize == 40
+        self._block(rss=100, seconds=4.0)  # 10 per second: not faster
+        assert self.tuner.blocksize == 40
+
+    def test_grow_to_max(self):
+        for _ in range(5):
+            self._block(rss=100, seconds=0.1)
+        assert self.tuner.blocksize == 100
+
+    def test_keep_near_budget(self):
+        self._block(rss=700, seconds=1.0)
+        assert self.tuner.blocksize == 10
+
+    def test_grow_by_growth_per_object(self):
+        self._block(rss=100, seconds=1.0)  # 10 per object; 20 more fit
+        assert self.tuner.blocksize == 20
+        self._block(rss=700, seconds=0.5)  # 30 per object; 40 don't fit
+        assert self.tuner.blocksize == 20
+
+    def test_unknown_rss(self):
+        self.tuner._rss = lambda: None
+        self._block(rss=None, seconds=1.0)
+        assert self.tuner.blocksize == 10
@@ -0,0 +1,93 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+import openpathsampling as paths
+from openpathsampling.engines import toy as toys
+
+from paths_cli.name_index import *
+
+
+class NamedObj(object):
+    def __init__(self, name=None):
+        self.name = name
+        self.is_named = name is not None
+
+
+class FakeSimStoreTable(object):
+    # like SimStore's PseudoTable: only named objects are in the index
+    def __init__(self, objects):
+        self._uuid_to_obj = {id(obj): obj for obj in objects}
+        self._name_to_uuid = {obj.name: id(obj) for obj in objects
+                              if obj.is_named}
+
+    def get_by_uuid(self, uuid):
+        return self._uuid_to_obj[uuid]
+
+    def __iter__(self):  # -no-cov-
+        raise AssertionError("Should not iterate over the store")
+
+
+class TestNameIndexNetCDF(object):
+    def setup(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, "names.nc")
+        storage = paths.Storage(self.filename, mode='w')
+        pes = toys.LinearSlope([0, 0, 0], 0)
+        topology = toys.Topology(n_spatial=3, masses=[1.0, 1.0, 1.0],
+                                 pes=pes)
+        make_engine = lambda: toys.Engine(
+            options={'integ': toys.LangevinBAOABIntegrator(0.1, 0.1, 2.5)},
+            topology=topology
+        )
+        self.engines = [make_engine().named('foo'), make_engine(),
+                        make_engine().named('bar'),
+                        make_engine().named('foo')]
+        storage.save(self.engines)
+        storage.close()
+        self.storage = paths.Storage(self.filename, mode='r')
+
+    def teardown(self):
+        self.storage.close()
+        os.remove(self.filename)
+        os.rmdir(self.tempdir)
+
+    def test_names(self):
+        index = NameIndex(self.storage.engines)
+        assert list(index) == ['bar', 'foo']
+        assert len(index) == 2
+        assert index.n_named == 3
+        assert 'foo' in index
+        assert 'baz' not in index
+
+    def test_getitem(self):
+        index = NameIndex(self.storage.engines)
+        # repeated names give the last saved, like loading by name
+        assert index['foo'].__uuid__ == self.engines[3].__uuid__
+        assert index['bar'].__uuid__ == self.engines[2].__uuid__
+        with pytest.raises(KeyError):
+            index['baz']
+
+    def test_does_not_iterate(self):
+        store = self.storage.engines
+        with patch.object(type(store), '__iter__',
+                          side_effect=AssertionError):
+            index = NameIndex(store)
+            assert index['bar'].name == 'bar'
+
+
+def test_name_index_simstore_table():
+    objects = [NamedObj('foo'), NamedObj(), NamedObj('bar')]
+    index = NameIndex(FakeSimStoreTable(objects))
+    assert list(index) == ['foo', 'bar']
+    assert index.n_named == 2
+    assert index['bar'] is objects[2]
+
+
+def test_name_index_scan():
+    objects = [NamedObj('foo'), NamedObj(), NamedObj('bar')]
+    index = NameIndex(objects)
+    assert dict(index) == {'foo': objects[0], 'bar': objects[2]}
+    assert index.n_named == 2
@@ -1,11 +1,16 @@
 import pytest
 import tempfile
 import os
+from unittest.mock import MagicMock
+
+import click
+from click.testing import CliRunner
 
 import paths_cli
 from openpathsampling.tests.test_helpers import make_1d_traj
 
 from paths_cli.parameters import *
+from paths_cli.param_core import StoragePool, StorageLoader
 import openpathsampling as paths
 
 
@@ -486,3 +491,235 @@ def test_APPEND_FILE(ext):
     os.remove(filename)
     os.rmdir(tempdir)
     undo_monkey_patch(stored_functions)
+
+
+def test_storage_loader_sharing():
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "shared.nc")
+        traj = make_1d_traj([0.0, 1.0])
+        with StorageLoader.sharing():
+            output = OUTPUT_FILE.get(filename)
+            assert APPEND_FILE.get(filename) is output
+            assert INPUT_FILE.get(filename) is output
+            for _ in range(3):
+                OUTPUT_FILE.release(output)
+            assert output.isopen()
+            output.tags['foo'] = traj[0]
+            with StorageLoader.sharing():
+                assert INPUT_FILE.get(filename) is output
+                INPUT_FILE.release(output)
+            assert output.isopen()
+            # mode 'w' always gives a new file
+            new_output = OUTPUT_FILE.get(filename)
+            assert new_output is not output
+            assert not output.isopen()
+            assert len(new_output.tags) == 0
+            new_output.tags['bar'] = traj[1]
+            OUTPUT_FILE.release(new_output)
+
+        assert not new_output.isopen()
+        with StorageLoader.sharing():
+            input_storage = INPUT_FILE.get(filename)
+            assert len(input_storage.tags) == 1
+            INPUT_FILE.release(input_storage)
+            # idle file open for reading is reopened to append
+            append_storage = APPEND_FILE.get(filename)
+            assert append_storage is not input_storage
+            assert not input_storage.isopen()
+            APPEND_FILE.release(append_storage)
+
+        assert not append_storage.isopen()
+        assert len(StorageLoader.pool) == 0
+
+
+def test_storage_loader_release():
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "not_shared.nc")
+        storage = OUTPUT_FILE.get(filename)
+        assert len(StorageLoader.pool) == 0
+        OUTPUT_FILE.release(storage)
+        assert not storage.isopen()
+
+
+def test_storage_loader_click_context():
+    # storages are released when the command finishes
+    opened = []
+
+    @click.command()
+    @click.argument('filename')
+    def command(filename):
+        storage = OUTPUT_FILE.get(filename)
+        assert INPUT_FILE.get(filename) is storage
+        assert len(StorageLoader.pool) == 1
+        opened.append(storage)
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        result = runner.invoke(command, ['foo.nc'])
+        assert result.exit_code == 0
+        (storage,) = opened
+        assert not storage.isopen()
+        assert len(StorageLoader.pool) == 0
+
+
+class TestStoragePool(object):
+    def setup(self):
+        self.pool = StoragePool()
+        self.opened = []
+
+    def _open(self, name):
+        storage = MagicMock()
+        self.opened.append(storage)
+        return storage
+
+    def test_refcount(self):
+        storage = self.pool.acquire("foo.nc", 'a', self._open)
+        assert self.pool.acquire("./foo.nc", 'r', self._open) is storage
+        self.pool.release(storage)
+        storage.close.assert_not_called()
+        self.pool.release(storage)
+        storage.close.assert_called_once()
+        assert len(self.pool) == 0
+
+    def test_incompatible_in_use(self):
+        reader = self.pool.acquire("foo.nc", 'r', self._open)
+        appender = self.pool.acquire("foo.nc", 'a', self._open)
+        assert reader is not appender
+        reader.close.assert_not_called()
+        assert len(self.pool) == 2
+
+    def test_release_unpooled(self):
+        storage = MagicMock()
+        self.pool.release(storage)
+        storage.close.assert_called_once()
+
+    def test_close_all(self):
+        storage = self.pool.acquire("foo.nc", 'r', self._open)
+        self.pool.close_all()
+        storage.close.assert_called_once()
+        assert len(self.pool) == 0
+
+    def test_after_close(self):
+        callback = MagicMock()
+        storage = self.pool.acquire("foo.nc", 'w', self._open)
+        self.pool.after_close(storage, callback)
+        with self.pool.sharing():
+            self.pool.release(storage)
+            callback.assert_not_called()
+        storage.close.assert_called_once()
+        callback.assert_called_once_with()
+
+    def test_after_close_unpooled(self):
+        with pytest.raises(ValueError, match="not from this pool"):
+            self.pool.after_close(MagicMock(), MagicMock())
+
+
+@pytest.mark.parametrize('mode', ['r', 'w'])
+def test_storage_loader_sqlite_kwargs(mode, monkeypatch):
+    monkeypatch.setattr(StorageLoader, 'sqlite_pragmas', {})
+    loader = StorageLoader(param=None, mode=mode)
+    assert loader._sqlite_kwargs("foo.db") == {}
+
+    StorageLoader.configure_sqlite('safe', {'cache_size': -100})
+    connector = loader._sqlite_kwargs("foo.db")['creator']
+    assert connector.filename == os.path.abspath("foo.db")
+    # reading shouldn't change how the file is journaled
+    expected = {'r': {'cache_size': -100},
+                'w': {'journal_mode': 'DELETE', 'synchronous': 'FULL',
+                      'cache_size': -100}}[mode]
+    assert connector.pragmas == expected
+
+
+@pytest.mark.parametrize('read_mode', ['immutable', 'memory'])
+def test_storage_loader_sqlite_read_mode(read_mode, monkeypatch):
+    monkeypatch.setattr(StorageLoader, 'sqlite_pragmas', {})
+    monkeypatch.setattr(StorageLoader, 'sqlite_read_mode', 'default')
+    StorageLoader.configure_sqlite(read_mode=read_mode)
+    # only used for reading
+    assert StorageLoader(param=None, mode='a')._sqlite_kwargs("foo.db") \
+        == {}
+    kwargs = StorageLoader(param=None, mode='r')._sqlite_kwargs("foo.db")
+    assert kwargs['creator'].read_mode == read_mode
+    assert ('poolclass' in kwargs) == (read_mode == 'memory')
+    with pytest.raises(ValueError, match="Unknown read mode"):
+        StorageLoader.configure_sqlite(read_mode='foo')
+
+
+@pytest.mark.parametrize('read_mode', ['immutable', 'memory'])
+def test_storage_loader_read_simstore(read_mode, monkeypatch):
+    monkeypatch.setattr(StorageLoader, 'sqlite_pragmas', {})
+    monkeypatch.setattr(StorageLoader, 'sqlite_read_mode', 'default')
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, f"{read_mode}.db")
+        storage = OUTPUT_FILE.get(filename)
+        traj = make_1d_traj([0.0, 1.0])
+        storage.save(traj)
+        storage.tags['traj'] = traj
+        storage.close()
+
+        StorageLoader.configure_sqlite(read_mode=read_mode)
+        storage = INPUT_FILE.get(filename)
+        assert storage.tags['traj'] == traj
+        storage.close()
+
+
+def test_storage_loader_append_same_name(monkeypatch):
+    # each directory's file gets its own storage, even though OPS would
+    # reuse the (closed) storage for the same relative filename
+    monkeypatch.setattr(StorageLoader, 'sqlite_staging', None)
+    monkeypatch.setattr(StorageLoader, 'write_behind', None)
+    runner = CliRunner()
+    opened = []
+    for value in [0.0, 1.0]:
+        with runner.isolated_filesystem():
+            traj = make_1d_traj([value])
+            storage = OUTPUT_FILE.get("append.db")
+            storage.tags['traj'] = traj
+            storage.close()
+            storage = APPEND_FILE.get("append.db")
+            assert storage not in opened
+            assert storage.tags['traj'] == traj
+            storage.close()
+            opened.append(storage)
+
+
+@pytest.mark.parametrize('mode, ext, staged, expected', [
+    ('w', 'db', False, True),
+    ('r', 'db', False, False),
+    ('w', 'nc', False, False),
+    ('w', 'db', True, False),
+])
+def test_storage_loader_uses_write_behind(mode, ext, staged, expected,
+                                          monkeypatch):
+    monkeypatch.setattr(StorageLoader, 'write_behind', None)
+    monkeypatch.setattr(StorageLoader, 'sqlite_staging', None)
+    loader = StorageLoader(param=None, mode=mode)
+    assert not loader._uses_write_behind("foo.db")
+    StorageLoader.configure_write_behind(max_queue=5)
+    assert StorageLoader.write_behind == {'max_queue': 5}
+    if staged:
+        StorageLoader.configure_staging(every_steps=10)
+    assert loader._uses_write_behind("foo." + ext) == expected
+    StorageLoader.configure_write_behind(enabled=False)
+    assert StorageLoader.write_behind is None
+
+
+def test_storage_loader_write_behind(monkeypatch):
+    from paths_cli.write_behind import WriteBehindStorage
+    monkeypatch.setattr(StorageLoader, 'write_behind', None)
+    StorageLoader.configure_write_behind()
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "write_behind.db")
+        storage = OUTPUT_FILE.get(filename)
+        assert isinstance(storage, WriteBehindStorage)
+        trajs = [make_1d_traj([float(i), 1.0]) for i in range(5)]
+        for traj in trajs:
+            storage.save(traj)
+        storage.sync_all()
+        storage.tags['last'] = trajs[-1]
+        storage.close()
+
+        storage = INPUT_FILE.get(filename)
+        assert len(storage.trajectories) == 5
+        assert storage.tags['last'] == trajs[-1]
+        storage.close()
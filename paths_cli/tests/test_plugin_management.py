@@ -1,11 +1,16 @@
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, Mock, patch
 
+import os
 import pathlib
 import importlib
+import shutil
+import sys
+import tempfile
 
 import paths_cli
 from paths_cli.plugin_management import *
+from paths_cli.plugin_management import _entry_points, _module_origin
 
 # need to check that CLI is assigned to correct type
 import click
@@ -24,6 +29,9 @@ class PluginLoaderTest(object):
     def _make_candidate(self, command):
         raise NotImplementedError()
 
+    def _make_location(self, command):
+        raise NotImplementedError()
+
     @pytest.mark.parametrize('command', ['pathsampling', 'contents'])
     def test_find_candidates(self, command):
         candidates  = self.loader._find_candidates()
@@ -49,6 +57,18 @@ class PluginLoaderTest(object):
         assert plugin.section == self.expected_section[command]
         assert plugin.plugin_type == self.plugin_type
 
+    @pytest.mark.parametrize('command', ['pathsampling', 'contents'])
+    def test_load_location(self, command):
+        location = self._make_location(command)
+        assert location in self.loader._find_candidate_locations()
+        fingerprint = self.loader._fingerprint(location)
+        assert fingerprint == self.loader._fingerprint(location)
+        assert len(fingerprint) == 2
+        (plugin,) = self.loader.load_location(location)
+        assert plugin.name == command
+        assert plugin.section == self.expected_section[command]
+        assert plugin.plugin_type == self.plugin_type
+
 
 class TestFilePluginLoader(PluginLoaderTest):
     def setup(self):
@@ -62,6 +82,9 @@ class TestFilePluginLoader(PluginLoaderTest):
     def _make_candidate(self, command):
         return self.commands_dir / (command + ".py")
 
+    def _make_location(self, command):
+        return str(self._make_candidate(command))
+
 
 class TestNamespacePluginLoader(PluginLoaderTest):
     def setup(self):
@@ -73,3 +96,137 @@ class TestNamespacePluginLoader(PluginLoaderTest):
     def _make_candidate(self, command):
         name = self.namespace + "." + command
         return importlib.import_module(name)
+
+    def _make_location(self, command):
+        return self.namespace + "." + command
+
+
+class TestEntryPointPluginLoader(PluginLoaderTest):
+    # pathsampling is given as an object, contents as a module
+    ENTRY_POINTS = {
+        'pathsampling': "ep_test_plugins.pathsampling:PLUGIN",
+        'contents': "ep_test_plugins.contents",
+    }
+
+    def setup(self):
+        super().setup()
+        # plugins can only be registered once, so we install copies of our
+        # commands in a package of their own
+        self.tmpdir = tempfile.mkdtemp()
+        package = pathlib.Path(self.tmpdir) / "ep_test_plugins"
+        package.mkdir()
+        (package / "__init__.py").touch()
+        commands_dir = pathlib.Path(paths_cli.commands.__file__).parent
+        for command in self.ENTRY_POINTS:
+            shutil.copy(commands_dir / (command + ".py"), package)
+        sys.path.insert(0, self.tmpdir)
+
+        entry_points = [Mock(value=value)
+                        for value in self.ENTRY_POINTS.values()]
+        # duplicates are only loaded once
+        entry_points.append(Mock(value=self.ENTRY_POINTS['contents']))
+        self.patch = patch('paths_cli.plugin_management._entry_points',
+                           return_value=entry_points)
+        self.patch.start()
+        self.loader = EntryPointPluginLoader("paths_cli.commands",
+                                             OPSCommandPlugin)
+        self.plugin_type = 'entry_point'
+
+    def teardown(self):
+        self.patch.stop()
+        sys.path.remove(self.tmpdir)
+        for module in list(sys.modules):
+            if module.startswith("ep_test_plugins"):
+                del sys.modules[module]
+        shutil.rmtree(self.tmpdir)
+
+    def _make_candidate(self, command):
+        return self.ENTRY_POINTS[command]
+
+    def _make_location(self, command):
+        return self.ENTRY_POINTS[command]
+
+    def test_find_candidate_locations(self):
+        locations = self.loader._find_candidate_locations()
+        assert locations == list(self.ENTRY_POINTS.values())
+
+    def test_nested_attribute(self):
+        nsdict = self.loader._make_nsdict(
+            "paths_cli.plugin_management:OPSCommandPlugin.__name__ [extra]"
+        )
+        assert nsdict == {'__name__': "OPSCommandPlugin"}
+
+
+def test_entry_points_unknown_group():
+    assert list(_entry_points("paths_cli.no_such_group")) == []
+
+
+def test_module_origin(tmp_path, monkeypatch):
+    package = tmp_path / "origin_test_pkg"
+    package.mkdir()
+    # importing the package would fail
+    with open(package / "__init__.py", mode='w') as f:
+        f.write("raise RuntimeError('imported')\n")
+    with open(package / "plugin.py", mode='w') as f:
+        f.write("\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    origin = _module_origin("origin_test_pkg.plugin")
+    assert origin == str(package / "plugin.py")
+    fingerprint = EntryPointPluginLoader._fingerprint(
+        "origin_test_pkg.plugin:PLUGIN"
+    )
+    assert fingerprint[1] == 1
+    assert _module_origin("origin_test_pkg.missing") is None
+    assert _module_origin("origin_test_pkg.plugin.sub") is None
+    assert EntryPointPluginLoader._fingerprint("missing_pkg:PLUGIN") \
+        == [None, None]
+
+
+class TestFilePluginLoaderBytecodeCache(object):
+    def _setup(self, tmp_path):
+        self.plugin_dir = tmp_path / "plugins"
+        self.plugin_dir.mkdir()
+        self.cache_dir = tmp_path / "cache"
+        self.plugin = str(self.plugin_dir / "foo.py")
+        self._write("VALUE = 1\n")
+        self.loader = FilePluginLoader(str(self.plugin_dir),
+                                       OPSCommandPlugin,
+                                       bytecode_cache=str(self.cache_dir))
+
+    def _write(self, source):
+        with open(self.plugin, mode='w') as f:
+            f.write(source)
+
+    def test_cache_reused(self, tmp_path):
+        self._setup(tmp_path)
+        assert self.loader._make_nsdict(self.plugin)['VALUE'] == 1
+        (cache_file,) = os.listdir(self.cache_dir)
+        assert cache_file.startswith("foo.")
+        with patch.object(FilePluginLoader, '_compile') as mock_compile:
+            nsdict = self.loader._make_nsdict(self.plugin)
+        mock_compile.assert_not_called()
+        assert nsdict['VALUE'] == 1
+
+    def test_stale_cache(self, tmp_path):
+        self._setup(tmp_path)
+        _ = self.loader._make_nsdict(self.plugin)
+        self._write("VALUE = 22\n")  # different size
+        assert self.loader._make_nsdict(self.plugin)['VALUE'] == 22
+        assert len(os.listdir(self.cache_dir)) == 1
+
+    def test_corrupt_cache(self, tmp_path):
+        self._setup(tmp_path)
+        _ = self.loader._make_nsdict(self.plugin)
+        cache_file = self.loader._cache_filename(self.plugin)
+        with open(cache_file, mode='rb') as f:
+            data = f.read()
+        with open(cache_file, mode='wb') as f:
+            f.write(data[:-3])
+        assert self.loader._make_nsdict(self.plugin)['VALUE'] == 1
+
+    def test_no_cache(self, tmp_path):
+        self._setup(tmp_path)
+        loader = FilePluginLoader(str(self.plugin_dir), OPSCommandPlugin)
+        assert loader._make_nsdict(self.plugin)['VALUE'] == 1
+        assert not self.cache_dir.exists()
@@ -0,0 +1,229 @@
+import io
+import os
+import socket
+import stat
+import tempfile
+import threading
+
+import pytest
+from unittest.mock import patch
+
+import openpathsampling as paths
+
+from paths_cli.server import *
+
+
+@pytest.mark.parametrize('payload', [b'', b'foo', b'x' * 100000])
+def test_send_recv_message(payload):
+    sender, receiver = socket.socketpair()
+    with sender, receiver:
+        thread = threading.Thread(target=send_message,
+                                  args=(sender, STDOUT, payload))
+        thread.start()
+        assert recv_message(receiver) == (STDOUT, payload)
+        thread.join()
+
+
+def test_recv_message_closed():
+    sender, receiver = socket.socketpair()
+    with receiver:
+        sender.close()
+        assert recv_message(receiver) is None
+
+
+def test_default_socket_path(monkeypatch):
+    monkeypatch.setenv('OPENPATHSAMPLING_CLI_SOCKET', "/tmp/foo.sock")
+    assert default_socket_path() == "/tmp/foo.sock"
+    monkeypatch.delenv('OPENPATHSAMPLING_CLI_SOCKET')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv('XDG_RUNTIME_DIR', tmpdir)
+        socket_path = default_socket_path()
+        assert os.path.dirname(socket_path) == tmpdir
+        assert socket_path.endswith(".sock")
+
+
+def test_default_socket_path_private_dir(monkeypatch):
+    monkeypatch.delenv('OPENPATHSAMPLING_CLI_SOCKET', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setattr(tempfile, 'tempdir', tmpdir)
+        socket_path = default_socket_path()
+        directory = os.path.dirname(socket_path)
+        assert os.path.dirname(directory) == tmpdir
+        assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+        # already existing is fine; usable by others is not
+        assert default_socket_path() == socket_path
+        os.chmod(directory, 0o755)
+        with pytest.raises(PermissionError, match="0700"):
+            default_socket_path()
+
+
+def test_default_socket_path_other_owner(monkeypatch):
+    monkeypatch.delenv('OPENPATHSAMPLING_CLI_SOCKET', raising=False)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv('XDG_RUNTIME_DIR', tmpdir)
+        monkeypatch.setattr(os, 'getuid', lambda: os.stat(tmpdir).st_uid + 1)
+        with pytest.raises(PermissionError, match="not a directory owned"):
+            default_socket_path()
+
+
+def test_forwarded_env():
+    environ = {'OPENPATHSAMPLING_CHECKPOINT_STEPS': "10", 'LC_ALL': "C",
+               'COLUMNS': "80", 'AWS_SECRET_ACCESS_KEY': "foo",
+               'PATH': "/usr/bin"}
+    assert forwarded_env(environ) == {
+        'OPENPATHSAMPLING_CHECKPOINT_STEPS': "10", 'LC_ALL': "C",
+        'COLUMNS': "80"
+    }
+
+
+@pytest.mark.parametrize('code, expected', [(None, 0), (3, 3), ("msg", 1)])
+def test_run_invocation_exit_codes(code, expected):
+    def fake_main(*args, **kwargs):
+        raise SystemExit(code)
+
+    with patch('paths_cli.cli.main.main', fake_main):
+        assert run_invocation([]) == expected
+
+
+def test_run_invocation_error(capsys):
+    def fake_main(*args, **kwargs):
+        raise RuntimeError("oops")
+
+    with patch('paths_cli.cli.main.main', fake_main):
+        assert run_invocation([]) == 1
+    assert "RuntimeError: oops" in capsys.readouterr().err
+
+
+class TestCLIServer(object):
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmpdir, "cli.sock")
+        self.server = CLIServer(self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def teardown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        for filename in os.listdir(self.tmpdir):
+            os.remove(os.path.join(self.tmpdir, filename))
+        os.rmdir(self.tmpdir)
+
+    def _run(self, argv):
+        stdout = io.BytesIO()
+        stderr = io.BytesIO()
+        code = run_client(argv, self.socket_path, stdout, stderr)
+        return code, stdout.getvalue().decode(), stderr.getvalue().decode()
+
+    def test_contents(self, tps_fixture):
+        storage = paths.Storage(os.path.join(self.tmpdir, "setup.nc"), 'w')
+        for obj in tps_fixture:
+            storage.save(obj)
+        storage.close()
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.tmpdir)
+            code, out, err = self._run(['contents', 'setup.nc'])
+        finally:
+            os.chdir(cwd)
+        assert code == 0
+        assert "Volumes: 8 items" in out
+        assert os.getcwd() == cwd
+
+    def test_usage_error(self):
+        code, out, err = self._run(['contents', 'nonexistent.nc'])
+        assert code == 2
+        assert out == ""
+        assert "does not exist" in err
+
+    def test_already_running(self):
+        with pytest.raises(RuntimeError, match="already running"):
+            CLIServer(self.socket_path)
+
+    def test_env(self, monkeypatch):
+        monkeypatch.setenv('OPENPATHSAMPLING_STORAGE_PROFILE', "bogus")
+        code, out, err = self._run(['contents', 'nonexistent.nc'])
+        assert code == 2
+        assert "bogus" in err
+        # settings come from the client, even if the server has them set
+        with patch('paths_cli.server.forwarded_env', lambda: {}):
+            code, out, err = self._run(['contents', 'nonexistent.nc'])
+        assert "bogus" not in err
+        assert "does not exist" in err
+
+    def test_other_owner(self, monkeypatch):
+        owner = os.stat(self.socket_path).st_uid
+        monkeypatch.setattr(os, 'getuid', lambda: owner + 1)
+        with pytest.raises(ServerUnavailable, match="another user"):
+            self._run(['--help'])
+
+    def test_socket_mode(self):
+        assert stat.S_IMODE(os.stat(self.socket_path).st_mode) == 0o600
+
+    def test_verify_request(self):
+        client, server_side = socket.socketpair(socket.AF_UNIX)
+        with client, server_side:
+            assert self.server.verify_request(server_side, None)
+            with patch('os.getuid', return_value=os.getuid() + 1):
+                assert not self.server.verify_request(server_side, None)
+
+
+def test_run_client_no_server():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with pytest.raises(ServerUnavailable):
+            run_client([], os.path.join(tmpdir, "cli.sock"))
+
+
+def test_run_client_lost_connection():
+    # once the request is sent, a lost connection is an error; the
+    # command must not be run again
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "cli.sock")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+        listener.listen(1)
+
+        def serve_and_drop():
+            conn, _ = listener.accept()
+            with conn:
+                recv_message(conn)
+                send_message(conn, STDOUT, b"partial")
+
+        thread = threading.Thread(target=serve_and_drop)
+        thread.start()
+        stdout = io.BytesIO()
+        stderr = io.BytesIO()
+        with listener:
+            code = run_client(['contents'], socket_path, stdout, stderr)
+        thread.join()
+        assert code == 1
+        assert stdout.getvalue() == b"partial"
+        assert b"Lost connection" in stderr.getvalue()
+
+
+def test_server_close():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "cli.sock")
+        server = CLIServer(socket_path)
+        assert os.path.exists(socket_path)
+        server.server_close()
+        assert not os.path.exists(socket_path)
+
+
+def test_stale_socket():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "cli.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()  # leaves the file, with nothing listening
+        server = CLIServer(socket_path)
+        server.server_close()
+        assert not os.path.exists(socket_path)
+
+
+def test_warm_up():
+    with patch('importlib.import_module') as mock_import:
+        warm_up(preload=['foo'])
+    mock_import.assert_called_once_with('foo')
@@ -0,0 +1,98 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+
+import pytest
+
+from paths_cli.sqlite_settings import *
+
+
+@pytest.mark.parametrize('name, value, expected', [
+    ('journal_mode', 'wal', ('journal_mode', 'WAL')),
+    (' Synchronous', 'normal ', ('synchronous', 'NORMAL')),
+    ('cache_size', '-2000', ('cache_size', -2000)),
+    ('mmap_size', 1024, ('mmap_size', 1024)),
+])
+def test_validate_pragma(name, value, expected):
+    assert validate_pragma(name, value) == expected
+
+
+@pytest.mark.parametrize('name, value, match', [
+    ('foo', 'bar', "Unknown SQLite pragma"),
+    ('cache_size', 'big', "must be an integer"),
+    ('journal_mode', 'WAL; DROP TABLE schema', "must be one of"),
+])
+def test_validate_pragma_error(name, value, match):
+    with pytest.raises(ValueError, match=match):
+        validate_pragma(name, value)
+
+
+def test_parse_pragma():
+    assert parse_pragma("temp_store=memory") == ('temp_store', 'MEMORY')
+    with pytest.raises(ValueError, match="name=value"):
+        parse_pragma("temp_store")
+
+
+def test_resolve_pragmas():
+    assert resolve_pragmas() == {}
+    pragmas = resolve_pragmas('production', {'journal_mode': 'truncate'})
+    assert pragmas['journal_mode'] == 'TRUNCATE'
+    assert pragmas['synchronous'] == 'NORMAL'
+    with pytest.raises(ValueError, match="Unknown storage profile"):
+        resolve_pragmas('foo')
+
+
+def test_sqlite_connector():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "test.db")
+        connector = SQLiteConnector(filename, {'journal_mode': 'wal',
+                                               'cache_size': -100})
+        # must be picklable, since it is saved with the storage backend
+        connector = pickle.loads(pickle.dumps(connector))
+        connection = connector()
+        journal_mode = connection.execute("PRAGMA journal_mode").fetchone()
+        cache_size = connection.execute("PRAGMA cache_size").fetchone()
+        connection.close()
+        assert journal_mode == ('wal',)
+        assert cache_size == (-100,)
+
+
+def test_file_uri():
+    assert file_uri("/tmp/a b.db") == "file:/tmp/a%20b.db"
+    assert file_uri("/tmp/a.db", immutable=True) \
+        == "file:/tmp/a.db?mode=ro&immutable=1"
+    assert file_uri("/tmp/a?.db", read_only=True) \
+        == "file:/tmp/a%3F.db?mode=ro"
+
+
+@pytest.mark.parametrize('read_mode', ['immutable', 'memory'])
+def test_sqlite_connector_read_mode(read_mode):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "test.db")
+        connection = sqlite3.connect(filename)
+        connection.execute("CREATE TABLE foo (x INTEGER)")
+        connection.execute("INSERT INTO foo VALUES (1)")
+        connection.commit()
+        connection.close()
+
+        connector = SQLiteConnector(filename, {'cache_size': -100},
+                                    read_mode=read_mode)
+        connection = connector()
+        assert connection.execute("SELECT x FROM foo").fetchall() == [(1,)]
+        assert connection.execute("PRAGMA cache_size").fetchone() == (-100,)
+        if read_mode == 'memory':
+            # changes the copy, but not the file
+            os.remove(filename)
+            connection.execute("INSERT INTO foo VALUES (2)")
+            assert len(connection.execute("SELECT x FROM foo").fetchall()) \
+                == 2
+        else:
+            with pytest.raises(sqlite3.OperationalError, match="readonly"):
+                connection.execute("INSERT INTO foo VALUES (2)")
+        connection.close()
+
+
+def test_sqlite_connector_bad_read_mode():
+    with pytest.raises(ValueError, match="Unknown read mode"):
+        SQLiteConnector("foo.db", {}, read_mode='foo')
@@ -0,0 +1,147 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+from unittest.mock import Mock
+
+import pytest
+
+from paths_cli.staging import *
+from paths_cli import staging
+
+
+def _rows(filename):
+    connection = sqlite3.connect(filename)
+    try:
+        return connection.execute("SELECT x FROM data").fetchall()
+    finally:
+        connection.close()
+
+
+class TestStagedOutput(object):
+    def setup(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, "staged.db")
+        self._patch = pytest.MonkeyPatch()
+        # don't let tests change how pytest handles SIGTERM
+        self._patch.setattr(staging, '_install_sigterm_handler',
+                            lambda: None)
+        self.staged = StagedOutput(self.filename, every_steps=2)
+        self.connection = self.staged()
+        self.connection.execute("CREATE TABLE data (x INTEGER)")
+        self.connection.commit()
+
+    def teardown(self):
+        if self.staged._connection is not None:
+            self.connection.close()
+        self._patch.undo()
+        self.tempdir.cleanup()
+
+    def _insert(self, value):
+        self.connection.execute("INSERT INTO data VALUES (?)", (value,))
+        self.connection.commit()
+
+    def test_no_file_until_checkpoint(self):
+        assert self.staged.is_dirty
+        assert not os.path.exists(self.filename)
+        self.staged.checkpoint()
+        assert os.path.exists(self.filename)
+        assert not self.staged.is_dirty
+        assert _rows(self.filename) == []
+
+    def test_checkpoint_only_if_dirty(self):
+        self.staged.checkpoint()
+        self.staged.checkpoint()
+        assert self.staged.n_checkpoints == 1
+
+    def test_checkpoint_every_steps(self):
+        self._insert(1)
+        self.staged.after_step(None, 1, None, None, None, None)
+        assert self.staged.n_checkpoints == 0
+        self._insert(2)
+        self.staged.after_step(None, 2, None, None, None, None)
+        assert self.staged.n_checkpoints == 1
+        assert _rows(self.filename) == [(1,), (2,)]
+
+    def test_checkpoint_every_seconds(self):
+        self.staged.every_seconds = 0.0
+        self._insert(1)
+        assert self.staged.n_checkpoints == 1
+        assert _rows(self.filename) == [(1,)]
+
+    def test_checkpoint_after_simulation(self):
+        self._insert(1)
+        self.staged.after_simulation(None, None)
+        assert _rows(self.filename) == [(1,)]
+
+    def test_checkpoint_on_close(self):
+        self._insert(1)
+        self.connection.close()
+        assert self.staged._connection is None
+        assert _rows(self.filename) == [(1,)]
+        # nothing to do at exit after the connection is closed
+        self.staged.checkpoint()
+        assert self.staged.n_checkpoints == 1
+
+    def test_load_existing_file(self):
+        self._insert(1)
+        self.connection.close()
+        staged = StagedOutput(self.filename)
+        connection = staged()
+        try:
+            assert not staged.is_dirty
+            found = connection.execute("SELECT x FROM data").fetchall()
+            assert found == [(1,)]
+        finally:
+            connection.close()
+
+    def test_attach_hooks(self):
+        sim = Mock()
+        self.staged.attach_hooks(sim)
+        hooks = {call.kwargs['hook_for']: call.args[0]
+                 for call in sim.attach_hook.call_args_list}
+        assert hooks == {'after_step': self.staged.after_step,
+                         'after_simulation': self.staged.after_simulation}
+
+    def test_pickle(self):
+        reloaded = pickle.loads(pickle.dumps(self.staged))
+        assert reloaded._connection is None
+        assert reloaded.filename == self.filename
+        assert reloaded.every_steps == 2
+
+
+@pytest.mark.parametrize('staged', [True, False])
+def test_attach_checkpoint_hooks(staged):
+    creator = StagedOutput("foo.db") if staged else Mock()
+    storage = Mock(backend=Mock(kwargs={'creator': creator}))
+    sim = Mock()
+    attach_checkpoint_hooks(sim, storage)
+    assert sim.attach_hook.called == staged
+    assert staged_output(storage) is (creator if staged else None)
+
+
+def test_staged_output_netcdf():
+    assert staged_output(None) is None
+    assert staged_output(Mock(spec=['filename'])) is None
+
+
+def test_staged_output_file(monkeypatch):
+    from paths_cli.param_core import StorageLoader
+    from paths_cli.parameters import OUTPUT_FILE
+    monkeypatch.setattr(staging, '_install_sigterm_handler', lambda: None)
+    monkeypatch.setattr(StorageLoader, 'sqlite_staging', None)
+    StorageLoader.configure_staging(every_steps=10)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "staged.db")
+        storage = OUTPUT_FILE.get(filename)
+        staged = staged_output(storage)
+        assert staged.filename == filename
+        assert staged.every_steps == 10
+        assert staged.is_dirty
+        storage.close()
+        assert not staged.is_dirty
+        connection = sqlite3.connect(filename)
+        tables = connection.execute("SELECT name FROM sqlite_master "
+                                    "WHERE type='table'").fetchall()
+        connection.close()
+        assert ('schema',) in tables
@@ -0,0 +1,88 @@
+import json
+import subprocess
+from unittest.mock import patch, Mock
+
+import click
+import pytest
+
+from paths_cli.plugin_management import FilePluginLoader, OPSCommandPlugin
+from paths_cli.startup_profile import *
+
+_PLUGIN = """
+import click
+from paths_cli import OPSCommandPlugin
+
+@click.command('foo')
+def command():
+    pass
+
+PLUGIN = OPSCommandPlugin(command=command, section="Workflow")
+"""
+
+
+def test_profile_loader(tmp_path):
+    with open(tmp_path / "foo.py", mode='w') as f:
+        f.write(_PLUGIN)
+    with open(tmp_path / "broken.py", mode='w') as f:
+        f.write("raise RuntimeError('oops')\n")
+
+    loader = FilePluginLoader(str(tmp_path), OPSCommandPlugin)
+    records = profile_loader(loader)
+    assert [rec['phase'] for rec in records] == ['find', 'load', 'load']
+    assert records[0]['detail'] == "2 candidates"
+    details = {rec['name']: rec['detail'] for rec in records[1:]}
+    assert details[str(tmp_path / "foo.py")] == "foo"
+    assert "oops" in details[str(tmp_path / "broken.py")]
+    assert all(rec['seconds'] >= 0 for rec in records)
+
+
+@pytest.mark.parametrize('module, error', [('json', False),
+                                           ('foo_missing_module', True)])
+def test_profile_import(module, error):
+    record = profile_import(module)
+    assert record['phase'] == 'import'
+    assert record['name'] == module
+    assert record['detail'].startswith("error") == error
+
+
+def test_profile_startup():
+    records = profile_startup(preload=['json'])
+    phases = [rec['phase'] for rec in records]
+    assert phases[0] == phases[-1] == 'import'
+    assert records[0]['name'] == 'paths_cli'
+    assert records[-1]['name'] == 'json'
+    assert 'find' in phases
+    loaded = [rec['detail'] for rec in records if rec['phase'] == 'load']
+    assert 'contents' in loaded
+
+
+def test_run_profile():
+    fake_records = [{'phase': 'import', 'name': 'paths_cli',
+                     'seconds': 0.5, 'detail': ""}]
+    proc = Mock(stdout=json.dumps(fake_records).encode('utf-8'))
+    with patch('subprocess.run', return_value=proc) as run:
+        records = run_profile(preload=['foo'], python='python')
+    cmd = run.call_args[0][0]
+    assert cmd[0] == 'python'
+    assert cmd[-1] == 'foo'
+    assert records[0] == fake_records[0]
+    assert records[1]['phase'] == 'total'
+
+
+def test_run_profile_error():
+    error = subprocess.CalledProcessError(3, ['python'], stderr=b"oops\n")
+    with patch('subprocess.run', side_effect=error):
+        with pytest.raises(click.ClickException,
+                           match="exit code 3:\noops"):
+            run_profile(python='python')
+
+
+def test_format_report():
+    records = [
+        {'phase': 'import', 'name': 'fast', 'seconds': 0.1, 'detail': ""},
+        {'phase': 'load', 'name': 'slow', 'seconds': 2.0, 'detail': "foo"},
+    ]
+    lines = format_report(records).splitlines()
+    assert len(lines) == 3
+    assert lines[1].split() == ["2.000", "load", "slow", "(foo)"]
+    assert lines[2].split() == ["0.100", "import", "fast"]
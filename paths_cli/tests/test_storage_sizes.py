@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import tempfile
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from paths_cli.storage_sizes import *
+from paths_cli.storage_sizes import _sqlite_disk_bytes
+
+
+def _make_sqlite(filename):
+    connection = sqlite3.connect(filename)
+    with connection:
+        connection.execute("CREATE TABLE steps (idx INTEGER, uuid VARCHAR)")
+        connection.execute("CREATE TABLE snapshot0 "
+                           "(idx INTEGER, coordinates BLOB)")
+        connection.executemany("INSERT INTO steps VALUES (?, ?)",
+                               [(0, "abc"), (1, "defg")])
+        connection.executemany("INSERT INTO snapshot0 VALUES (?, ?)",
+                               [(i, bytes(8)) for i in range(4)])
+    connection.close()
+
+
+def _make_netcdf(filename):
+    import netCDF4
+    dataset = netCDF4.Dataset(filename, mode='w')
+    dataset.createDimension('steps', 2)
+    dataset.createDimension('snapshot0', 4)
+    dataset.createDimension('snapshot0n_atoms', 3)
+    uuids = dataset.createVariable('steps_uuid', str, ('steps',))
+    uuids[:] = np.array(["abc", "defg"], dtype=object)
+    coords = dataset.createVariable('snapshot0_coordinates', 'f4',
+                                    ('snapshot0', 'snapshot0n_atoms'))
+    coords[:] = np.zeros((4, 3))
+    dataset.close()
+
+
+class TestStorageSizes(object):
+    def setup(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def teardown(self):
+        for filename in os.listdir(self.tempdir):
+            os.remove(os.path.join(self.tempdir, filename))
+        os.rmdir(self.tempdir)
+
+    @pytest.mark.parametrize('name', ["test.db", "test #1?.db"])
+    def test_simstore_sizes(self, name):
+        filename = os.path.join(self.tempdir, name)
+        _make_sqlite(filename)
+        sizes = simstore_sizes(filename)
+        assert set(sizes) == {'steps', 'snapshot0'}
+        assert sizes['steps']['rows'] == 2
+        assert sizes['steps']['columns'] == {'idx': 2, 'uuid': 7}
+        assert sizes['snapshot0']['columns']['coordinates'] == 32
+        # every table uses at least one page
+        assert sizes['snapshot0']['bytes'] > 0
+
+    def test_netcdf_sizes(self):
+        filename = os.path.join(self.tempdir, "test.nc")
+        _make_netcdf(filename)
+        sizes = netcdf_sizes(filename)
+        assert sizes == {
+            'steps': {'rows': 2, 'bytes': 7, 'columns': {'uuid': 7}},
+            'snapshot0': {'rows': 4, 'bytes': 48,
+                          'columns': {'coordinates': 48}},
+        }
+
+    @pytest.mark.parametrize('ext', ['db', 'nc'])
+    def test_storage_sizes(self, ext):
+        filename = os.path.join(self.tempdir, "test." + ext)
+        is_simstore = ext == 'db'
+        make = _make_sqlite if is_simstore else _make_netcdf
+        make(filename)
+        sizes = storage_sizes(filename, is_simstore)
+        file_bytes = os.path.getsize(filename)
+        assert sizes['file_bytes'] == file_bytes
+        assert sizes['bytes_per_step'] == file_bytes / 2
+        snapshot_bytes = sizes['tables']['snapshot0']['bytes']
+        assert sizes['bytes_per_snapshot'] == snapshot_bytes / 4
+
+        report = get_sizes_string(sizes).split("\n")
+        assert report[:2] == ["Sizes:", f"File: {file_bytes:,} bytes"]
+        assert f"Bytes per step: {file_bytes / 2:,.1f}" in report
+
+
+def test_sqlite_disk_bytes_without_dbstat():
+    connection = Mock(execute=Mock(side_effect=sqlite3.OperationalError))
+    assert _sqlite_disk_bytes(connection) is None
+
+
+def test_get_sizes_string_unknown():
+    sizes = {
+        'file_bytes': 100,
+        'tables': {'steps': {'rows': 0, 'bytes': None,
+                             'columns': {'uuid': 0}}},
+        'bytes_per_snapshot': None,
+        'bytes_per_step': None,
+    }
+    assert get_sizes_string(sizes).split("\n") == [
+        "Sizes:", "File: 100 bytes", "steps (0 rows): unknown size",
+        "* uuid: 0 bytes", "Bytes per snapshot: unknown",
+        "Bytes per step: unknown"
+    ]
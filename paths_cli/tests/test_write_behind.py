@@ -0,0 +1,141 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from paths_cli.write_behind import *
+
+
+class FakeStorage(object):
+    """Records calls; blocks writes until ``unblock`` is set"""
+    def __init__(self):
+        self.calls = []
+        self.unblock = threading.Event()
+        self.unblock.set()
+        self.writing = threading.Event()
+        self.tags = {}
+        self.closed = False
+
+    def save(self, obj, idx=None):
+        self.writing.set()
+        self.unblock.wait()
+        self.calls.append(('save', obj))
+
+    def stash(self, obj):
+        self.calls.append(('stash', obj))
+
+    def sync_all(self):
+        self.calls.append(('sync_all', None))
+
+    def close(self):
+        self.closed = True
+
+
+class TestWriteBehindStorage(object):
+    def setup(self):
+        self.fake = FakeStorage()
+        self.storage = WriteBehindStorage(self.fake, max_queue=3)
+
+    def teardown(self):
+        self.fake.unblock.set()
+        try:
+            self.storage.close()
+        except RuntimeError:
+            pass
+
+    def test_save(self):
+        self.storage.save('a')
+        self.storage.flush()
+        assert self.fake.calls == [('save', ['a'])]
+
+    def test_batch(self):
+        # block the thread on the first write; the rest pile up
+        self.fake.unblock.clear()
+        self.storage.save('a')
+        assert self.fake.writing.wait(timeout=5)
+        self.storage.stash('b')
+        self.storage.save(['c', 'd'])
+        self.storage.sync_all()
+        self.fake.unblock.set()
+        self.storage.flush()
+        assert self.fake.calls == [
+            ('save', ['a']),
+            ('stash', 'b'),
+            ('save', ['c', 'd']),
+            ('sync_all', None),
+        ]
+        assert self.storage.n_batches == 2
+
+    def test_backpressure(self):
+        self.fake.unblock.clear()
+        self.storage.save('a')
+        assert self.fake.writing.wait(timeout=5)
+        for obj in "bcd":
+            self.storage.save(obj)
+        # first save is being written; the queue is full
+        assert self.storage._queue.full()
+        saved = threading.Event()
+        thread = threading.Thread(
+            target=lambda: (self.storage.save('e'), saved.set())
+        )
+        thread.start()
+        assert not saved.wait(timeout=0.1)
+        self.fake.unblock.set()
+        assert saved.wait(timeout=5)
+        thread.join()
+
+    def test_getattr_waits_for_writes(self):
+        self.fake.unblock.clear()
+        self.storage.save('a')
+        timer = threading.Timer(0.05, self.fake.unblock.set)
+        timer.start()
+        self.storage.tags['foo'] = 'bar'
+        assert self.fake.calls == [('save', ['a'])]
+        assert self.fake.tags == {'foo': 'bar'}
+        timer.join()
+
+    def test_stash_not_supported(self):
+        storage = WriteBehindStorage(Mock(spec=['save', 'close']))
+        with pytest.raises(AttributeError):
+            storage.stash('a')
+        storage.close()
+
+    def test_save_with_idx(self):
+        self.storage.save('a', 'name')
+        assert self.fake.calls == [('save', 'a')]
+
+    def test_close(self):
+        self.fake.unblock.clear()
+        self.storage.save('a')
+        self.fake.unblock.set()
+        self.storage.close()
+        assert self.fake.calls == [('save', ['a'])]
+        assert self.fake.closed
+        assert not self.storage._thread.is_alive()
+        self.storage.close()  # closing again does nothing
+        with pytest.raises(RuntimeError, match="closed"):
+            self.storage.save('b')
+
+    def test_error(self):
+        self.fake.save = Mock(side_effect=ValueError("bad"))
+        self.storage.save('a')
+        with pytest.raises(RuntimeError, match="background") as exc:
+            self.storage.flush()
+        assert isinstance(exc.value.__cause__, ValueError)
+        with pytest.raises(RuntimeError):
+            self.storage.save('b')
+        with pytest.raises(RuntimeError):
+            self.storage.close()
+        assert self.fake.closed
+
+
+def test_flush_storage():
+    storage = Mock()
+    flush_storage(storage)
+    assert not storage.flush.called
+    fake = FakeStorage()
+    storage = WriteBehindStorage(fake)
+    storage.save('a')
+    flush_storage(storage)
+    assert fake.calls == [('save', ['a'])]
+    storage.close()
@@ -2,7 +2,9 @@ import importlib
 import pathlib
 from collections import abc
 import click
-from .plugin_management import FilePluginLoader, NamespacePluginLoader
+from .plugin_management import (
+    FilePluginLoader, NamespacePluginLoader, EntryPointPluginLoader
+)
 
 
 class OrderedSet(abc.MutableSet):
@@ -75,12 +77,49 @@ def app_dir_plugins(posix):  # covered as smoke tests (too OS dependent)
     ).resolve() / 'cli-plugins')
 
 
-def get_installed_plugins(default_loader, plugin_types):
+def app_dir_cache():  # covered as smoke tests (too OS dependent)
+    return str(pathlib.Path(
+        click.get_app_dir("OpenPathSampling")
+    ).resolve() / 'cache')
+
+
+def installed_plugin_loaders(default_loader, plugin_types,
+                             entry_point_group=None):
+    """Plugin loaders for all the places plugins can be installed.
+
+    Parameters
+    ----------
+    default_loader : :class:`.CLIPluginLoader`
+        loader for the plugins that come with the CLI
+    plugin_types : type or Tuple[type]
+        types of plugin to search for
+    entry_point_group : str or None
+        entry point group for plugins of these types; if None, entry points
+        are not searched
+
+    Returns
+    -------
+    List[:class:`.CLIPluginLoader`] :
+        the loaders, in order of precedence
+    """
+    bytecode_cache = str(pathlib.Path(app_dir_cache()) / '__pycache__')
     loaders = [default_loader] + [
-        FilePluginLoader(app_dir_plugins(posix=False), plugin_types),
-        FilePluginLoader(app_dir_plugins(posix=True), plugin_types),
+        FilePluginLoader(app_dir_plugins(posix=False), plugin_types,
+                         bytecode_cache=bytecode_cache),
+        FilePluginLoader(app_dir_plugins(posix=True), plugin_types,
+                         bytecode_cache=bytecode_cache),
         NamespacePluginLoader('paths_cli_plugins', plugin_types)
 
     ]
+    if entry_point_group is not None:
+        loaders.append(EntryPointPluginLoader(entry_point_group,
+                                              plugin_types))
+    return loaders
+
+
+def get_installed_plugins(default_loader, plugin_types,
+                          entry_point_group=None):
+    loaders = installed_plugin_loaders(default_loader, plugin_types,
+                                       entry_point_group)
     plugins = OrderedSet(sum([loader() for loader in loaders], []))
     return list(plugins)
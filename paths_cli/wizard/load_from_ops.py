@@ -2,6 +2,7 @@ from paths_cli.parameters import INPUT_FILE
 from paths_cli.wizard.core import get_object
 
 from paths_cli.wizard.errors import FILE_LOADING_ERROR_MSG
+from paths_cli.name_index import NameIndex
 LABEL = "Load existing from OPS file"
 
 
@@ -21,7 +22,7 @@ def _get_ops_storage(wizard):
 @get_object
 def _get_ops_object(wizard, storage, store_name, obj_name):
     store = getattr(storage, store_name)
-    options = {obj.name: obj for obj in store if obj.is_named}
+    options = NameIndex(store)
     result = wizard.ask_enumerate_dict(
         f"What's the name of the {obj_name} you want to load?",
         options
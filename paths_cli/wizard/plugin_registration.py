@@ -3,7 +3,9 @@ from paths_cli.wizard.plugin_classes import (
     LoadFromOPS, WizardObjectPlugin, WrapCategory
 )
 from paths_cli.utils import get_installed_plugins
-from paths_cli.plugin_management import NamespacePluginLoader
+from paths_cli.plugin_management import (
+    NamespacePluginLoader, WIZARD_ENTRY_POINTS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -91,13 +93,15 @@ def register_installed_plugins():
     plugins = get_installed_plugins(
         default_loader=NamespacePluginLoader('paths_cli.wizard',
                                              plugin_types),
-        plugin_types=plugin_types
+        plugin_types=plugin_types,
+        entry_point_group=WIZARD_ENTRY_POINTS
     )
     register_plugins(plugins)
 
     file_loader_plugins = get_installed_plugins(
         default_loader=NamespacePluginLoader('paths_cli.wizard',
                                              LoadFromOPS),
-        plugin_types=LoadFromOPS
+        plugin_types=LoadFromOPS,
+        entry_point_group=WIZARD_ENTRY_POINTS
     )
     register_plugins(file_loader_plugins)
@@ -198,7 +198,8 @@ class Wizard:
         # select by number
         try:
             num = int(choice) - 1
-            result = list(options.values())[num]
+            # only load the selected option (options may load lazily)
+            result = options[list(options)[num]]
         except Exception:
             self.bad_input(f"Sorry, '{choice}' is not a valid option.")
             result = None
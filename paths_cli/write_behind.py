@@ -0,0 +1,166 @@
+"""Save to storage in a background thread.
+
+In a simulation, each MC step is generated and then saved, so the time
+spent in storage adds directly to the wall time. A
+:class:`.WriteBehindStorage` queues each save for a background thread, so
+that the simulation can continue while the previous steps are written.
+When the thread gets behind, everything that is waiting is written in one
+batch: saves are combined into a single call, and the storage is only
+synchronized once per batch.
+
+While there are writes waiting, only the background thread uses the
+storage. Anything else done through the wrapper (loading objects, setting
+tags, etc.) waits until all queued writes are finished, and then uses the
+storage directly. The CLI only uses this for SimStore files; see
+:meth:`paths_cli.param_core.StorageLoader.configure_write_behind`.
+"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# default number of queued operations before save() blocks
+DEFAULT_MAX_QUEUE = 100
+
+_SAVE = 'save'
+_STASH = 'stash'
+_SYNC = 'sync_all'
+_STOP = 'stop'
+
+
+class WriteBehindStorage(object):
+    """Storage wrapper that does saves in a background thread.
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.Storage`
+        the storage to write to
+    max_queue : int
+        maximum number of queued operations; when the queue is full,
+        :meth:`.save` waits for the background thread to catch up
+    """
+    def __init__(self, storage, max_queue=DEFAULT_MAX_QUEUE):
+        self._storage = storage
+        self.max_queue = max_queue
+        self.n_batches = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name="paths_cli-write-behind",
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def storage(self):
+        """The wrapped storage (after all queued writes are done)"""
+        self.flush()
+        return self._storage
+
+    def _put(self, method, obj=None):
+        self._check_error()
+        if self._closed:
+            raise RuntimeError("Storage has been closed")
+        self._queue.put((method, obj))
+
+    def save(self, obj, idx=None):
+        """Queue objects to be saved."""
+        if idx is not None:
+            # only supported by netcdfplus; not worth queueing
+            self.storage.save(obj, idx)
+        else:
+            self._put(_SAVE, obj)
+
+    def stash(self, obj):
+        """Queue objects to be stashed (saved at the next sync)."""
+        if not hasattr(self._storage, 'stash'):
+            # callers use this to detect storages without stash
+            raise AttributeError(f"{type(self._storage).__name__} has no "
+                                 "attribute 'stash'")
+        self._put(_STASH, obj)
+
+    def sync_all(self):
+        """Queue a sync of the storage."""
+        self._put(_SYNC)
+
+    def flush(self):
+        """Wait until all queued writes are done."""
+        self._check_error()
+        self._queue.join()
+        self._check_error()
+
+    def close(self):
+        """Finish all queued writes, then close the storage."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((_STOP, None))
+        self._thread.join()
+        self._storage.close()
+        self._check_error()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise RuntimeError("Error while saving in the background") \
+                from self._error
+
+    def _get_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_queue:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        saves = []
+        methods = set()
+        for method, obj in batch:
+            methods.add(method)
+            if method == _SAVE:
+                saves.extend(obj if type(obj) is list else [obj])
+            elif method == _STASH:
+                self._storage.stash(obj)
+
+        if methods == {_STOP}:
+            return
+
+        if saves:
+            self._storage.save(saves)
+        if _SYNC in methods:
+            self._storage.sync_all()
+        self.n_batches += 1
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = self._get_batch()
+            stop = any(method == _STOP for method, _ in batch)
+            try:
+                # after an error, drop everything: the caller will see it
+                if self._error is None:
+                    self._write(batch)
+            except Exception as e:
+                logger.exception("Error while saving in the background")
+                self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def __getattr__(self, attr):
+        # only called for attributes that aren't found normally
+        if attr.startswith('__') or attr in ('_storage', '_queue'):
+            raise AttributeError(attr)
+        return getattr(self.storage, attr)
+
+    def __repr__(self):
+        return f"WriteBehindStorage({self._storage!r})"
+
+
+def flush_storage(storage):
+    """Wait for queued writes, if the storage is a
+    :class:`.WriteBehindStorage`."""
+    if isinstance(storage, WriteBehindStorage):
+        storage.flush()